@@ -0,0 +1,142 @@
+# backend/app/answer_cache.py
+"""
+Cache des réponses du chat, devant le LLM.
+
+• Clé = (hash de la spec, question normalisée, version du prompt).
+• Tier mémoire LRU borné en nombre d’entrées et en octets, avec TTL.
+• Tier disque SQLite optionnel (CHAT_CACHE_PATH) : partagé entre redémarrages,
+  borné lui aussi (CHAT_CACHE_DISK_MAX_ENTRIES, CHAT_CACHE_DISK_MAX_MB) : les
+  entrées les plus anciennes sont évincées à l’écriture.
+• Compteurs hits / misses exposés par stats().
+"""
+import hashlib, os, re, sqlite3, threading, time, unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict
+from dotenv import load_dotenv
+load_dotenv()
+
+
+def normalize_question(question: str) -> str:
+    """« Comment est calculée  la Marge % ? » et « comment est calculée la marge %? » → même clé."""
+    q = unicodedata.normalize("NFKC", question).casefold()
+    q = re.sub(r"\s+", " ", q).strip()
+    q = re.sub(r"\s+([?!.,;:])", r"\1", q)
+    return q.rstrip(" ?!.")
+
+
+def answer_key(spec_hash: str, question: str, prompt_version: str) -> str:
+    raw = "\x1f".join((spec_hash, normalize_question(question), prompt_version))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        ttl_s: float | None = None,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+        path: str | Path | None = None,
+        disk_max_entries: int | None = None,
+        disk_max_bytes: int | None = None,
+    ):
+        self.ttl_s = ttl_s if ttl_s is not None else float(os.getenv("CHAT_CACHE_TTL_S", "86400"))
+        self.max_entries = max_entries or int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1000"))
+        self.max_bytes = max_bytes or int(float(os.getenv("CHAT_CACHE_MAX_MB", "32")) * 1024 * 1024)
+        self.disk_max_entries = disk_max_entries or int(os.getenv("CHAT_CACHE_DISK_MAX_ENTRIES", "20000"))
+        self.disk_max_bytes = disk_max_bytes or int(float(os.getenv("CHAT_CACHE_DISK_MAX_MB", "256")) * 1024 * 1024)
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (answer, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.disk_hits = 0
+
+        path = path or os.getenv("CHAT_CACHE_PATH")
+        self._db = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "size INTEGER NOT NULL DEFAULT 0)"
+            )
+            if "size" not in {row[1] for row in self._db.execute("PRAGMA table_info(answers)")}:   # fichier antérieur
+                self._db.execute("ALTER TABLE answers ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                self._db.execute("UPDATE answers SET size = length(CAST(answer AS BLOB))")
+            self._db.execute("CREATE INDEX IF NOT EXISTS answers_expires ON answers(expires_at)")
+
+    # ------------------------------------------------------------------
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None and hit[1] > now:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return hit[0]
+            if hit is not None:
+                self._drop(key)
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT answer, expires_at FROM answers WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    self._store(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, answer: str) -> None:
+        expires_at = time.time() + self.ttl_s
+        with self._lock:
+            self._store(key, answer, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO answers (key, answer, expires_at, size) VALUES (?, ?, ?, ?)",
+                    (key, answer, expires_at, len(answer.encode("utf-8"))),
+                )
+                self._db.execute("DELETE FROM answers WHERE expires_at <= ?", (time.time(),))
+                self._evict_disk()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+                "entries": len(self._mem),
+                "bytes": self._bytes,
+            }
+
+    # ------------------------------------------------------------------
+    def _store(self, key: str, answer: str, expires_at: float) -> None:
+        size = len(answer.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._mem:
+            self._drop(key)
+        self._mem[key] = (answer, expires_at, size)
+        self._bytes += size
+        while len(self._mem) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._mem)))   # LRU : le plus ancien en tête
+
+    def _evict_disk(self) -> None:
+        """Même TTL pour tous : expiration la plus proche = entrée la plus ancienne, évincée en premier."""
+        count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers").fetchone()
+        if count <= self.disk_max_entries and size <= self.disk_max_bytes:
+            return
+        doomed = []
+        for key, entry_size in self._db.execute("SELECT key, size FROM answers ORDER BY expires_at"):
+            if count <= self.disk_max_entries and size <= self.disk_max_bytes:
+                break
+            doomed.append((key,))
+            count, size = count - 1, size - entry_size
+        self._db.executemany("DELETE FROM answers WHERE key = ?", doomed)
+
+    def _drop(self, key: str) -> None:
+        _, _, size = self._mem.pop(key)
+        self._bytes -= size
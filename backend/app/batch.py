@@ -0,0 +1,216 @@
+# backend/app/batch.py
+r"""
+Ingestion en masse d’un dossier de .pbix / .pbit.
+
+    python -m backend.app.batch \\partage\rapports --out specs_out --workers 6
+
+• Extraction (extract_spec) dans un pool de processus (--workers).
+• Spécifications fonctionnelles rédigées par lots (--llm-workers fichiers à la fois).
+• Incrémental : un fichier dont le SHA-256 n’a pas changé depuis le dernier
+  passage (manifest.json) est ignoré ; le cache disque des specs est réutilisé.
+  Le manifest est réécrit (atomiquement) au fil du traitement : une exécution
+  interrompue reprend là où elle s’est arrêtée.
+• Sorties : <out>/specs.jsonl, <out>/md/<rapport>.md, <out>/json/<rapport>.json
+  (<rapport> = chemin relatif, extension comprise : Ventes.pbix ≠ Ventes.pbit).
+• Chaque spec alimente aussi l’index de recherche global (/api/search), sous
+  son chemin relatif au dossier parcouru.
+• Affiche le débit (fichiers/min) et un récapitulatif des temps par fichier.
+"""
+import argparse, hashlib, json, os, sys, threading, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List
+
+from .extract_pbix import extract_spec, EXTRACTOR_VERSION
+from .generate_narrative import generate_narrative, PROMPT_VERSION
+from .spec_cache import SpecCache, cache_key
+from .search_index import SearchIndex
+
+EXTENSIONS = (".pbix", ".pbit")
+MANIFEST_SAVE_S = 2.0   # écriture du manifest au plus toutes les N secondes pendant le traitement
+
+
+def file_sha256(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _extract(path: str, spec_id: str) -> tuple:
+    """Exécuté dans un processus du pool : (spec | None, durée, erreur | None)."""
+    t0 = time.perf_counter()
+    try:
+        return extract_spec(path, spec_id=spec_id), time.perf_counter() - t0, None
+    except Exception as exc:
+        return None, time.perf_counter() - t0, f"{type(exc).__name__}: {exc}"
+
+
+def _slug(rel: Path) -> str:
+    return "__".join(rel.parts)
+
+
+class BatchRun:
+    def __init__(self, src: Path, out: Path, workers: int, llm_workers: int, narrative: bool, force: bool):
+        self.src, self.out = src, out
+        self.workers, self.llm_workers = workers, llm_workers
+        self.narrative, self.force = narrative, force
+        self.cache = SpecCache()
+        self.search = SearchIndex()
+        self.manifest_path = out / "manifest.json"
+        self.manifest: Dict[str, Dict] = (
+            json.loads(self.manifest_path.read_text(encoding="utf-8")) if self.manifest_path.is_file() else {}
+        )
+        self.rows: List[Dict] = []
+        self._lock = threading.RLock()   # _write est appelé depuis les threads de rédaction
+        self._saved_at = 0.0
+
+    # ------------------------------------------------------------------
+    def discover(self) -> List[Path]:
+        return sorted(p for p in self.src.rglob("*") if p.suffix.lower() in EXTENSIONS and p.is_file())
+
+    def run(self) -> None:
+        (self.out / "md").mkdir(parents=True, exist_ok=True)
+        (self.out / "json").mkdir(parents=True, exist_ok=True)
+        t_start = time.perf_counter()
+        try:
+            self._process()
+        finally:   # Ctrl-C, plantage, LLM indisponible : le travail déjà fait est conservé
+            self._save_manifest()
+        self._finish(time.perf_counter() - t_start)
+
+    def _process(self) -> None:
+        # --- 1) Hash + tri : inchangé / en cache / à extraire -----------------------------------
+        todo, ready = [], []
+        for path in self.discover():
+            rel = path.relative_to(self.src)
+            row = {"file": str(rel), "slug": _slug(rel), "status": "", "extract_s": 0.0, "narrative_s": 0.0}
+            t0 = time.perf_counter()
+            row["sha256"] = digest = file_sha256(path)
+            row["hash_s"] = time.perf_counter() - t0
+            self.rows.append(row)
+
+            prev = self.manifest.get(str(rel))
+            if (
+                not self.force and prev and prev["sha256"] == digest
+                and (prev.get("narrative") or not self.narrative)
+                and (self.out / "json" / f"{row['slug']}.json").is_file()
+            ):
+                row["status"] = "unchanged"
+                continue
+            cached = None if self.force else self.cache.get(cache_key(digest, EXTRACTOR_VERSION, PROMPT_VERSION))
+            if cached is not None:
+                row["status"] = "cached"
+                self._write(row, *cached)
+                continue
+            todo.append((row, path))
+
+        # --- 2) Extraction en parallèle (processus) ---------------------------------------------
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(_extract, str(path), row["sha256"]): row for row, path in todo}
+            for fut in as_completed(futures):
+                row = futures[fut]
+                spec, row["extract_s"], err = fut.result()
+                if err:
+                    row["status"] = "error"
+                    row["error"] = err
+                    print(f"✖ {row['file']} : {err}", file=sys.stderr)
+                else:
+                    row["status"] = "extracted"
+                    ready.append((row, spec))
+
+        # --- 3) Rédaction par lots (threads : I/O LLM) ------------------------------------------
+        with ThreadPoolExecutor(max_workers=self.llm_workers) as pool:
+            futures = {pool.submit(self._narrate, row, spec): row for row, spec in ready}
+            for fut in as_completed(futures):
+                row = futures[fut]
+                try:
+                    fut.result()
+                except Exception as exc:
+                    row["status"] = "error"
+                    row["error"] = f"{type(exc).__name__}: {exc}"
+                    print(f"✖ {row['file']} : {row['error']}", file=sys.stderr)
+
+    # ------------------------------------------------------------------
+    def _narrate(self, row: Dict, spec: Dict) -> None:
+        functional = ""
+        if self.narrative:
+            t0 = time.perf_counter()
+            functional = generate_narrative(spec)
+            row["narrative_s"] = time.perf_counter() - t0
+            self.cache.put(cache_key(row["sha256"], EXTRACTOR_VERSION, PROMPT_VERSION), spec, functional)
+        self._write(row, spec, functional)
+
+    def _write(self, row: Dict, technical: Dict, functional: str) -> None:
+        record = {"file": row["file"], "sha256": row["sha256"], "id": technical["id"],
+                  "functional": functional, "technical": technical}
+        (self.out / "json" / f"{row['slug']}.json").write_text(
+            json.dumps(record, ensure_ascii=False), encoding="utf-8"
+        )
+        if functional:
+            (self.out / "md" / f"{row['slug']}.md").write_text(
+                f"# {row['file']}\n\n{functional}\n", encoding="utf-8"
+            )
+        # clé = chemin relatif : deux Ventes.pbix de dossiers différents restent deux rapports
+        self.search.index_spec(technical, Path(row["file"]).as_posix())
+        with self._lock:
+            self.manifest[row["file"]] = {
+                "sha256": row["sha256"], "slug": row["slug"], "narrative": bool(functional), "at": time.time(),
+            }
+            if time.monotonic() - self._saved_at >= MANIFEST_SAVE_S:
+                self._save_manifest()
+
+    def _save_manifest(self) -> None:
+        """Fichier temporaire puis os.replace : jamais de manifest à moitié écrit."""
+        with self._lock:
+            tmp = self.manifest_path.with_suffix(".json.tmp")
+            tmp.write_text(json.dumps(self.manifest, indent=1, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.manifest_path)
+            self._saved_at = time.monotonic()
+
+    def _finish(self, elapsed: float) -> None:
+        # specs.jsonl = état complet du dossier (fichiers inchangés compris)
+        present = {r["file"] for r in self.rows}
+        self.manifest = {k: v for k, v in self.manifest.items() if k in present}
+        with open(self.out / "specs.jsonl", "w", encoding="utf-8") as out:
+            for entry in self.manifest.values():
+                f = self.out / "json" / f"{entry['slug']}.json"
+                if f.is_file():
+                    out.write(f.read_text(encoding="utf-8") + "\n")
+        self._save_manifest()
+        self._summary(elapsed)
+
+    def _summary(self, elapsed: float) -> None:
+        width = max([len(r["file"]) for r in self.rows] + [7])
+        print(f"\n{'fichier':<{width}}  {'statut':<10} {'hash':>7} {'extract':>8} {'rédac.':>8} {'total':>8}")
+        for r in sorted(self.rows, key=lambda r: r["file"]):
+            total = r["hash_s"] + r["extract_s"] + r["narrative_s"]
+            print(
+                f"{r['file']:<{width}}  {r['status']:<10} {r['hash_s']:>6.2f}s "
+                f"{r['extract_s']:>7.2f}s {r['narrative_s']:>7.2f}s {total:>7.2f}s"
+            )
+        counts = {s: sum(r["status"] == s for r in self.rows) for s in ("extracted", "cached", "unchanged", "error")}
+        done = counts["extracted"] + counts["cached"]
+        rate = done / elapsed * 60 if elapsed else 0.0
+        print(
+            f"\n{len(self.rows)} fichiers en {elapsed:.1f}s – {rate:.1f} fichiers/min traités "
+            f"({counts['extracted']} extraits, {counts['cached']} depuis le cache, "
+            f"{counts['unchanged']} inchangés, {counts['error']} erreurs)"
+        )
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Génère les specs de tous les .pbix/.pbit d’un dossier.")
+    ap.add_argument("src", type=Path, help="dossier à parcourir (récursif)")
+    ap.add_argument("--out", type=Path, default=Path("specs_out"), help="dossier de sortie")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="processus d’extraction")
+    ap.add_argument("--llm-workers", type=int, default=2, help="fichiers rédigés simultanément")
+    ap.add_argument("--no-narrative", action="store_true", help="extraction seule, sans appel LLM")
+    ap.add_argument("--force", action="store_true", help="ignore le manifest et le cache")
+    args = ap.parse_args(argv)
+
+    run = BatchRun(args.src, args.out, args.workers, args.llm_workers, not args.no_narrative, args.force)
+    run.run()
+    return 1 if any(r["status"] == "error" for r in run.rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,40 +1,30 @@
 from fastapi import APIRouter, HTTPException
 from pathlib import Path
-import sys, re
+import asyncio, sys
 
 from .state import CURRENT_SPEC
+from .spec_index import CONTEXT_TOKEN_BUDGET, SpecIndex, index_for
 
-from common.azure_llm import azure_llm_chat
+from common.azure_llm import azure_llm_chat_async
 
 router = APIRouter()
 
-def build_context(q: str, spec: dict) -> str:
-    ctx = []
-    # mesures pertinentes
-    for m in spec["measures"]:
-        if re.search(re.escape(m["name"]), q, re.I):
-            ctx.append(f"Mesure {m['name']} = {m['expr']}")
-    # tables pertinentes
-    for t in spec["tables"]:
-        if re.search(re.escape(t), q, re.I):
-            ctx.append(f"Table présente : {t}")
-    # visuels
-    for p in spec["pages"]:
-        for v in p["visuals"]:
-            for fld in v["fields"]:
-                if re.search(re.escape(q), str(fld), re.I):
-                    ctx.append(f"Champ {fld} utilisé dans la page {p['name']}")
-    return "\n".join(ctx) or "Pas de contexte direct trouvé."
+
+def build_context(q: str, spec: dict, index: SpecIndex | None = None) -> str:
+    # entrées (mesures, tables, relations, visuels) classées par BM25 dans un budget de tokens
+    index = index or index_for(spec)
+    return index.context(q, CONTEXT_TOKEN_BUDGET) or "Pas de contexte direct trouvé."
 
 @router.post("/api/chat")
 async def chat(question: str):
-    if CURRENT_SPEC.data is None:
+    spec = await asyncio.to_thread(lambda: CURRENT_SPEC.data)   # store partagé + index BM25 : hors de la boucle
+    if spec is None:
         raise HTTPException(400, "Aucun rapport analysé.")
-    context = build_context(question, CURRENT_SPEC.data)
+    context = await asyncio.to_thread(build_context, question, spec)
     messages = [
         {"role": "system", "content": "Tu es un expert Power BI."},
         {"role": "assistant", "content": context},
         {"role": "user", "content": question},
     ]
-    answer, _ = azure_llm_chat(messages)
+    answer, _ = await azure_llm_chat_async(messages)
     return {"answer": answer}
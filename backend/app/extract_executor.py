@@ -0,0 +1,167 @@
+# backend/app/extract_executor.py
+"""
+Exécuteur des processus pbi-tools.
+
+• PBITOOLS_MAX_CONCURRENCY (défaut 2) processus au plus par worker ; les
+  suivants attendent dans une file FIFO (profondeur : stats() et la jauge
+  pbix_pbitools_processes{state="queued"}).
+• PBITOOLS_TIMEOUT_S (défaut 600) : durée max d’un processus ; au-delà tout
+  l’arbre de processus est tué (groupe de processus POSIX, taskkill /T sous Windows).
+• Annulation : `check` est appelé pendant l’attente et l’exécution ; s’il lève,
+  le processus est tué et l’exception propagée.
+• Dossiers de travail sur PBIX_SCRATCH_DIR (défaut /dev/shm, en RAM, s’il est
+  accessible ; vide = dossier temporaire système), supprimés après usage.
+  sweep() nettoie ceux laissés par un worker arrêté brutalement.
+"""
+import os, shutil, signal, subprocess, tempfile, threading, time
+from collections import deque
+from contextlib import contextmanager, suppress
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List
+
+from common.metrics import PBITOOLS_PROCESSES, PBITOOLS_RUNS, stage
+
+POLL_S = 0.2
+SCRATCH_PREFIX = "pbix_extract_"
+
+
+class ExtractionTimeout(RuntimeError):
+    ...
+
+
+def default_scratch_dir() -> str | None:
+    configured = os.getenv("PBIX_SCRATCH_DIR")
+    if configured is not None:
+        return configured or None
+    shm = "/dev/shm"
+    return shm if os.path.isdir(shm) and os.access(shm, os.W_OK) else None
+
+
+def _kill_tree(proc: subprocess.Popen) -> None:
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/T", "/F", "/PID", str(proc.pid)], capture_output=True)
+    else:
+        with suppress(ProcessLookupError):   # session dédiée : pgid == pid
+            os.killpg(proc.pid, signal.SIGKILL)
+    with suppress(OSError):
+        proc.kill()
+
+
+class ExtractionExecutor:
+    def __init__(self, max_concurrency: int | None = None, timeout_s: float | None = None,
+                 scratch_dir: str | None = None):
+        self.max_concurrency = max(1, max_concurrency or int(os.getenv("PBITOOLS_MAX_CONCURRENCY", "2")))
+        self.timeout_s = timeout_s if timeout_s is not None else float(os.getenv("PBITOOLS_TIMEOUT_S", "600"))
+        self.scratch_dir = scratch_dir if scratch_dir is not None else default_scratch_dir()
+        self._cond = threading.Condition()
+        self._queue: deque = deque()   # tickets FIFO en attente d’un créneau
+        self._running = 0
+
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "running": self._running,
+                "max_concurrency": self.max_concurrency,
+                "timeout_s": self.timeout_s,
+                "scratch_dir": self.scratch_dir or tempfile.gettempdir(),
+            }
+
+    def _report(self) -> None:
+        PBITOOLS_PROCESSES.set(len(self._queue), state="queued")
+        PBITOOLS_PROCESSES.set(self._running, state="running")
+
+    def _acquire(self, check: Callable[[], None] | None) -> None:
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            self._report()
+            try:
+                while self._queue[0] is not ticket or self._running >= self.max_concurrency:
+                    if check:
+                        check()
+                    self._cond.wait(POLL_S)
+            except BaseException:
+                self._queue.remove(ticket)
+                self._report()
+                self._cond.notify_all()
+                raise
+            self._queue.popleft()
+            self._running += 1
+            self._report()
+            self._cond.notify_all()   # le suivant peut démarrer s’il reste un créneau
+
+    def _release(self) -> None:
+        with self._cond:
+            self._running -= 1
+            self._report()
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    def run(self, cmd: List[str], check: Callable[[], None] | None = None) -> subprocess.CompletedProcess:
+        """Attend son tour dans la file puis exécute cmd (sortie capturée), sous timeout."""
+        with stage("pbitools_queue"):
+            self._acquire(check)
+        try:
+            with stage("pbitools"):
+                return self._run(cmd, check)
+        finally:
+            self._release()
+
+    def _run(self, cmd: List[str], check: Callable[[], None] | None) -> subprocess.CompletedProcess:
+        kwargs = (
+            {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == "nt"
+            else {"start_new_session": True}
+        )
+        proc = subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, errors="replace", **kwargs,
+        )
+        deadline = time.monotonic() + self.timeout_s if self.timeout_s else None
+        outcome = "aborted"
+        try:
+            while True:
+                try:
+                    out, err = proc.communicate(timeout=POLL_S)   # relancer communicate ne perd rien
+                    break
+                except subprocess.TimeoutExpired:
+                    pass
+                if deadline is not None and time.monotonic() >= deadline:
+                    outcome = "timeout"
+                    raise ExtractionTimeout(f"pbi-tools : délai de {self.timeout_s:.0f}s dépassé")
+                if check:
+                    check()
+            outcome = "ok" if proc.returncode == 0 else "error"
+            return subprocess.CompletedProcess(cmd, proc.returncode, out, err)
+        finally:
+            PBITOOLS_RUNS.inc(outcome=outcome)
+            if proc.returncode is None:
+                _kill_tree(proc)
+                with suppress(subprocess.TimeoutExpired):
+                    proc.communicate(timeout=5)
+
+    # ------------------------------------------------------------------
+    @contextmanager
+    def scratch(self) -> Iterator[Path]:
+        """Dossier de travail éphémère (RAM si possible), toujours supprimé en sortie."""
+        tmp = Path(tempfile.mkdtemp(prefix=SCRATCH_PREFIX, dir=self.scratch_dir))
+        try:
+            yield tmp
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def sweep(self) -> int:
+        """Supprime les dossiers de travail orphelins (plus vieux que 2× le timeout) ; renvoie leur nombre."""
+        root = Path(self.scratch_dir or tempfile.gettempdir())
+        limit = time.time() - 2 * max(self.timeout_s, 60)
+        removed = 0
+        for d in root.glob(f"{SCRATCH_PREFIX}*"):
+            with suppress(OSError):
+                if d.is_dir() and d.stat().st_mtime < limit:
+                    shutil.rmtree(d, ignore_errors=True)
+                    removed += 1
+        return removed
+
+
+EXECUTOR = ExtractionExecutor()
@@ -2,16 +2,30 @@
 r"""
 Extraction d’un .pbix avec pbi-tools (mode RAW).
 
-• pbi-tools.exe --extract … -modelSerialization Raw
+• Fast-path : Report/Layout et DataModelSchema (.pbit, thin reports) lus
+  directement dans le zip, sans sous-processus ni dossier temporaire.
+• Sinon : pbi-tools.exe --extract … -modelSerialization Raw, via l’exécuteur
+  borné (extract_executor : file FIFO, timeout, dossier de travail en RAM).
 • On lit le JSON du modèle et on renvoie tables, mesures, relations, pages.
+  Lecture en flux (json_stream) : seuls les chemins utiles sont matérialisés.
 • Si aucun modèle → on renvoie quand même les pages (thin report).
 """
-import subprocess, tempfile, json, shutil, uuid, os
+import uuid, os, zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable
 from dotenv import load_dotenv
 load_dotenv()
 
+from common.metrics import stage
+from .extract_executor import EXECUTOR
+from .lineage import build_lineage
+from .json_stream import JSON_ERRORS, Utf8Reader, iter_sections, loads, read_model, visual_from_config
+
 DEFAULT_PATH = r"C:\Users\lmoothery\AppData\Local\pbi-tools.exe"
+EXTRACTOR_VERSION = "6"   # à incrémenter dès que le format de la spec change (invalide le cache)
+FAST_PATH = os.getenv("PBIX_FAST_PATH", "1") != "0"   # lecture zip en process avant pbi-tools
+LAYOUT_WORKERS = int(os.getenv("PBIX_LAYOUT_WORKERS", "4"))   # fichiers Layout lus en parallèle
 
 
 class PBIToolsMissing(RuntimeError):
@@ -44,75 +58,148 @@ def _find_model_file(tmp: Path) -> Path | None:
     return None
 
 
+def _page(sec: dict, default_name: str | None = None) -> dict:
+    """Page {name, visuals} d’une section de Layout : même normalisation pour le fast-path et pbi-tools."""
+    return {
+        "name": sec.get("displayName") or sec.get("name") or default_name,
+        "visuals": [visual_from_config(v.get("config", {})) for v in sec.get("visualContainers", [])],
+    }
+
+
+def _layout_page(lf: Path) -> tuple:
+    with open(lf, "rb") as f:
+        sec = loads(Utf8Reader(f).read())
+    return sec.get("ordinal"), _page(sec, lf.stem)
+
+
 def _extract_pages(tmp: Path):
-    pages = []
-    for lf in (tmp / "Report" / "Layout").glob("*.json"):
-        lay = json.load(open(lf, encoding="utf-8", errors="ignore"))
-        pages.append(
-            {
-                "name": lay.get("name", lf.stem),
-                "visuals": [
-                    {
-                        "type": v.get("visualType"),
-                        "fields": v.get("config", {}).get("dataRoles", []),
-                    }
-                    for v in lay.get("visualContainers", [])
-                ],
-            }
-        )
-    return pages
+    files = sorted((tmp / "Report" / "Layout").glob("*.json"))
+    if len(files) < 2:
+        pages = [_layout_page(lf) for lf in files]
+    else:
+        with ThreadPoolExecutor(max_workers=min(LAYOUT_WORKERS, len(files))) as pool:
+            pages = list(pool.map(_layout_page, files))
+    # ordre du rapport (`ordinal`), comme dans Report/Layout ; à défaut celui des fichiers
+    ranked = sorted(range(len(pages)), key=lambda i: (i if pages[i][0] is None else pages[i][0], i))
+    return [pages[i][1] for i in ranked]
+
+
+# ------------------------------------------------------------------
+# Fast-path : lecture directe de l’archive (.pbix / .pbit), sans pbi-tools
+# ------------------------------------------------------------------
+def _pages_from_layout(raw) -> list:
+    """Pages d’un Report/Layout lu en flux : une section à la fois."""
+    return [_page(sec) for sec in iter_sections(raw)]
+
+
+def _read_member(zf: zipfile.ZipFile, name: str, reader):
+    with zf.open(name) as f:
+        return reader(f)
+
+
+def _read_archive(pbix_path: str) -> tuple[list, dict | None] | None:
+    """
+    Renvoie (pages, modèle) lus directement dans le zip, modèle = None pour un thin report.
+    Renvoie None si l’archive n’est pas décodable ici (modèle VertiPaq binaire → pbi-tools).
+    """
+    if not zipfile.is_zipfile(pbix_path):
+        return None
+    with zipfile.ZipFile(pbix_path) as zf:
+        names = set(zf.namelist())
+        if "Report/Layout" not in names:
+            return None
+        if "DataModelSchema" not in names and "DataModel" in names:
+            return None  # modèle compressé (XPress9) : illisible sans pbi-tools
+
+        if "DataModelSchema" not in names:
+            return _read_member(zf, "Report/Layout", _pages_from_layout), None
+        # Layout et modèle décompressés / parsés en parallèle (deux membres indépendants du zip)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            model = pool.submit(_read_member, zf, "DataModelSchema", read_model)
+            pages = _read_member(zf, "Report/Layout", _pages_from_layout)
+            return pages, model.result()
 
 
 # ------------------------------------------------------------------
-def extract_spec(pbix_path: str) -> dict:
+def _expr(expression) -> str:
+    # les .bim / DataModelSchema stockent les expressions multi-lignes sous forme de liste
+    return "\n".join(expression) if isinstance(expression, list) else expression
+
+
+def _spec_from_model(spec_id: str, pages: list, model: dict | None) -> dict:
+    spec = _spec_fields(spec_id, pages, model)
+    spec["lineage"] = build_lineage(spec)   # graphe de dépendances DAX, calculé une seule fois
+    return spec
+
+
+def _spec_fields(spec_id: str, pages: list, model: dict | None) -> dict:
+    if model is None:
+        # thin report
+        return {
+            "id": spec_id,
+            "tables": [],
+            "measures": [],
+            "pages": pages,
+            "relations": [],
+            "note": "Thin report – modèle hébergé dans le Service Power BI",
+        }
+
+    tables = [t["name"] for t in model["model"]["tables"]]
+    measures = [
+        {"table": t["name"], "name": m["name"], "expr": _expr(m["expression"])}
+        for t in model["model"]["tables"]
+        for m in t.get("measures", [])
+    ]
+    relations = model["model"].get("relationships", [])
+
+    return {
+        "id": spec_id,
+        "tables": tables,
+        "measures": measures,
+        "pages": pages,
+        "relations": relations,
+    }
+
+
+def extract_spec(pbix_path: str, spec_id: str | None = None, check: Callable[[], None] | None = None) -> dict:
+    """`check` (optionnel) est appelé pendant l’attente / l’exécution de pbi-tools ; s’il lève, on abandonne."""
+    spec_id = spec_id or str(uuid.uuid4())
+
+    if FAST_PATH:
+        try:
+            with stage("parse"):
+                read = _read_archive(pbix_path)
+        except (zipfile.BadZipFile, KeyError, *JSON_ERRORS):
+            read = None  # archive atypique → on laisse pbi-tools trancher
+        if read is not None:
+            return _spec_from_model(spec_id, *read)
+
+    return _extract_with_pbi_tools(pbix_path, spec_id, check)
+
+
+def _extract_with_pbi_tools(pbix_path: str, spec_id: str, check: Callable[[], None] | None = None) -> dict:
     exe = _pbi_tools_path()
-    tmp = Path(tempfile.mkdtemp(prefix="pbix_extract_"))
 
-    try:
-        proc = subprocess.run(
+    with EXECUTOR.scratch() as tmp:
+        proc = EXECUTOR.run(
             [
                 exe, "extract", pbix_path,
                 "-extractFolder", str(tmp),
                 "-mode", "Auto",
                 "-modelSerialization", "Raw",
             ],
-            capture_output=True, text=True
+            check,
         )
         if proc.returncode != 0:
             raise RuntimeError(f"pbi-tools erreur :\n{proc.stderr.strip()}")
 
-        pages = _extract_pages(tmp)
-
-        model_path = _find_model_file(tmp)
-        if model_path is None:
-            # thin report
-            return {
-                "id": str(uuid.uuid4()),
-                "tables": [],
-                "measures": [],
-                "pages": pages,
-                "relations": [],
-                "note": "Thin report – modèle hébergé dans le Service Power BI",
-            }
-
-        with open(model_path, encoding="utf-8-sig", errors="ignore") as f:
-            model = json.load(f)
-
-        tables = [t["name"] for t in model["model"]["tables"]]
-        measures = [
-            {"table": t["name"], "name": m["name"], "expr": m["expression"]}
-            for t in model["model"]["tables"]
-            for m in t.get("measures", [])
-        ]
-        relations = model["model"].get("relationships", [])
+        with stage("parse"):
+            pages = _extract_pages(tmp)
 
-        return {
-            "id": str(uuid.uuid4()),
-            "tables": tables,
-            "measures": measures,
-            "pages": pages,
-            "relations": relations,
-        }
+            model_path = _find_model_file(tmp)
+            model = None
+            if model_path is not None:
+                with open(model_path, "rb") as f:
+                    model = read_model(f)
 
-    finally:
-        shutil.rmtree(tmp, ignore_errors=True)
+        return _spec_from_model(spec_id, pages, model)
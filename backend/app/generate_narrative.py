@@ -1,36 +1,142 @@
-import json, sys
+import contextvars, json, os, re, sys
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, List
 from datetime import date
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from common.azure_llm import azure_llm_chat
+from .spec_prompt import encode_spec
 MODEL = "gpt-4o"
+PROMPT_VERSION = "3"   # à incrémenter dès que le prompt change (invalide le cache)
 
-def _short(items, n=15):
-    return items if len(items) <= n else items[:n] + ["…"]
+NARRATIVE_SPEC_TOKENS = 6000   # budget de la spec compacte dans un prompt
+MEASURES_PER_BATCH = 25        # mesures documentées par appel LLM (sortie ≤ max_tokens)
+PAGES_PER_BATCH = 8
+NARRATIVE_CONCURRENCY = int(os.getenv("NARRATIVE_CONCURRENCY", os.getenv("LLM_MAX_CONCURRENCY", "8")))
 
-def generate_narrative(spec: Dict) -> str:
-    kpi_lines = "\n".join(
-        f"- **{m['name']}** : `{m['expr']}`" for m in _short(spec["measures"])
-    )
-    page_lines = "\n".join(
-        f"- **{p['name']}** ({len(p['visuals'])} visuels)" for p in spec["pages"]
-    )
-    prompt = f"""
+INTRO, SOURCES, KPIS, PAGES, GLOSSARY = (
+    "Introduction & objectifs", "Sources de données", "Indicateurs", "Description des pages", "Glossaire",
+)
+SECTIONS = [INTRO, SOURCES, KPIS, PAGES, GLOSSARY]
+
+# ------------------------------------------------------------------
+# Map : une tâche LLM par section (ou par lot pour les mesures / pages)
+# ------------------------------------------------------------------
+def _prompt(section: str, instructions: str, metadata: str) -> str:
+    return f"""
 Nous sommes le {date.today():%d/%m/%Y}. Tu es un consultant BI de Klint.
-À partir des métadonnées ci-dessous, rédige une spécification fonctionnelle
-en cinq sections (Introduction & objectifs, Sources de données, Indicateurs,
-Description des pages, Glossaire).
+Tu rédiges la section « {section} » d’une spécification fonctionnelle Power BI.
+{instructions}
+Réponds en markdown, sans titre de section, sans introduction ni conclusion.
 
-### Tables ({len(spec['tables'])})
-{', '.join(_short(spec['tables'], 20))}
+{metadata}
+""".strip()
 
-### Mesures ({len(spec['measures'])})
-{kpi_lines}
 
-### Pages ({len(spec['pages'])})
-{page_lines}
-""".strip()
+def _sub_spec(**parts) -> Dict:
+    return {"tables": [], "measures": [], "relations": [], "pages": [], **parts}
+
+
+def _overview(spec: Dict) -> str:
+    names = ", ".join(m["name"] for m in spec["measures"])
+    pages = ", ".join(p["name"] for p in spec["pages"])
+    return (
+        f"### Modèle ({len(spec['tables'])} tables, {len(spec['measures'])} mesures, {len(spec['pages'])} pages)\n"
+        f"Tables : {', '.join(spec['tables'])}\nMesures : {names}\nPages : {pages}"
+    )
+
+
+def _batches(items: List, size: int) -> List[List]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def section_tasks(spec: Dict, sections: List[str] | None = None) -> List[tuple]:
+    """[(section, prompt)] — plusieurs tâches par section pour les gros modèles, dans l’ordre final."""
+    sections = sections or SECTIONS
+    overview = _overview(spec)
+    tasks = []
+    if INTRO in sections:
+        tasks.append((INTRO, _prompt(
+            INTRO, "Présente le rapport, son public et ses objectifs métier en quelques paragraphes.", overview,
+        )))
+    if SOURCES in sections:
+        tasks.append((SOURCES, _prompt(
+            SOURCES, "Décris les tables (faits / dimensions) et la façon dont elles sont reliées.",
+            encode_spec(_sub_spec(tables=spec["tables"], relations=spec["relations"]), NARRATIVE_SPEC_TOKENS),
+        )))
+    if KPIS in sections:
+        measures = sorted(spec["measures"], key=lambda m: m["table"])   # lots homogènes par table
+        for batch in _batches(measures, MEASURES_PER_BATCH):
+            tasks.append((KPIS, _prompt(
+                KPIS, "Pour CHAQUE mesure ci-dessous : nom en gras, définition métier, règle de calcul "
+                      "expliquée simplement. N’en omets aucune.",
+                encode_spec(_sub_spec(measures=batch), NARRATIVE_SPEC_TOKENS),
+            )))
+    if PAGES in sections:
+        for batch in _batches(spec["pages"], PAGES_PER_BATCH):
+            tasks.append((PAGES, _prompt(
+                PAGES, "Pour CHAQUE page : nom en gras, objectif, visuels et indicateurs affichés.",
+                encode_spec(_sub_spec(pages=batch), NARRATIVE_SPEC_TOKENS),
+            )))
+    if GLOSSARY in sections:
+        tasks.append((GLOSSARY, _prompt(
+            GLOSSARY, "Liste à puces des termes métier et abréviations utiles, avec leur définition.", overview,
+        )))
+    return tasks
+
 
+def _draft(prompt: str) -> str:
+    from common.azure_llm import azure_llm_chat   # import différé : httpx n’est chargé qu’au 1er appel
     answer, _ = azure_llm_chat([{"role": "user", "content": prompt}], model=MODEL)
     return answer.strip()
+
+
+def generate_sections(
+    spec: Dict,
+    sections: List[str] | None = None,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> Dict[str, str]:
+    """Rédige les sections demandées en parallèle (NARRATIVE_CONCURRENCY appels max)."""
+    tasks = section_tasks(spec, sections)
+    drafts: List[str | None] = [None] * len(tasks)
+    with ThreadPoolExecutor(max_workers=max(1, min(NARRATIVE_CONCURRENCY, len(tasks) or 1))) as pool:
+        # copy_context : les durées LLM remontent dans le Server-Timing du job appelant
+        futures = {pool.submit(contextvars.copy_context().run, _draft, prompt): i for i, (_, prompt) in enumerate(tasks)}
+        try:
+            for done, fut in enumerate(as_completed(futures), 1):
+                drafts[futures[fut]] = fut.result()
+                if on_progress:
+                    on_progress(done, len(tasks))
+        except BaseException:   # échec ou annulation du job : on n’envoie pas les appels restants
+            for fut in futures:
+                fut.cancel()
+            raise
+
+    # --- Reduce : les lots d’une même section sont recollés dans l’ordre -----------------------
+    out: Dict[str, List[str]] = {}
+    for (section, _), text in zip(tasks, drafts):
+        out.setdefault(section, []).append(text)
+    return {section: "\n\n".join(parts) for section, parts in out.items()}
+
+
+def render_narrative(sections: Dict[str, str]) -> str:
+    return "\n\n".join(
+        f"## {i}. {title}\n\n{sections[title]}" for i, title in enumerate(SECTIONS, 1) if title in sections
+    )
+
+
+_HEADING = re.compile(r"^## (\d+\. .+?)[ \t]*$", re.M)
+_KNOWN_HEADINGS = {f"{i}. {title}": title for i, title in enumerate(SECTIONS, 1)}
+
+
+def parse_narrative(text: str) -> Dict[str, str]:
+    """
+    Inverse de render_narrative : markdown → {section: texte}. Seuls les titres exacts des
+    sections découpent le texte : un « ## n. … » écrit par le modèle reste dans sa section.
+    """
+    heads = [(m, _KNOWN_HEADINGS[m[1]]) for m in _HEADING.finditer(text) if m[1] in _KNOWN_HEADINGS]
+    ends = [m.start() for m, _ in heads[1:]] + [len(text)]
+    return {title: text[m.end():end].strip() for (m, title), end in zip(heads, ends)}
+
+
+def generate_narrative(spec: Dict, on_progress: Callable[[int, int], None] | None = None) -> str:
+    return render_narrative(generate_sections(spec, on_progress=on_progress))
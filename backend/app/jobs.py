@@ -0,0 +1,217 @@
+# backend/app/jobs.py
+"""
+Jobs de génération de spec exécutés hors de la boucle asyncio.
+
+• submit() renvoie immédiatement un Job (id, étape, progression).
+• Le travail (pbi-tools, LLM…) tourne dans un pool de threads borné (SPEC_WORKERS).
+• Les jobs terminés sont oubliés après JOB_TTL_S secondes.
+• Avec un store partagé, chaque changement d’étape y est publié : n’importe
+  quel worker uvicorn peut répondre au polling.
+• Durées par étape (stage() de common.metrics) exposées dans `timings` (ms).
+• cancel() : annulation coopérative. Le job s’arrête à sa prochaine étape
+  (job.update / job.check), pbi-tools compris ; via le store, la demande
+  atteint aussi un job exécuté par un autre worker.
+• submit_once(key, …) : tant qu’un job de même clé est en cours, ici ou (via le
+  store) dans un autre worker, on renvoie son état au lieu d’en lancer un
+  second. Les clients partagent alors le job : l’annuler l’annule pour tous.
+  La réservation dans le store expire après SPEC_INFLIGHT_TTL_S (défaut 30 s)
+  sans battement de cœur (job.update() et un thread par worker) : un worker
+  tombé en plein job ne bloque pas les envois suivants.
+"""
+import os, threading, time, traceback, uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Tuple
+
+from common.metrics import COALESCED_REQUESTS, JOBS_IN_FLIGHT, JOBS_TOTAL, ServerTiming, timing_scope
+
+QUEUED, EXTRACTING, NARRATING, DONE, FAILED, CANCELLED = (
+    "queued", "extracting", "narrating", "done", "failed", "cancelled"
+)
+FINAL_STAGES = (DONE, FAILED, CANCELLED)
+JOB_TTL_S = 3600
+INFLIGHT_TTL_S = float(os.getenv("SPEC_INFLIGHT_TTL_S", "30"))
+
+
+class JobCancelled(RuntimeError):
+    ...
+
+
+class Job:
+    def __init__(self, publish: Callable[["Job"], None] | None = None, store=None):
+        self._publish = publish
+        self._store = store
+        self.cancelled = threading.Event()
+        self.id = uuid.uuid4().hex
+        self.key: str | None = None   # clé de regroupement (submit_once)
+        self.stage = QUEUED
+        self.progress = 0.0
+        self.result: Dict | None = None
+        self.error: str | None = None
+        self.timing = ServerTiming()
+        self.created_at = self.updated_at = time.time()
+
+    def check(self) -> None:
+        """Lève JobCancelled si une annulation a été demandée (ici ou, via le store, par un autre worker)."""
+        if self.cancelled.is_set() or (self._store is not None and self._store.cancel_requested(self.id)):
+            self.cancelled.set()
+            raise JobCancelled("Job annulé.")
+
+    def heartbeat(self) -> None:
+        """Entretient la réservation submit_once du job dans le store partagé."""
+        if self.key is not None and self._store is not None:
+            self._store.refresh_inflight(self.key, self.id, INFLIGHT_TTL_S)
+
+    def update(self, stage: str, progress: float) -> None:
+        if stage not in FINAL_STAGES:
+            self.check()
+            self.heartbeat()
+        self.stage, self.progress, self.updated_at = stage, progress, time.time()
+        if self._publish:
+            self._publish(self)
+
+    @property
+    def finished(self) -> bool:
+        return self.stage in FINAL_STAGES
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "stage": self.stage,
+            "progress": round(self.progress, 2),
+            "error": self.error,
+            "result": self.result,
+            "timings": self.timing.as_dict(),
+        }
+
+
+class JobManager:
+    def __init__(self, workers: int | None = None, store=None):
+        self._store = store   # SpecStore partagé (optionnel)
+        workers = workers or int(os.getenv("SPEC_WORKERS", "2"))
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="spec-job")
+        self._jobs: Dict[str, Job] = {}
+        self._inflight: Dict[str, Job] = {}   # clé -> job en cours (submit_once)
+        self._lock = threading.Lock()
+        self._heartbeat: threading.Thread | None = None
+
+    def submit(self, fn: Callable[..., Dict], *args) -> Job:
+        """fn(job, *args) fait avancer job.update(...) et renvoie le résultat final."""
+        job = self._new_job()
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._start(job, fn, *args)
+        return job
+
+    def submit_once(self, key: str, fn: Callable[..., Dict], *args) -> Tuple[Dict, bool]:
+        """
+        Comme submit(), sauf si un job de même clé est déjà en cours : renvoie (état du job, True)
+        sans rien lancer. Sinon (état du nouveau job, False).
+        """
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is not None and not job.finished:
+                COALESCED_REQUESTS.inc(flight="spec", role="follower")
+                return job.to_dict(), True
+            job = self._new_job()
+            job.key = key
+            owner = self._store.claim_inflight(key, job.id, INFLIGHT_TTL_S) if self._store is not None else None
+            if owner is not None:   # réservation vivante : job en cours dans un autre worker
+                status = self._store.get_job(owner) or {
+                    "job_id": owner, "stage": QUEUED, "progress": 0.0, "error": None, "result": None, "timings": {},
+                }
+                if status["stage"] not in FINAL_STAGES:
+                    COALESCED_REQUESTS.inc(flight="spec", role="follower")
+                    return status, True
+                job.key = None   # titulaire terminé mais pas encore libéré : job indépendant
+            self._prune()
+            self._jobs[job.id] = job
+            if job.key is not None:
+                self._inflight[key] = job
+        COALESCED_REQUESTS.inc(flight="spec", role="leader")
+        if job.key is not None and self._store is not None:
+            self._start_heartbeat()
+        self._start(job, fn, *args)
+        return job.to_dict(), False
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Dict | None:
+        """État du job, qu’il tourne dans ce worker ou dans un autre (via le store)."""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self._store.get_job(job_id) if self._store is not None else None
+
+    def cancel(self, job_id: str) -> Dict | None:
+        """Demande l’annulation ; renvoie l’état courant du job (None s’il est inconnu)."""
+        job = self.get(job_id)
+        if job is not None:
+            if not job.finished:
+                job.cancelled.set()
+            return job.to_dict()
+        status = self.status(job_id)
+        if status is not None and status["stage"] not in FINAL_STAGES:
+            self._store.request_cancel(job_id, JOB_TTL_S)   # job exécuté par un autre worker
+        return status
+
+    # ------------------------------------------------------------------
+    def _new_job(self) -> Job:
+        return Job(self._publish if self._store is not None else None, self._store)
+
+    def _start(self, job: Job, fn: Callable[..., Dict], *args) -> None:
+        if self._store is not None:
+            self._publish(job)
+        JOBS_IN_FLIGHT.inc()
+        self._pool.submit(self._run, job, fn, *args)
+
+    def _run(self, job: Job, fn: Callable[..., Dict], *args) -> None:
+        job.timing.add("queue", time.time() - job.created_at)
+        try:
+            with timing_scope(job.timing):
+                job.result = fn(job, *args)
+            job.update(DONE, 1.0)
+        except JobCancelled as exc:
+            job.error = str(exc)
+            job.update(CANCELLED, job.progress)
+        except Exception as exc:
+            traceback.print_exc()
+            job.error = str(exc)
+            job.update(FAILED, job.progress)
+        finally:
+            if job.key is not None:
+                with self._lock:
+                    if self._inflight.get(job.key) is job:
+                        del self._inflight[job.key]
+                if self._store is not None:
+                    self._store.release_inflight(job.key, job.id)
+            JOBS_IN_FLIGHT.dec()
+            JOBS_TOTAL.inc(outcome=job.stage)
+
+    def _start_heartbeat(self) -> None:
+        with self._lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="spec-inflight", daemon=True)
+                self._heartbeat.start()
+
+    def _heartbeat_loop(self) -> None:
+        """Entretient les réservations des jobs de ce worker, y compris en file ou pendant pbi-tools."""
+        while True:
+            time.sleep(INFLIGHT_TTL_S / 3)
+            with self._lock:
+                jobs = list(self._inflight.values())
+            for job in jobs:
+                try:
+                    job.heartbeat()
+                except Exception:
+                    traceback.print_exc()
+
+    def _publish(self, job: Job) -> None:
+        self._store.put_job(job.to_dict(), JOB_TTL_S)
+
+    def _prune(self) -> None:
+        limit = time.time() - JOB_TTL_S
+        for jid in [j.id for j in self._jobs.values() if j.finished and j.updated_at < limit]:
+            del self._jobs[jid]
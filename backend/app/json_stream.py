@@ -0,0 +1,170 @@
+# backend/app/json_stream.py
+"""
+Lecture économe des gros JSON Power BI (Layout, DataModelSchema, database.json).
+
+• Modèle : chargement complet (orjson si disponible) puis élagage immédiat, le
+  plus rapide. Au-delà de MODEL_STREAM_MIN_MB (défaut 32 Mo) et avec ijson
+  (optionnel), parcours en flux : seuls noms de tables, mesures et relations sont
+  matérialisés (partitions, requêtes M, colonnes… jamais chargées en mémoire),
+  au prix d’un parcours ~2× plus lent.
+• Les `config` des visuels (JSON dans une chaîne) sont décodés un par un, à la
+  lecture de leur page ; seule `singleVisual` (type, projections) est gardée.
+• Transcodage UTF-16 → UTF-8 à la volée, par morceaux.
+"""
+import codecs, json, os
+from typing import Dict, Iterator, List
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:   # dépendance optionnelle
+    loads = json.loads
+
+try:
+    import ijson
+    JSON_ERRORS = (ValueError, ijson.JSONError)
+except ImportError:   # dépendance optionnelle
+    ijson = None
+    JSON_ERRORS = (ValueError,)
+
+CHUNK = 1 << 20
+STREAM_MIN_BYTES = int(float(os.getenv("MODEL_STREAM_MIN_MB", "32")) * 1024 * 1024)
+
+
+def _encoding(head: bytes) -> str:
+    """Report/Layout et DataModelSchema sont en UTF-16 LE (sans BOM) dans l’archive."""
+    if head[:2] in (b"\xff\xfe", b"\xfe\xff"):
+        return "utf-16"
+    if head[:3] == b"\xef\xbb\xbf":
+        return "utf-8-sig"
+    if len(head) > 1 and head[1:2] == b"\x00":
+        return "utf-16-le"
+    return "utf-8"
+
+
+class Utf8Reader:
+    """Flux binaire quelconque (UTF-16 / UTF-8 ± BOM) vu comme un flux UTF-8, transcodé par morceaux."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        head = raw.read(4)
+        self._decoder = codecs.getincrementaldecoder(_encoding(head))(errors="ignore")
+        self._buf = bytearray(self._decoder.decode(head).encode("utf-8"))
+        self._eof = False
+
+    def _fill(self, n: int) -> None:
+        while not self._eof and (n is None or n < 0 or len(self._buf) < n):
+            chunk = self._raw.read(CHUNK)
+            self._buf += self._decoder.decode(chunk, final=not chunk).encode("utf-8")
+            self._eof = not chunk
+
+    def peek(self, n: int) -> bytes:
+        """Les n prochains octets (moins en fin de flux), sans les consommer."""
+        self._fill(n)
+        return bytes(self._buf[:n])
+
+    def read(self, n: int = -1) -> bytes:
+        self._fill(n)
+        if n is None or n < 0:
+            out, self._buf = bytes(self._buf), bytearray()
+        else:
+            out = bytes(self._buf[:n])
+            del self._buf[:n]   # bytearray : retrait en tête sans recopier le reste
+        return out
+
+
+# ------------------------------------------------------------------
+# Layout
+# ------------------------------------------------------------------
+def visual_from_config(cfg) -> Dict:
+    """{type, fields} d’un visuel : `config` (chaîne JSON ou déjà décodée), champs = singleVisual.projections."""
+    if isinstance(cfg, (str, bytes)):
+        cfg = loads(cfg or "{}")
+    sv = cfg.get("singleVisual", {})
+    return {
+        "type": sv.get("visualType"),
+        "fields": [
+            p["queryRef"]
+            for role in sv.get("projections", {}).values()
+            for p in role
+            if "queryRef" in p
+        ],
+    }
+
+
+def iter_sections(raw) -> Iterator[Dict]:
+    """Pages (`sections`) d’un Report/Layout, une à une."""
+    if ijson is not None:
+        yield from ijson.items(Utf8Reader(raw), "sections.item", use_float=True)
+    else:
+        yield from loads(Utf8Reader(raw).read()).get("sections", [])
+
+
+# ------------------------------------------------------------------
+# Modèle
+# ------------------------------------------------------------------
+def _slim_model(model: Dict) -> Dict:
+    m = model.get("model", {})
+    return {
+        "model": {
+            "tables": [
+                {
+                    "name": t["name"],
+                    "measures": [{"name": x["name"], "expression": x.get("expression", "")} for x in t.get("measures", [])],
+                }
+                for t in m.get("tables", [])
+            ],
+            "relationships": m.get("relationships", []),
+        }
+    }
+
+
+_MODEL_PREFIXES = frozenset((
+    "model.tables.item", "model.tables.item.name",
+    "model.tables.item.measures.item", "model.tables.item.measures.item.name",
+    "model.tables.item.measures.item.expression", "model.tables.item.measures.item.expression.item",
+    "model.relationships.item",
+))
+
+
+def _stream_model(f) -> Dict:
+    tables: List[Dict] = []
+    relationships: List[Dict] = []
+    table = measure = rel = None
+    for prefix, event, value in ijson.parse(f, use_float=True):
+        if rel is None and prefix not in _MODEL_PREFIXES:
+            continue   # colonnes, partitions, annotations… : ignorées sans rien construire
+        if rel is not None:
+            rel.event(event, value)
+            if prefix == "model.relationships.item" and event == "end_map":
+                relationships.append(rel.value)
+                rel = None
+        elif prefix == "model.relationships.item" and event == "start_map":
+            rel = ijson.ObjectBuilder()
+            rel.event(event, value)
+        elif prefix == "model.tables.item" and event == "start_map":
+            table = {"name": None, "measures": []}
+            tables.append(table)
+        elif prefix == "model.tables.item.name":
+            table["name"] = value
+        elif prefix == "model.tables.item.measures.item" and event == "start_map":
+            measure = {"name": None, "expression": ""}
+            table["measures"].append(measure)
+        elif prefix == "model.tables.item.measures.item.name":
+            measure["name"] = value
+        elif prefix == "model.tables.item.measures.item.expression":
+            if event == "string":
+                measure["expression"] = value
+            elif event == "start_array":
+                measure["expression"] = []
+        elif prefix == "model.tables.item.measures.item.expression.item":
+            measure["expression"].append(value)
+    return {"model": {"tables": tables, "relationships": relationships}}
+
+
+def read_model(raw) -> Dict:
+    """Modèle réduit {model: {tables: [{name, measures}], relationships}} depuis un flux binaire."""
+    reader = Utf8Reader(raw)
+    if ijson is not None and len(reader.peek(STREAM_MIN_BYTES)) >= STREAM_MIN_BYTES:
+        return _stream_model(reader)
+    return _slim_model(loads(reader.read()))
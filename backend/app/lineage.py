@@ -0,0 +1,164 @@
+# backend/app/lineage.py
+"""
+Graphe de dépendances DAX, calculé une fois à l’extraction et stocké dans la spec.
+
+• Nœuds en notation DAX : mesure « [CA HT] », colonne « Sales[Amount] », table « Sales ».
+• Arêtes tirées des références des expressions (commentaires et chaînes ignorés) :
+  mesure → mesure / colonne / table, colonne → sa table.
+• Seules les arêtes directes (depends_on / used_by) sont stockées : les fermetures
+  transitives amont / aval (plus proches d’abord) pèseraient ~5× le reste de la
+  spec. Elles sont calculées à la demande, mémorisées par process et par spec.
+"""
+import os, re, threading
+from collections import OrderedDict, defaultdict, deque
+from typing import Dict, Iterable, List
+
+_TOKEN = re.compile(
+    r'"(?:[^"]|"")*"'                                   # chaîne littérale
+    r"|//[^\n]*|--[^\n]*|/\*.*?\*/"                     # commentaires
+    r"|'(?P<qtable>(?:[^']|'')+)'(?:\[(?P<qcol>(?:[^\]]|\]\])+)\])?"   # 'Table'[Col] / 'Table'
+    r"|(?P<ident>[^\W\d]\w*)(?:\[(?P<col>(?:[^\]]|\]\])+)\]|(?P<call>\s*\())?"   # Table[Col] / Table / FONCTION(
+    r"|\[(?P<ref>(?:[^\]]|\]\])+)\]",                   # [Mesure] / [Colonne]
+    re.S,
+)
+
+UPSTREAM, DOWNSTREAM = "upstream", "downstream"
+CLOSURE_CACHE_SIZE = int(os.getenv("LINEAGE_CACHE_SIZE", "32"))   # specs dont les fermetures restent en mémoire
+
+
+def measure_node(name: str) -> str:
+    return f"[{name}]"
+
+
+def column_node(table: str, column: str) -> str:
+    return f"{table}[{column}]"
+
+
+def node_kind(node: str) -> str:
+    if node.startswith("["):
+        return "measure"
+    return "column" if node.endswith("]") else "table"
+
+
+def _by_lower(names: Iterable[str]) -> Dict[str, str]:
+    return {n.lower(): n for n in names}   # le DAX ne tient pas compte de la casse
+
+
+def dax_references(expr: str, tables_ci: Dict[str, str], measures_ci: Dict[str, str], home: str | None = None) -> List[str]:
+    """Nœuds référencés par une expression DAX (tables / mesures indexées par nom en minuscules), sans doublon."""
+    refs: Dict[str, None] = {}
+
+    def ref(table: str | None, name: str) -> None:
+        name = name.replace("]]", "]")
+        measure = measures_ci.get(name.lower())
+        if measure is not None:
+            refs[measure_node(measure)] = None
+        elif table or home:
+            table = tables_ci.get((table or home).lower(), table or home)
+            refs[column_node(table, name)] = None
+
+    for tok in _TOKEN.finditer(str(expr or "")):
+        if tok["qtable"] is not None:
+            table = tok["qtable"].replace("''", "'")
+            if tok["qcol"] is not None:
+                ref(table, tok["qcol"])
+            else:
+                refs[tables_ci.get(table.lower(), table)] = None
+        elif tok["ident"] is not None:
+            if tok["col"] is not None:
+                ref(tok["ident"], tok["col"])
+            elif tok["call"] is None and tok["ident"].lower() in tables_ci:
+                refs[tables_ci[tok["ident"].lower()]] = None
+        elif tok["ref"] is not None:
+            ref(None, tok["ref"])
+    return list(refs)
+
+
+def _closure(edges: Dict[str, List[str]], node: str) -> List[str]:
+    """Fermeture transitive du nœud, en largeur : dépendances les plus proches d’abord."""
+    seen = {node: None}
+    queue = deque(edges.get(node, ()))
+    while queue:
+        dep = queue.popleft()
+        if dep in seen:   # le DAX interdit les cycles, mais on ne boucle pas si le modèle en contient
+            continue
+        seen[dep] = None
+        queue.extend(edges.get(dep, ()))
+    del seen[node]
+    return list(seen)
+
+
+def build_lineage(spec: Dict) -> Dict:
+    """{depends_on, used_by} : arêtes directes, listes de nœuds (clés absentes = aucune dépendance)."""
+    tables_ci = _by_lower(spec.get("tables", []))
+    measures_ci = _by_lower(m["name"] for m in spec.get("measures", []))
+    depends_on: Dict[str, List[str]] = {}
+    for m in spec.get("measures", []):
+        refs = [r for r in dax_references(m["expr"], tables_ci, measures_ci, home=m["table"]) if r != measure_node(m["name"])]
+        if refs:
+            depends_on[measure_node(m["name"])] = refs
+    for refs in list(depends_on.values()):
+        for r in refs:
+            if node_kind(r) == "column":
+                depends_on.setdefault(r, [r[:r.index("[")]])
+
+    used_by: Dict[str, List[str]] = defaultdict(list)
+    for node, refs in depends_on.items():
+        for r in refs:
+            used_by[r].append(node)
+    return {"depends_on": depends_on, "used_by": dict(used_by)}
+
+
+def lineage_for(spec: Dict) -> Dict:
+    """Graphe stocké dans la spec ; recalculé pour les specs extraites avant son introduction."""
+    return spec.get("lineage") or build_lineage(spec)
+
+
+_CLOSURES: "OrderedDict[str, Dict[str, Dict[str, List[str]]]]" = OrderedDict()   # id -> sens -> nœud -> fermeture
+_CLOSURES_LOCK = threading.Lock()
+
+
+def closure(spec: Dict, node: str, direction: str) -> List[str]:
+    """Nœuds en amont (UPSTREAM) ou en aval (DOWNSTREAM) de node, mémorisés dans un LRU par spec."""
+    with _CLOSURES_LOCK:
+        memo = _CLOSURES.get(spec["id"])
+        if memo is None:
+            memo = _CLOSURES[spec["id"]] = {UPSTREAM: {}, DOWNSTREAM: {}}
+            while len(_CLOSURES) > CLOSURE_CACHE_SIZE:
+                _CLOSURES.popitem(last=False)
+        else:
+            _CLOSURES.move_to_end(spec["id"])
+        out = memo[direction].get(node)
+    if out is None:
+        lineage = lineage_for(spec)
+        out = _closure(lineage["depends_on"] if direction == UPSTREAM else lineage["used_by"], node)
+        memo[direction][node] = out
+    return out
+
+
+def resolve_node(spec: Dict, name: str) -> str | None:
+    """« CA HT », « [CA HT] », « 'Dim Client'[Id] », « Sales »… → identifiant de nœud, ou None."""
+    name = name.strip()
+    lineage = lineage_for(spec)
+    known = {n.lower(): n for part in (lineage["depends_on"], lineage["used_by"]) for n in part}
+    known.update({t.lower(): t for t in spec.get("tables", [])})
+    known.update({measure_node(m["name"]).lower(): measure_node(m["name"]) for m in spec.get("measures", [])})
+    if name.startswith("'") and "'" in name[1:]:
+        table, _, rest = name[1:].partition("'")
+        name = table + rest
+    for candidate in (name, measure_node(name)):
+        if candidate.lower() in known:
+            return known[candidate.lower()]
+    return None
+
+
+def lineage_of(spec: Dict, node: str) -> Dict:
+    lineage = lineage_for(spec)
+    return {
+        "node": node,
+        "kind": node_kind(node),
+        "depends_on": lineage["depends_on"].get(node, []),
+        "used_by": lineage["used_by"].get(node, []),
+        UPSTREAM: closure(spec, node, UPSTREAM),
+        DOWNSTREAM: closure(spec, node, DOWNSTREAM),
+    }
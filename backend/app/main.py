@@ -2,27 +2,53 @@
 -------------------------------------------------------------
 • Ajoute des consignes pour obtenir des réponses pédagogiques
   (explication en français, pas de formule DAX brute sauf demande).
-• Légère refacto + constante MAX_JSON pour ajuster la taille du
-  contexte transmis au LLM.
+• Légère refacto + constante CONTEXT_TOKEN_BUDGET pour ajuster la taille
+  du contexte transmis au LLM (entrées choisies via un index BM25 par spec).
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import time
+_T_IMPORTS = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-import tempfile
-import json
-from typing import Dict
+import asyncio, json, os
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Literal
 
-from .extract_pbix import extract_spec
-from .generate_narrative import generate_narrative
-from common.azure_llm import azure_llm_chat
+from .extract_pbix import extract_spec, EXTRACTOR_VERSION
+from .generate_narrative import (
+    PROMPT_VERSION, SECTIONS, generate_sections, parse_narrative, render_narrative,
+)
+from .spec_cache import SpecCache, cache_key
+from .jobs import Job, JobManager, EXTRACTING, NARRATING, FINAL_STAGES
+from .extract_executor import EXECUTOR
+from .upload import SavedUpload, save_upload
+from .spec_index import CONTEXT_TOKEN_BUDGET, index_for
+from .state import STORE
+from .spec_prompt import LEGEND
+from .answer_cache import AnswerCache, answer_key
+from .spec_diff import diff_specs
+from .lineage import UPSTREAM, DOWNSTREAM, lineage_of, resolve_node
+from .spec_browse import DEFAULT_LIMIT, MAX_LIMIT, browse, summary
+from .search_index import SearchIndex, DEFAULT_LIMIT as SEARCH_DEFAULT_LIMIT, MAX_LIMIT as SEARCH_MAX_LIMIT
+from .singleflight import SingleFlight
+from .warmup import READINESS, lifespan
+from common.metrics import (
+    CACHE_REQUESTS, UPLOAD_BYTES, render as render_metrics, server_timing_header, stage, timing_scope,
+)
+# common.azure_llm (httpx) est importé au warm-up, pas ici : /healthz répond plus tôt
 
-app = FastAPI(title="Klint PBIX Spec & Chat API", version="2.0")
+app = FastAPI(title="Klint PBIX Spec & Chat API", version="2.0", lifespan=lifespan)
 
 # ----------------------------------------------------------------------------------------------------------------------
-# Cache mémoire : id_spec -> JSON technique (⚠️ non persistant → prévoir Redis pour le multi-instance)
+# Store partagé : id_spec -> JSON technique (LRU mémoire borné + SQLite/Redis commun à tous les workers)
 # ----------------------------------------------------------------------------------------------------------------------
-CACHE: Dict[str, Dict] = {}
-MAX_JSON_LENGTH = 8_000   # caractères de contexte pour le LLM
+SPEC_CACHE = SpecCache()   # cache disque persistant : sha256(pbix) -> (technique, fonctionnel)
+JOBS = JobManager(store=STORE)   # pool de threads : pbi-tools + LLM hors boucle asyncio
+ANSWERS = AnswerCache()   # réponses du chat : (spec, question normalisée, version du prompt) -> texte
+SEARCH = SearchIndex()   # index plein texte de tous les rapports (dernière version de chacun)
+CHAT_FLIGHTS = SingleFlight("chat")   # même (spec, question normalisée) en vol → un seul appel LLM
 
 # ------------------------------------------------------------
 # Pydantic Schemas
@@ -30,7 +56,18 @@ MAX_JSON_LENGTH = 8_000   # caractères de contexte pour le LLM
 class SpecResponse(BaseModel):
     id: str
     functional: str   # markdown
-    technical: dict   # json brut
+    summary: dict     # compteurs ; le détail se consulte par tranches (/api/spec/{id}/measures…)
+    diff: dict | None = None        # diff avec la version précédente du même rapport
+    regenerated: list[str] = []     # sections réécrites par le LLM (les autres sont reprises)
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    stage: str        # queued | extracting | narrating | done | failed | cancelled
+    progress: float   # 0 → 1
+    error: str | None = None
+    result: SpecResponse | None = None
+    timings: Dict[str, float] = {}   # ms par étape (queue, extract, parse, narrative, llm…)
 
 
 class ChatRequest(BaseModel):
@@ -43,58 +80,412 @@ class ChatResponse(BaseModel):
 
 
 # ------------------------------------------------------------
-# Endpoint SPEC : /api/spec
+# Instrumentation : Server-Timing par requête + /metrics (format Prometheus)
+# ------------------------------------------------------------
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Étapes chronométrées pendant la requête (upload, cache, context, llm…) + total, en Server-Timing."""
+    t0 = time.perf_counter()
+    with timing_scope() as timing:
+        response = await call_next(request)
+    timings = {**timing.as_dict(), "total": round((time.perf_counter() - t0) * 1000, 1)}
+    own = response.headers.get("Server-Timing")   # ex. durées d’un job, posées par l’endpoint
+    response.headers["Server-Timing"] = ", ".join(filter(None, [own, server_timing_header(timings)]))
+    return response
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ------------------------------------------------------------
+# Sondes : /healthz (process vivant) et /readyz (warm-up terminé, dépendances OK)
+# ------------------------------------------------------------
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    """200 une fois le warm-up réussi ; 503 pendant le warm-up ou si une vérification bloquante échoue."""
+    READINESS.start()
+    if not READINESS.ready:
+        response.status_code = 503
+    return READINESS.as_dict()
+
+
+# ------------------------------------------------------------
+# Endpoint SPEC : /api/spec (asynchrone → job) + suivi /api/spec/jobs/{id}
+# Les lectures de spec (store / cache SQLite, décodage JSON, filtres, diff, lignage)
+# sont des handlers synchrones : FastAPI les exécute hors de la boucle asyncio.
 # ------------------------------------------------------------
-@app.post("/api/spec", response_model=SpecResponse)
-async def build_spec(pbix: UploadFile = File(...)):
-    """Extraction des métadonnées d’un .pbix et génération de la spécification fonctionnelle."""
-    # --- 1) Sauvegarde temporaire du fichier ---------------------------------------------------
+def _report_name(filename: str | None) -> str | None:
+    return Path(filename).stem if filename else None
+
+
+def _load_spec(spec_id: str) -> tuple | None:
+    """(technique, fonctionnel) d’une spec déjà générée, depuis le cache disque."""
+    return SPEC_CACHE.get(cache_key(spec_id, EXTRACTOR_VERSION, PROMPT_VERSION))
+
+
+def _shared_spec(spec_id: str) -> Dict | None:
+    """Spec technique depuis le store partagé ; expirée, relue dans le cache disque et republiée."""
+    tech = STORE.get_spec(spec_id)
+    if tech is None:
+        cached = _load_spec(spec_id)
+        if cached is not None:
+            tech = cached[0]
+            STORE.put_spec(tech, current=False)
+    return tech
+
+
+def _stored_spec(spec_id: str) -> Dict:
+    """Spec technique (store partagé, à défaut cache disque) ; 404 sinon."""
+    tech = _shared_spec(spec_id)
+    if tech is None:
+        raise HTTPException(404, "Spec inconnue ou expirée du cache.")
+    return tech
+
+
+def _previous_id(report: str, spec_id: str) -> str | None:
+    """Version du rapport qui précède spec_id (la dernière connue, ou celle d’avant si c’est déjà spec_id)."""
+    previous_id = SPEC_CACHE.latest_version(report)
+    if previous_id == spec_id:   # même version ré-envoyée : on compare à celle d’avant
+        previous_id = SPEC_CACHE.previous_version(report, spec_id)
+    return previous_id
+
+
+def _record_report(technical: Dict, report: str, previous_id: str | None) -> None:
+    SPEC_CACHE.record_version(report, technical["id"], previous_id)
+    SEARCH.index_spec(technical, report)
+
+
+def _join_report(report: str, spec_id: str) -> None:
+    """Envoi rattaché au job d’un même contenu : version du rapport enregistrée à la fin de ce job."""
+    SPEC_CACHE.defer_version(report, spec_id, _previous_id(report, spec_id))
+    cached = _load_spec(spec_id)
+    if cached is not None:   # job déjà au-delà de take_deferred : on enregistre nous-mêmes
+        for other, previous_id in SPEC_CACHE.take_deferred(spec_id):
+            _record_report(cached[0], other, previous_id)
+
+
+def _run_spec_job(job: Job, upload: SavedUpload) -> Dict:
+    """Exécuté dans le pool de jobs : jamais dans la boucle asyncio."""
+    report = _report_name(upload.filename)
+    previous_id = _previous_id(report, upload.sha256) if report else None
+    previous = _load_spec(previous_id) if previous_id else None
+    diff, regenerated = None, []
     try:
-        tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pbix")
-        tmp_file.write(await pbix.read())
-        tmp_file.close()
-    except Exception as exc:
-        raise HTTPException(500, f"Erreur lors de la sauvegarde du PBIX : {exc}")
+        job.check()   # annulé pendant qu’il attendait un thread du pool
+        # --- 1) Cache disque (même fichier déjà analysé ?) --------------------------------------
+        key = cache_key(upload.sha256, EXTRACTOR_VERSION, PROMPT_VERSION)
+        cached = SPEC_CACHE.get(key)
+        CACHE_REQUESTS.inc(cache="spec", result="miss" if cached is None else "hit")
+        if cached is not None:
+            technical, functional = cached
+        else:
+            # --- 2) Extraction technique --------------------------------------------------------
+            job.update(EXTRACTING, 0.1)
+            with stage("extract"):
+                technical = extract_spec(upload.path, spec_id=upload.sha256, check=job.check)
 
-    # --- 2) Extraction technique + rédaction fonctionnelle --------------------------------------
-    technical = extract_spec(tmp_file.name)
-    functional = generate_narrative(technical)
+            # --- 3) Rédaction : seulement les sections touchées depuis la version précédente ----
+            sections: Dict[str, str] = {}
+            regenerated = SECTIONS
+            if previous is not None:
+                diff = diff_specs(previous[0], technical)
+                sections = parse_narrative(previous[1])
+                regenerated = [s for s in SECTIONS if s in diff["sections"] or s not in sections]
+            job.update(NARRATING, 0.5)
+            if regenerated:
+                with stage("narrative"):
+                    sections.update(generate_sections(
+                        technical, regenerated,
+                        on_progress=lambda done, total: job.update(NARRATING, 0.5 + 0.45 * done / total),
+                    ))
+            functional = render_narrative(sections)
+            SPEC_CACHE.put(key, technical, functional)
+    finally:
+        upload.cleanup()
 
-    # --- 3) Cache & réponse --------------------------------------------------------------------
-    CACHE[technical["id"]] = technical
+    if diff is None and previous is not None:
+        diff = diff_specs(previous[0], technical)
+
+    # --- 4) Store partagé, versions & index de recherche (spec + global), résultat --------------
+    STORE.put_spec(technical)
+    index_for(technical)
+    if report:
+        _record_report(technical, report, previous_id)
+    else:
+        SEARCH.index_spec(technical)
+    for other, other_previous in SPEC_CACHE.take_deferred(technical["id"]):   # même contenu, autres noms
+        _record_report(technical, other, other_previous)
     return {
         "id": technical["id"],
         "functional": functional,
-        "technical": technical,
+        "summary": summary(technical),
+        "diff": diff,
+        "regenerated": regenerated,
     }
 
 
+# corps lu à la main (streaming) : on documente quand même le formulaire pour /docs
+_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["pbix"],
+                    "properties": {"pbix": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
+
+@app.post("/api/spec", response_model=JobResponse, status_code=202, openapi_extra=_UPLOAD_OPENAPI)
+async def build_spec(request: Request):
+    """Réception d’un .pbix : renvoie tout de suite un id de job à interroger."""
+    # --- Écriture streamée sur disque + hash au fil de l’eau -----------------------------------
+    try:
+        with stage("upload"):
+            upload = await save_upload(request)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(500, f"Erreur lors de la sauvegarde du PBIX : {exc}")
+    UPLOAD_BYTES.inc(upload.size)
+
+    # même contenu déjà en cours d’analyse (quel que soit le nom du fichier) → même job : une
+    # seule extraction. Son diff est celui du premier rapport ; la version des autres est
+    # enregistrée à la fin du job. Store partagé (SQLite ou Redis) : hors de la boucle.
+    status, joined = await asyncio.to_thread(JOBS.submit_once, upload.sha256, _run_spec_job, upload)
+    if joined:
+        upload.cleanup()
+        report = _report_name(upload.filename)
+        if report:
+            await asyncio.to_thread(_join_report, report, upload.sha256)
+    return status
+
+
+@app.get("/api/spec/jobs/{job_id}", response_model=JobResponse)
+def spec_job(job_id: str, response: Response):
+    status = JOBS.status(job_id)
+    if status is None:
+        raise HTTPException(404, "Job inconnu ou expiré.")
+    if status.get("timings"):
+        response.headers["Server-Timing"] = server_timing_header({f"job_{k}": v for k, v in status["timings"].items()})
+    return status
+
+
+@app.delete("/api/spec/jobs/{job_id}", response_model=JobResponse, status_code=202)
+def cancel_spec_job(job_id: str):
+    """Annule un job en file ou en cours (pbi-tools est tué) ; suivre ensuite /api/spec/jobs/{id}."""
+    status = JOBS.cancel(job_id)
+    if status is None:
+        raise HTTPException(404, "Job inconnu ou expiré.")
+    if status["stage"] in FINAL_STAGES:
+        raise HTTPException(409, f"Job déjà terminé ({status['stage']}).")
+    return status
+
+
+@app.get("/api/extract/queue")
+async def extract_queue():
+    """File pbi-tools de ce worker : processus en attente / en cours, limites."""
+    return EXECUTOR.stats()
+
+
+@app.get("/api/spec/{spec_id}/diff")
+def spec_diff(spec_id: str, against: str | None = None, report: str | None = None):
+    """
+    Diff structurel de la spec avec `against`, ou par défaut avec la version précédente du rapport
+    (`report`, facultatif si un seul rapport a envoyé ce contenu).
+    """
+    if against is None:
+        reports = [report] if report else SPEC_CACHE.reports_of(spec_id)
+        if len(reports) > 1:
+            raise HTTPException(409, f"Contenu partagé par plusieurs rapports ({', '.join(reports)}) : préciser `report`.")
+        against = SPEC_CACHE.previous_version(reports[0], spec_id) if reports else None
+    if against is None:
+        raise HTTPException(404, "Aucune version précédente connue pour cette spec.")
+    new, old = _load_spec(spec_id), _load_spec(against)
+    if new is None or old is None:
+        raise HTTPException(404, "Spec inconnue ou expirée du cache.")
+    return diff_specs(old[0], new[0])
+
+
+@app.get("/api/spec/{spec_id}/lineage")
+def spec_lineage(spec_id: str, node: str, direction: Literal["upstream", "downstream", "both"] = "both"):
+    """
+    Lignage d’une mesure (« CA HT » ou « [CA HT] »), d’une colonne (« Sales[Amount] ») ou d’une table :
+    dépendances directes et fermetures amont / aval, lues dans le graphe pré-calculé.
+    """
+    tech = _stored_spec(spec_id)
+    resolved = resolve_node(tech, node)
+    if resolved is None:
+        raise HTTPException(404, f"Nœud inconnu dans le modèle : {node}")
+    out = lineage_of(tech, resolved)
+    if direction == UPSTREAM:
+        del out[DOWNSTREAM], out["used_by"]
+    elif direction == DOWNSTREAM:
+        del out[UPSTREAM], out["depends_on"]
+    return out
+
+
+@app.get("/api/spec/{spec_id}")
+def spec_summary(spec_id: str):
+    """Compteurs de la spec (tables, mesures, relations, pages)."""
+    return summary(_stored_spec(spec_id))
+
+
+@app.get("/api/spec/{spec_id}/{kind}")
+def spec_items(
+    spec_id: str,
+    kind: Literal["measures", "tables", "relations", "pages"],
+    q: str = "",
+    table: str | None = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+):
+    """Tranche filtrée (texte `q`, `table`) de la spec technique : {total, offset, limit, items}."""
+    return browse(_stored_spec(spec_id), kind, q, table, offset, limit)
+
+
 # ------------------------------------------------------------
-# Endpoint CHAT : /api/chat
+# Endpoint SEARCH : recherche dans tous les rapports ingérés
 # ------------------------------------------------------------
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
-    tech = CACHE.get(req.id)
-    if tech is None:
-        raise HTTPException(400, "⛔ PBIX non chargé. Recharge d’abord un fichier.")
+@app.get("/api/search")
+def search(
+    q: str,
+    kind: Literal["measures", "tables", "relations", "pages"] | None = None,
+    report: str | None = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+):
+    """
+    « Quels rapports définissent la mesure CA HT ? », « où la table DimClient est-elle utilisée ? » :
+    {q, total, offset, limit, items[{report, spec_id, kind, name, table, match, snippet}]}, par pertinence.
+    Synchrone : FastAPI l’exécute dans son pool de threads (SQLite bloquant, écritures des jobs).
+    """
+    with stage("search"):
+        return SEARCH.search(q, kind, report, offset, limit)
 
-    question = req.question.strip()
-    if not question:
-        return {"answer": "Pose une vraie question 😉"}
 
+# ------------------------------------------------------------
+# Endpoint CHAT : /api/chat (+ variante streaming SSE /api/chat/stream)
+# ------------------------------------------------------------
+EMPTY_QUESTION_ANSWER = "Pose une vraie question 😉"
+CHAT_PROMPT_VERSION = "3"   # à incrémenter dès que le prompt du chat change (invalide le cache)
+
+
+def _chat_messages(tech: Dict, question: str) -> list:
     # --------------------------- PROMPT LLM ----------------------------------------------------
+    overview = (
+        f"{len(tech['tables'])} tables, {len(tech['measures'])} mesures, {len(tech['pages'])} pages."
+    )
+    context = index_for(tech).context(question, CONTEXT_TOKEN_BUDGET)
     system_content = (
         "Tu es un expert Power BI. Tu dois répondre *uniquement* en te basant sur le modèle « GreenTech équipe 1 » "
-        "fourni ci-dessous (tronqué pour rester dans la limite) :\n\n" + json.dumps(tech)[:MAX_JSON_LENGTH] +
+        f"({overview}) dont voici les éléments pertinents pour la question :\n\n{LEGEND}\n" + context +
         "\n\n👉 Si l’utilisateur demande *comment* une mesure est calculée, explique-le en français clair et pédagogique, "
         "sans afficher la formule DAX complète tant qu’il ne la réclame pas explicitement. Utilise des exemples concrets "
         "au besoin (pourcentage, somme, ratio, etc.)."
     )
 
-    messages = [
+    return [
         {"role": "system", "content": system_content},
         {"role": "user", "content": question},
     ]
 
-    answer, _ = azure_llm_chat(messages)
+
+def _llm_answer(key: str, tech: Dict, question: str, stream: bool) -> Callable[[], AsyncIterator[str]]:
+    """Calcul partagé par CHAT_FLIGHTS : réponse (complète ou token par token), mise en cache une fois finie."""
+    async def source():
+        with stage("context"):   # index BM25 éventuellement (re)construit : hors de la boucle
+            messages = await asyncio.to_thread(_chat_messages, tech, question)
+        if stream:
+            from common.azure_llm import azure_llm_chat_stream_async
+            parts = []
+            async for delta in azure_llm_chat_stream_async(messages):
+                parts.append(delta)
+                yield delta
+            await asyncio.to_thread(ANSWERS.put, key, "".join(parts))
+        else:
+            from common.azure_llm import azure_llm_chat_async
+            answer, _ = await azure_llm_chat_async(messages)
+            await asyncio.to_thread(ANSWERS.put, key, answer)
+            yield answer
+    return source
+
+
+def _chat_spec(req: ChatRequest) -> Dict:
+    """Bloquant (store partagé, décodage JSON) : à appeler via asyncio.to_thread."""
+    tech = _shared_spec(req.id)
+    if tech is None:
+        raise HTTPException(400, "⛔ PBIX non chargé. Recharge d’abord un fichier.")
+    return tech
+
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    tech = await asyncio.to_thread(_chat_spec, req)
+
+    question = req.question.strip()
+    if not question:
+        return {"answer": EMPTY_QUESTION_ANSWER}
+
+    key = answer_key(tech["id"], question, CHAT_PROMPT_VERSION)
+    with stage("cache"):   # palier SQLite éventuel : hors de la boucle
+        answer = await asyncio.to_thread(ANSWERS.get, key)
+    CACHE_REQUESTS.inc(cache="answer", result="miss" if answer is None else "hit")
+    if answer is None:   # question identique déjà en vol : on attend la même réponse
+        answer = await CHAT_FLIGHTS.join(key, _llm_answer(key, tech, question, stream=False)).result()
     return {"answer": answer}
+
+
+def _sse(data: Dict, event: str | None = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Même contrat que /api/chat, mais les tokens sont relayés en Server-Sent Events dès leur arrivée."""
+    tech = await asyncio.to_thread(_chat_spec, req)
+    question = req.question.strip()
+
+    async def events():
+        key = answer_key(tech["id"], question, CHAT_PROMPT_VERSION)
+        cached = await asyncio.to_thread(ANSWERS.get, key) if question else EMPTY_QUESTION_ANSWER
+        if question:
+            CACHE_REQUESTS.inc(cache="answer", result="miss" if cached is None else "hit")
+        if cached is not None:
+            yield _sse({"delta": cached})
+        else:   # abonné tardif : rejoue les tokens déjà reçus puis suit le flux
+            try:
+                async for delta in CHAT_FLIGHTS.join(key, _llm_answer(key, tech, question, stream=True)).stream():
+                    yield _sse({"delta": delta})
+            except Exception as exc:
+                yield _sse({"detail": str(exc)}, event="error")
+                return
+        yield _sse({}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/chat/cache")
+async def chat_cache_stats():
+    """Compteurs du cache de réponses (hits, misses, taille) + appels LLM en vol dans ce worker."""
+    return {**ANSWERS.stats(), "in_flight": CHAT_FLIGHTS.in_flight()}
+
+
+READINESS.record("imports", time.perf_counter() - _T_IMPORTS)
@@ -0,0 +1,290 @@
+# backend/app/search_index.py
+"""
+Index de recherche global, tous rapports confondus (SQLite FTS5).
+
+• Une entrée par mesure (nom, table, DAX), table, relation et page (visuels + champs).
+• Clé = nom du rapport : une nouvelle version remplace les entrées de la précédente
+  (DELETE indexé + INSERT dans une transaction) ; même spec déjà indexée → rien à faire.
+• Accents et casse ignorés ; tous les mots requis ; `mot*` = préfixe.
+• Classement par paliers (nom identique > nom > table > corps DAX / champs), puis
+  nom le plus court. Le nom identique est cherché en SQL (colonne `norm` indexée :
+  mots du nom sans accents ni casse), quelle que soit la page demandée. Pas de bm25 FTS5 : son IDF relit la liste complète de chaque
+  terme à chaque requête (des dizaines de ms par mot courant sur 500 k entrées).
+  Les paliers nom et table sont toujours complets ; pour les correspondances dans
+  le corps seulement, au-delà de SEARCH_RANK_CANDIDATES (défaut 2 000) seules les
+  plus récemment indexées sont classées : `truncated: true`, total reste exact.
+• Alimenté par les jobs de spec et par backend.app.batch ; rattrapage des specs
+  déjà en cache :
+
+    python -m backend.app.search_index --backfill
+    python -m backend.app.search_index "CA HT" --kind measures
+"""
+import json, os, re, sqlite3, sys, threading, time
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+from dotenv import load_dotenv
+load_dotenv()
+
+from .spec_browse import fold
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_DB = ROOT / ".cache" / "search_index.sqlite3"
+KINDS = ("measures", "tables", "relations", "pages")
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+RANK_CANDIDATES = int(os.getenv("SEARCH_RANK_CANDIDATES", "2000"))
+
+_WORD = re.compile(r"(\w+)(\*?)")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    report     TEXT PRIMARY KEY,
+    spec_id    TEXT NOT NULL,
+    entries    INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id      INTEGER PRIMARY KEY,
+    report  TEXT NOT NULL,
+    spec_id TEXT NOT NULL,
+    kind    TEXT NOT NULL,
+    name    TEXT NOT NULL,
+    tbl     TEXT NOT NULL,
+    body    TEXT NOT NULL,
+    norm    TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS entries_report ON entries(report);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    name, tbl, body, kind, content='entries', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts(rowid, name, tbl, body, kind) VALUES (new.id, new.name, new.tbl, new.body, new.kind);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts(entries_fts, rowid, name, tbl, body, kind)
+    VALUES ('delete', old.id, old.name, old.tbl, old.body, old.kind);
+END;
+"""
+
+
+def normalize(text: str) -> str:
+    """Mots du texte sans accents ni casse : clé du palier « nom identique »."""
+    return " ".join(w for w, _ in _WORD.findall(fold(text)))
+
+
+def spec_entries(spec: Dict) -> Iterator[Tuple[str, str, str, str]]:
+    """(kind, name, tbl, body) de chaque objet indexé de la spec."""
+    for m in spec.get("measures", []):
+        yield "measures", m["name"], m["table"], m["expr"]
+    for t in spec.get("tables", []):
+        yield "tables", t, t, ""
+    for r in spec.get("relations", []):
+        name = f"{r.get('fromTable')}[{r.get('fromColumn')}] → {r.get('toTable')}[{r.get('toColumn')}]"
+        yield "relations", name, f"{r.get('fromTable')} {r.get('toTable')}", ""
+    for p in spec.get("pages", []):
+        visuals = p.get("visuals", [])
+        body = " ".join([v.get("type") or "" for v in visuals] + [str(f) for v in visuals for f in v.get("fields", [])])
+        yield "pages", p["name"], "", body
+
+
+def fts_query(q: str, kind: str | None = None, columns: str = "name tbl body", exclude: Tuple[str, ...] = ()) -> str | None:
+    """
+    Texte libre → requête FTS5 sûre : mots entre guillemets (ET implicite), `mot*` en préfixe.
+    exclude : colonnes qui ne doivent pas contenir tous les mots (paliers disjoints).
+    """
+    terms = _WORD.findall(q)
+    if not terms:
+        return None
+    words = " ".join(f'"{word}"{star}' for word, star in terms)
+    match = f"{{{columns}}} : ({words})"
+    if kind is not None:
+        if kind not in KINDS:
+            raise ValueError(f"kind inconnu : {kind}")
+        match = f'kind : "{kind}" AND {match}'
+    for column in exclude:
+        match = f"({match}) NOT {{{column}}} : ({words})"
+    return match
+
+
+class SearchIndex:
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path or os.getenv("SEARCH_INDEX_PATH", DEFAULT_DB))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")   # plusieurs workers écrivent dans le même fichier
+        self._db.executescript(_SCHEMA)
+        self._migrate()
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_norm ON entries(norm)")
+
+    def _migrate(self) -> None:
+        """Index créé avant la colonne `norm` : ajout puis calcul pour les entrées existantes."""
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(entries)")]
+        if "norm" in columns:
+            return
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("ALTER TABLE entries ADD COLUMN norm TEXT NOT NULL DEFAULT ''")
+                self._db.executemany(
+                    "UPDATE entries SET norm = ? WHERE id = ?",
+                    ((normalize(name), rowid) for rowid, name in self._db.execute("SELECT id, name FROM entries").fetchall()),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    # ------------------------------------------------------------------
+    def index_spec(self, spec: Dict, report: str | None = None) -> bool:
+        """Indexe (ou ré-indexe) la spec sous `report` (à défaut son id) ; False si déjà à jour."""
+        report = report or spec["id"]
+        rows = [(report, spec["id"], *entry, normalize(entry[1])) for entry in spec_entries(spec)]
+        with self._lock:
+            current = self._db.execute("SELECT spec_id FROM reports WHERE report = ?", (report,)).fetchone()
+            if current is not None and current[0] == spec["id"]:
+                return False
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM entries WHERE report = ?", (report,))
+                self._db.executemany(
+                    "INSERT INTO entries (report, spec_id, kind, name, tbl, body, norm) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?)", (report, spec["id"], len(rows), time.time())
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return True
+
+    def search(self, q: str, kind: str | None = None, report: str | None = None,
+               offset: int = 0, limit: int = DEFAULT_LIMIT) -> Dict:
+        """
+        {q, total, truncated, offset, limit, items} ; items triés par pertinence :
+        match = exact (nom identique) > name > table > body, puis nom le plus court,
+        puis indexation la plus récente. truncated → une partie des correspondances
+        dans le corps seulement n’est pas classée (total reste le compte exact).
+        """
+        limit = max(1, min(limit, MAX_LIMIT))
+        offset = max(0, offset)
+        out = {"q": q, "total": 0, "truncated": False, "offset": offset, "limit": limit, "items": []}
+        match = fts_query(q, kind)
+        if match is None:
+            return out
+        scope, params = "", []
+        if report:
+            scope, params = " AND entries_fts.rowid IN (SELECT id FROM entries WHERE report = ?)", [report]
+        # palier « nom identique » : lu dans l’index sur `norm`, sans passer par FTS5
+        exact_where, exact_params = "e.norm = ?", [normalize(q)]
+        for column, value in (("kind", kind), ("report", report)):
+            if value:
+                exact_where, exact_params = f"{exact_where} AND e.{column} = ?", exact_params + [value]
+        tiers = [   # paliers disjoints, du plus pertinent au moins pertinent : (palier, MATCH, filtre sur e)
+            ("name", fts_query(q, kind, "name"), " AND e.norm != ?", exact_params[:1]),
+            ("table", fts_query(q, kind, "tbl", exclude=("name",)), "", []),
+            ("body", fts_query(q, kind, exclude=("name", "tbl")), "", []),
+        ]
+        page: List[Tuple[str, tuple]] = []
+        with self._lock:
+            total = self._count(match, scope, params)
+            sizes = {"exact": self._db.execute(
+                f"SELECT COUNT(*) FROM entries e WHERE {exact_where}", exact_params
+            ).fetchone()[0]}
+            sizes["name"] = self._count(tiers[0][1], scope, params) - sizes["exact"]
+            sizes["table"] = self._count(tiers[1][1], scope, params)
+            sizes["body"] = total - sizes["exact"] - sizes["name"] - sizes["table"]
+            if offset < sizes["exact"]:
+                page.extend(("exact", r) for r in self._db.execute(
+                    f"SELECT e.id, e.report, e.spec_id, e.kind, e.name, e.tbl FROM entries e "
+                    f"WHERE {exact_where} ORDER BY e.id DESC LIMIT ? OFFSET ?",
+                    [*exact_params, limit, offset],
+                ).fetchall())
+            start, end = offset - sizes["exact"], offset + limit - sizes["exact"]   # fenêtre relative au palier courant
+            for tier, tier_match, clause, clause_params in tiers:
+                if end <= 0:
+                    break
+                tier_scope, tier_params, size = scope + clause, params + clause_params, sizes[tier]
+                if tier == "body" and size > RANK_CANDIDATES:   # seuls les plus récemment indexés sont classés
+                    floor = self._db.execute(
+                        f"SELECT rowid FROM entries_fts WHERE entries_fts MATCH ?{scope} "
+                        f"ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+                        [tier_match, *params, RANK_CANDIDATES - 1],
+                    ).fetchone()
+                    tier_scope, tier_params = scope + " AND entries_fts.rowid >= ?", params + [floor[0]]
+                    size, out["truncated"] = RANK_CANDIDATES, True
+                if start < size:
+                    rows = self._db.execute(
+                        f"""
+                        SELECT e.id, e.report, e.spec_id, e.kind, e.name, e.tbl
+                        FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid
+                        WHERE entries_fts MATCH ?{tier_scope}
+                        ORDER BY length(e.name), e.id DESC LIMIT ? OFFSET ?
+                        """,
+                        [tier_match, *tier_params, min(end, size) - max(start, 0), max(start, 0)],
+                    ).fetchall()
+                    page.extend((tier, r) for r in rows)
+                start, end = start - size, end - size
+            snippets = dict(self._db.execute(   # extraits calculés pour la page seulement
+                f"SELECT rowid, snippet(entries_fts, 2, '**', '**', '…', 12) FROM entries_fts "
+                f"WHERE entries_fts MATCH ? AND rowid IN ({','.join('?' * len(page))})",
+                [match, *(r[0] for _, r in page)],
+            ).fetchall()) if page else {}
+        out["total"] = total
+        out["items"] = [
+            {"report": r[1], "spec_id": r[2], "kind": r[3], "name": r[4], "table": r[5] or None,
+             "match": tier, "snippet": snippets.get(r[0]) or None}
+            for tier, r in page
+        ]
+        return out
+
+    def _count(self, match: str, scope: str, params: List) -> int:
+        return self._db.execute(
+            f"SELECT COUNT(*) FROM entries_fts WHERE entries_fts MATCH ?{scope}", [match, *params]
+        ).fetchone()[0]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            reports, entries = self._db.execute("SELECT COUNT(*), COALESCE(SUM(entries), 0) FROM reports").fetchone()
+        return {"reports": reports, "entries": entries}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Rattrapage : dernière version de chaque rapport présent dans le cache des specs
+# ----------------------------------------------------------------------------------------------------------------------
+def backfill(index: SearchIndex) -> int:
+    from .extract_pbix import EXTRACTOR_VERSION
+    from .generate_narrative import PROMPT_VERSION
+    from .spec_cache import SpecCache, cache_key
+
+    cache, added = SpecCache(), 0
+    for report, spec_id in cache.latest_versions():
+        cached = cache.get(cache_key(spec_id, EXTRACTOR_VERSION, PROMPT_VERSION))
+        if cached is not None:
+            added += index.index_spec(cached[0], report)
+    return added
+
+
+def main(argv: List[str] | None = None) -> int:
+    import argparse
+    ap = argparse.ArgumentParser(description="Index de recherche global des specs.")
+    ap.add_argument("q", nargs="?", help="recherche (texte libre)")
+    ap.add_argument("--kind", choices=KINDS)
+    ap.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    ap.add_argument("--backfill", action="store_true", help="indexe les specs déjà présentes dans le cache")
+    args = ap.parse_args(argv)
+
+    index = SearchIndex()
+    if args.backfill:
+        print(f"{backfill(index)} rapport(s) indexé(s) – {index.stats()}")
+    if args.q:
+        print(json.dumps(index.search(args.q, args.kind, limit=args.limit), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# backend/app/singleflight.py
+"""
+Regroupement des calculs identiques en vol (« single flight »), côté asyncio.
+
+• join(key, source) : le premier appel lance source() dans sa propre tâche ; les
+  suivants, tant qu’elle tourne, s’abonnent au même calcul au lieu d’en relancer un.
+• Les morceaux produits (tokens du LLM) sont conservés : un abonné tardif rejoue
+  ceux déjà reçus puis suit les suivants (stream()), ou attend le tout (result()).
+• La tâche ne dépend d’aucun client : une déconnexion n’interrompt pas les autres.
+• Par worker ; pbix_coalesced_requests_total{flight, role = leader | follower}.
+"""
+import asyncio
+from typing import AsyncIterator, Callable, Dict, List
+
+from common.metrics import COALESCED_REQUESTS
+
+
+class Flight:
+    def __init__(self, source: AsyncIterator[str]):
+        self.parts: List[str] = []
+        self.error: BaseException | None = None
+        self.finished = False
+        self._cond = asyncio.Condition()
+        self.task = asyncio.get_running_loop().create_task(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[str]) -> None:
+        try:
+            async for part in source:
+                async with self._cond:
+                    self.parts.append(part)
+                    self._cond.notify_all()
+        except Exception as exc:   # relevée chez chaque abonné
+            self.error = exc
+        finally:
+            async with self._cond:
+                self.finished = True
+                self._cond.notify_all()
+
+    async def stream(self) -> AsyncIterator[str]:
+        """Tous les morceaux depuis le début, puis les suivants au fil de l’eau ; lève l’erreur du calcul."""
+        sent = 0
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: sent < len(self.parts) or self.finished)
+                new, finished = self.parts[sent:], self.finished
+            for part in new:
+                yield part
+            sent += len(new)
+            if finished:
+                if self.error is not None:
+                    raise self.error
+                return
+
+    async def result(self) -> str:
+        await asyncio.shield(self.task)
+        if self.error is not None:
+            raise self.error
+        return "".join(self.parts)
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[str, Flight] = {}
+
+    def join(self, key: str, source: Callable[[], AsyncIterator[str]]) -> Flight:
+        """Calcul en cours pour `key`, ou nouveau calcul source() (pas d’await : atomique dans la boucle)."""
+        flight = self._flights.get(key)
+        if flight is not None and not flight.finished:
+            COALESCED_REQUESTS.inc(flight=self.name, role="follower")
+            return flight
+        flight = self._flights[key] = Flight(source())
+        flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        COALESCED_REQUESTS.inc(flight=self.name, role="leader")
+        return flight
+
+    def _forget(self, key: str, flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def in_flight(self) -> int:
+        return len(self._flights)
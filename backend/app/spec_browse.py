@@ -0,0 +1,70 @@
+# backend/app/spec_browse.py
+"""
+Consultation paginée d’une spec technique stockée (explorateur du front).
+
+• summary() : compteurs seulement, renvoyés à la place du JSON complet.
+• browse() : une tranche filtrée de mesures / tables / relations / pages
+  (filtre texte sans accents ni casse, filtre par table, offset / limit).
+"""
+import unicodedata
+from typing import Dict, List
+
+from .spec_prompt import relation_line
+
+KINDS = ("measures", "tables", "relations", "pages")
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def fold(text) -> str:
+    return unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode().lower()
+
+
+def summary(spec: Dict) -> Dict:
+    out = {"id": spec["id"], **{k: len(spec.get(k, [])) for k in KINDS}}
+    if spec.get("note"):
+        out["note"] = spec["note"]
+    return out
+
+
+def _items(spec: Dict, kind: str) -> List[Dict]:
+    if kind == "tables":
+        per_table: Dict[str, int] = {}
+        for m in spec.get("measures", []):
+            per_table[m["table"]] = per_table.get(m["table"], 0) + 1
+        return [{"name": t, "measures": per_table.get(t, 0)} for t in spec.get("tables", [])]
+    return spec.get(kind, [])
+
+
+def _haystack(kind: str, item: Dict) -> str:
+    if kind == "measures":
+        return f"{item['table']} {item['name']} {item['expr']}"
+    if kind == "relations":
+        return relation_line(item)
+    if kind == "pages":
+        return " ".join([item["name"]] + [str(f) for v in item.get("visuals", []) for f in v.get("fields", [])])
+    return item["name"]
+
+
+def _in_table(kind: str, item: Dict, table: str) -> bool:
+    if kind == "measures":
+        return item["table"] == table
+    if kind == "relations":
+        return table in (item.get("fromTable"), item.get("toTable"))
+    if kind == "tables":
+        return item["name"] == table
+    return any(str(f).startswith(f"{table}.") for v in item.get("visuals", []) for f in v.get("fields", []))
+
+
+def browse(spec: Dict, kind: str, q: str = "", table: str | None = None,
+           offset: int = 0, limit: int = DEFAULT_LIMIT) -> Dict:
+    """{kind, total, offset, limit, items} — total = nombre d’éléments après filtrage."""
+    items = _items(spec, kind)
+    if table:
+        items = [it for it in items if _in_table(kind, it, table)]
+    terms = fold(q).split()
+    if terms:
+        items = [it for it in items if all(t in fold(_haystack(kind, it)) for t in terms)]
+    limit = max(1, min(limit, MAX_LIMIT))
+    offset = max(0, offset)
+    return {"kind": kind, "total": len(items), "offset": offset, "limit": limit, "items": items[offset:offset + limit]}
@@ -0,0 +1,182 @@
+# backend/app/spec_cache.py
+"""
+Cache persistant des spécifications, adressé par le contenu du PBIX.
+
+• Clé = SHA-256 des octets du .pbix + version de l’extracteur + version du prompt.
+• Valeur = spec technique (JSON) + spec fonctionnelle (markdown).
+• Stockage SQLite (mode WAL) → survit aux redémarrages.
+• Éviction LRU dès que la taille totale dépasse SPEC_CACHE_MAX_MB.
+• Historique des versions par rapport (nom de fichier) ; une version envoyée
+  pendant l’analyse du même contenu sous un autre nom est mise en attente
+  (defer_version) puis enregistrée à la fin du job partagé (take_deferred).
+"""
+import json, os, sqlite3, threading, time
+from pathlib import Path
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+load_dotenv()
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_DB = ROOT / ".cache" / "spec_cache.sqlite3"
+DEFAULT_MAX_MB = 512
+
+
+def cache_key(content_hash: str, extractor_version: str, prompt_version: str) -> str:
+    return f"{content_hash}:{extractor_version}:{prompt_version}"
+
+
+class SpecCache:
+    def __init__(self, path: str | Path | None = None, max_bytes: int | None = None):
+        self.path = Path(path or os.getenv("SPEC_CACHE_PATH", DEFAULT_DB))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            float(os.getenv("SPEC_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS specs (
+                key         TEXT PRIMARY KEY,
+                technical   TEXT NOT NULL,
+                functional  TEXT NOT NULL,
+                size        INTEGER NOT NULL,
+                created_at  REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS specs_accessed ON specs(accessed_at)")
+        # historique des versions d’un même rapport (nom de fichier) : sert au re-spec incrémental
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS report_versions (
+                report      TEXT NOT NULL,
+                spec_id     TEXT NOT NULL,
+                previous_id TEXT,
+                created_at  REAL NOT NULL,
+                PRIMARY KEY (report, spec_id)
+            )
+            """
+        )
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS deferred_versions (
+                report      TEXT NOT NULL,
+                spec_id     TEXT NOT NULL,
+                previous_id TEXT,
+                created_at  REAL NOT NULL,
+                PRIMARY KEY (report, spec_id)
+            )
+            """
+        )
+
+    # ------------------------------------------------------------------
+    def get(self, key: str) -> Tuple[Dict, str] | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT technical, functional FROM specs WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE specs SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0]), row[1]
+
+    def put(self, key: str, technical: Dict, functional: str) -> None:
+        tech_json = json.dumps(technical, ensure_ascii=False)
+        size = len(tech_json.encode("utf-8")) + len(functional.encode("utf-8"))
+        if size > self.max_bytes:
+            return  # entrée plus grosse que le cache entier : on ne la garde pas
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO specs VALUES (?, ?, ?, ?, ?, ?)",
+                (key, tech_json, functional, size, now, now),
+            )
+            self._evict()
+
+    def latest_version(self, report: str) -> str | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT spec_id FROM report_versions WHERE report = ? ORDER BY created_at DESC LIMIT 1", (report,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def previous_version(self, report: str, spec_id: str) -> str | None:
+        """Version du rapport qui précédait spec_id lors de son dernier envoi."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT previous_id FROM report_versions WHERE report = ? AND spec_id = ?", (report, spec_id)
+            ).fetchone()
+        return row[0] if row else None
+
+    def reports_of(self, spec_id: str) -> List[str]:
+        """Rapports dont spec_id est une version (même contenu envoyé sous plusieurs noms)."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT report FROM report_versions WHERE spec_id = ? ORDER BY created_at DESC", (spec_id,)
+            ).fetchall()
+        return [report for report, in rows]
+
+    def latest_versions(self) -> List[Tuple[str, str]]:
+        """(rapport, id de spec) de la version la plus récente de chaque rapport connu."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT report, spec_id, MAX(created_at) FROM report_versions GROUP BY report"
+            ).fetchall()
+        return [(report, spec_id) for report, spec_id, _ in rows]
+
+    def record_version(self, report: str, spec_id: str, previous_id: str | None) -> None:
+        """Ré-envoi d’une version déjà connue (A → B → A) : elle redevient la dernière, précédée de B."""
+        with self._lock:
+            self._db.execute(
+                """
+                INSERT INTO report_versions VALUES (?, ?, ?, ?)
+                ON CONFLICT (report, spec_id) DO UPDATE
+                SET previous_id = excluded.previous_id, created_at = excluded.created_at
+                """,
+                (report, spec_id, previous_id, time.time()),
+            )
+
+    def defer_version(self, report: str, spec_id: str, previous_id: str | None) -> None:
+        """Version à enregistrer quand la spec spec_id sera prête (job en cours pour un autre rapport)."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO deferred_versions VALUES (?, ?, ?, ?)", (report, spec_id, previous_id, time.time())
+            )
+
+    def take_deferred(self, spec_id: str) -> List[Tuple[str, str | None]]:
+        """(rapport, version précédente) en attente pour spec_id, retirés de la file (atomique entre process)."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT report, previous_id FROM deferred_versions WHERE spec_id = ? ORDER BY created_at",
+                    (spec_id,),
+                ).fetchall()
+                self._db.execute("DELETE FROM deferred_versions WHERE spec_id = ?", (spec_id,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return [(report, previous_id) for report, previous_id in rows]
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM specs").fetchone()[0]
+
+    # ------------------------------------------------------------------
+    def _evict(self) -> None:
+        """Supprime les entrées les moins récemment lues jusqu’à repasser sous max_bytes."""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM specs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in self._db.execute("SELECT key, size FROM specs ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM specs WHERE key = ?", victims)
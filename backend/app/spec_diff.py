@@ -0,0 +1,69 @@
+# backend/app/spec_diff.py
+"""
+Diff structurel entre deux versions d’une spec technique.
+
+• Tables par nom, mesures par table.nom + expression DAX (espaces ignorés),
+  relations par extrémités, pages par nom + visuels.
+• affected_sections() indique quelles sections de la spec fonctionnelle
+  doivent être réécrites ; les autres sont reprises telles quelles.
+"""
+from typing import Dict, List
+
+from .generate_narrative import INTRO, SOURCES, KPIS, PAGES, GLOSSARY
+from .spec_prompt import compact_dax, relation_line, visual_label
+
+
+def _measures(spec: Dict) -> Dict[str, str]:
+    return {f"{m['table']}.{m['name']}": compact_dax(m["expr"]) for m in spec.get("measures", [])}
+
+
+def _relations(spec: Dict) -> Dict[str, str]:
+    out = {}
+    for r in spec.get("relations", []):
+        key = f"{r.get('fromTable')}[{r.get('fromColumn')}] -> {r.get('toTable')}[{r.get('toColumn')}]"
+        out[key] = relation_line(r)   # sens de filtrage, cardinalité, actif/inactif
+    return out
+
+
+def _pages(spec: Dict) -> Dict[str, List[str]]:
+    return {p["name"]: sorted(visual_label(v) for v in p.get("visuals", [])) for p in spec.get("pages", [])}
+
+
+def _compare(old: Dict, new: Dict) -> Dict[str, List[str]]:
+    return {
+        "added": sorted(new.keys() - old.keys()),
+        "removed": sorted(old.keys() - new.keys()),
+        "changed": sorted(k for k in old.keys() & new.keys() if old[k] != new[k]),
+    }
+
+
+def diff_specs(old: Dict, new: Dict) -> Dict:
+    tables = _compare(dict.fromkeys(old.get("tables", [])), dict.fromkeys(new.get("tables", [])))
+    del tables["changed"]
+    diff = {
+        "from": old.get("id"),
+        "to": new.get("id"),
+        "tables": tables,
+        "measures": _compare(_measures(old), _measures(new)),
+        "relations": _compare(_relations(old), _relations(new)),
+        "pages": _compare(_pages(old), _pages(new)),
+    }
+    diff["unchanged"] = not any(v for part in ("tables", "measures", "relations", "pages") for v in diff[part].values())
+    diff["sections"] = affected_sections(diff)
+    return diff
+
+
+def affected_sections(diff: Dict) -> List[str]:
+    tables, measures, relations, pages = (diff[k] for k in ("tables", "measures", "relations", "pages"))
+    sections = []
+    if tables["added"] or tables["removed"] or pages["added"] or pages["removed"]:
+        sections.append(INTRO)
+    if any(tables.values()) or any(relations.values()):
+        sections.append(SOURCES)
+    if any(measures.values()):
+        sections.append(KPIS)
+    if any(pages.values()):
+        sections.append(PAGES)
+    if measures["added"] or measures["removed"] or tables["added"] or tables["removed"]:
+        sections.append(GLOSSARY)
+    return sections
@@ -0,0 +1,172 @@
+# backend/app/spec_index.py
+"""
+Index de recherche par spec (BM25) pour construire le contexte du chat.
+
+• Une entrée par mesure, table, relation et visuel (champs utilisés).
+• Index en mémoire du process, LRU de SPEC_INDEX_CACHE specs : construit à
+  l’extraction dans le worker du job, sinon à la première question (autre
+  worker, process redémarré, spec évincée). La construction parcourt toute la
+  spec : l’appeler hors de la boucle asyncio (asyncio.to_thread).
+• context(question) renvoie les entrées les plus pertinentes, dans la limite
+  d’un budget de tokens, au lieu d’un json.dumps tronqué.
+• Chaque mesure retenue entraîne les mesures dont elle dépend (fermeture
+  exacte tirée du graphe de lignage), placées juste après elle.
+"""
+import math, os, re, threading, unicodedata
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, List
+
+from .tokens import count_tokens
+from .lineage import UPSTREAM, closure, measure_node, node_kind
+from .spec_prompt import encode_entries, measure_line, page_line, relation_line, table_header
+
+K1, B = 1.2, 0.75
+INDEX_CACHE_SIZE = int(os.getenv("SPEC_INDEX_CACHE", "32"))   # index gardés en mémoire par process
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKENS", "2000"))   # tokens de contexte pour le LLM (tous les chats)
+STOPWORDS = {
+    "a", "au", "aux", "ce", "ces", "comment", "dans", "de", "des", "du", "elle", "en", "est", "et",
+    "il", "la", "le", "les", "leur", "mon", "ma", "mes", "ne", "pas", "par", "pour", "qu", "que",
+    "quel", "quelle", "quels", "quelles", "qui", "quoi", "sa", "se", "son", "sont", "sur", "un",
+    "une", "the", "of", "is", "how", "what", "which",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Minuscules, accents retirés, découpe sur tout ce qui n’est pas alphanumérique."""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode().lower()
+    return [t for t in re.findall(r"[a-z0-9]+", text) if t not in STOPWORDS]
+
+
+def spec_entries(spec: Dict) -> List[Dict]:
+    """Une entrée par objet du modèle : kind, texte affiché au LLM, texte indexé (nom pondéré x2)."""
+    entries = []
+    for m in spec.get("measures", []):
+        entries.append({
+            "kind": "measure",
+            "table": m["table"],
+            "name": m["name"],
+            "text": measure_line(m),
+            "terms": f"{m['name']} {m['name']} {m['table']} {m['expr']}",
+        })
+
+    columns = defaultdict(set)
+    for r in spec.get("relations", []):
+        for side in ("from", "to"):
+            if r.get(side + "Table") and r.get(side + "Column"):
+                columns[r[side + "Table"]].add(r[side + "Column"])
+    for p in spec.get("pages", []):
+        for v in p.get("visuals", []):
+            for fld in v.get("fields", []):
+                if isinstance(fld, str) and "." in fld:
+                    table, col = fld.split(".", 1)
+                    columns[table].add(col)
+    for t in spec.get("tables", []):
+        cols = sorted(columns.get(t, ()))
+        entries.append({
+            "kind": "table",
+            "table": t,
+            "text": table_header(t, cols),
+            "terms": f"{t} {t} {' '.join(cols)}",
+        })
+
+    for r in spec.get("relations", []):
+        text = relation_line(r)
+        entries.append({"kind": "relation", "text": text, "terms": text})
+
+    for p in spec.get("pages", []):
+        for v in p.get("visuals", []):
+            fields = ", ".join(str(f) for f in v.get("fields", []))
+            if not fields:
+                continue
+            entries.append({
+                "kind": "visual",
+                "text": page_line({"name": p["name"], "visuals": [v]}),
+                "terms": f"{p['name']} {v.get('type')} {fields}",
+            })
+    return entries
+
+
+class SpecIndex:
+    def __init__(self, entries: List[Dict], spec: Dict | None = None):
+        self.entries = [{k: e[k] for k in ("kind", "table", "name", "text") if k in e} for e in entries]
+        self.measure_docs = {e["name"]: d for d, e in enumerate(entries) if e["kind"] == "measure"}
+        self.spec = spec   # pour le lignage (fermetures calculées à la demande)
+        self.postings: Dict[str, List[tuple]] = defaultdict(list)
+        self.lengths: List[int] = []
+        for doc_id, e in enumerate(entries):
+            tf = Counter(tokenize(e["terms"]))
+            self.lengths.append(sum(tf.values()))
+            for term, n in tf.items():
+                self.postings[term].append((doc_id, n))
+        self.avgdl = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.costs = [count_tokens(e["text"]) + 1 for e in self.entries]   # +1 : saut de ligne
+
+    @classmethod
+    def build(cls, spec: Dict) -> "SpecIndex":
+        return cls(spec_entries(spec), spec)
+
+    # ------------------------------------------------------------------
+    def search(self, query: str, k: int | None = None) -> List[tuple]:
+        """[(score, doc_id)] triés par score BM25 décroissant."""
+        n = len(self.entries)
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting:
+                norm = K1 * (1 - B + B * self.lengths[doc_id] / (self.avgdl or 1))
+                scores[doc_id] += idf * tf * (K1 + 1) / (tf + norm)
+        ranked = sorted(((s, d) for d, s in scores.items()), reverse=True)
+        return ranked[:k] if k else ranked
+
+    def dependencies(self, doc_id: int) -> List[int]:
+        """Mesures dont dépend (transitivement) l’entrée doc_id, d’après le graphe de lignage."""
+        e = self.entries[doc_id]
+        if e["kind"] != "measure" or self.spec is None:
+            return []
+        return [
+            self.measure_docs[n[1:-1]]
+            for n in closure(self.spec, measure_node(e["name"]), UPSTREAM)
+            if node_kind(n) == "measure" and n[1:-1] in self.measure_docs
+        ]
+
+    def context(self, query: str, budget_tokens: int, max_entries: int = 60, dependencies: bool = True) -> str:
+        """Entrées les plus pertinentes tenant dans le budget ; tout le modèle s’il y tient."""
+        if sum(self.costs) <= budget_tokens:
+            return encode_entries(self.entries)
+
+        ranked = [d for _, d in self.search(query, max_entries)]
+        if not ranked:
+            # aucune correspondance : on donne au moins la liste des tables
+            ranked = [d for d, e in enumerate(self.entries) if e["kind"] == "table"]
+        elif dependencies:
+            ranked = list(dict.fromkeys(x for d in ranked for x in (d, *self.dependencies(d))))
+
+        picked, used = [], 0
+        for d in ranked:
+            if used + self.costs[d] > budget_tokens:
+                continue
+            picked.append(d)
+            used += self.costs[d]
+        return encode_entries([self.entries[d] for d in picked])
+
+
+_INDEXES: "OrderedDict[str, SpecIndex]" = OrderedDict()
+_INDEXES_LOCK = threading.Lock()
+
+
+def index_for(spec: Dict) -> SpecIndex:
+    """Index de la spec, construit une fois puis gardé dans un LRU borné (INDEX_CACHE_SIZE)."""
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(spec["id"])
+        if index is not None:
+            _INDEXES.move_to_end(spec["id"])
+            return index
+    index = SpecIndex.build(spec)
+    with _INDEXES_LOCK:
+        _INDEXES[spec["id"]] = index
+        while len(_INDEXES) > INDEX_CACHE_SIZE:
+            _INDEXES.popitem(last=False)
+    return index
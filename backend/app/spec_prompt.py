@@ -0,0 +1,159 @@
+# backend/app/spec_prompt.py
+"""
+Encodage compact de la spec technique pour les prompts LLM.
+
+• Mesures regroupées par table, une ligne chacune, DAX sur une ligne.
+• Relations sur une ligne : A[col] -> B[col] (<-> si bidirectionnelle).
+• Pages : visuels identiques dédoublonnés, champs regroupés par table.
+• Légende unique en tête au lieu de clés JSON répétées.
+
+python -m backend.app.spec_prompt spec.json   → compare json.dumps / compact.
+"""
+import json, re, sys
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List
+
+from .tokens import count_tokens
+
+LEGEND = (
+    "Légende : T table · M mesure = DAX · R relation A[col] -> B[col] "
+    "(<-> filtrage bidirectionnel, 1:1 / n:n si ≠ n:1, ~ inactive) · P page : visuel×nb(Table.{champs})"
+)
+
+
+def compact_dax(expr: str) -> str:
+    return re.sub(r"\s+", " ", str(expr)).strip()
+
+
+def measure_line(m: Dict) -> str:
+    return f"  M {m['name']} = {compact_dax(m['expr'])}"
+
+
+def _card(rel: Dict) -> str:
+    card = {"one": "1", "many": "n"}
+    left = card.get(rel.get("fromCardinality", "many"), "n")
+    right = card.get(rel.get("toCardinality", "one"), "1")
+    return "" if (left, right) == ("n", "1") else f" {left}:{right}"
+
+
+def relation_line(rel: Dict) -> str:
+    arrow = "<->" if rel.get("crossFilteringBehavior") == "bothDirections" else "->"
+    inactive = " ~" if rel.get("isActive") is False else ""
+    return (
+        f"R {rel.get('fromTable')}[{rel.get('fromColumn')}] {arrow} "
+        f"{rel.get('toTable')}[{rel.get('toColumn')}]{_card(rel)}{inactive}"
+    )
+
+
+def _fields(fields: Iterable) -> str:
+    by_table = defaultdict(list)
+    for f in fields:
+        table, _, col = str(f).partition(".")
+        by_table[table if col else ""].append(col or table)
+    parts = []
+    for table, cols in by_table.items():
+        cols = list(dict.fromkeys(cols))
+        if not table:
+            parts.extend(cols)
+        elif len(cols) == 1:
+            parts.append(f"{table}.{cols[0]}")
+        else:
+            parts.append(f"{table}.{{{','.join(cols)}}}")
+    return ", ".join(parts)
+
+
+def visual_label(v: Dict) -> str:
+    fields = _fields(v.get("fields", []))
+    return f"{v.get('type') or '?'}({fields})" if fields else f"{v.get('type') or '?'}"
+
+
+def page_line(p: Dict) -> str:
+    counts = Counter(visual_label(v) for v in p.get("visuals", []))
+    visuals = " | ".join(f"{label}×{n}" if n > 1 else label for label, n in counts.items())
+    return f"P {p['name']} : {visuals}" if visuals else f"P {p['name']}"
+
+
+def table_header(table: str, columns: Iterable[str] = ()) -> str:
+    cols = ", ".join(columns)
+    return f"T {table} ({cols})" if cols else f"T {table}"
+
+
+# ------------------------------------------------------------------
+def encode_spec(spec: Dict, budget_tokens: int | None = None) -> str:
+    """
+    Spec complète en texte compact. Avec budget_tokens, les mesures puis les pages
+    en trop sont remplacées par un compteur « … n de plus ».
+    """
+    measures_by_table = defaultdict(list)
+    for m in spec.get("measures", []):
+        measures_by_table[m["table"]].append(measure_line(m))
+
+    lines: List[str] = [LEGEND]
+    bare = [t for t in spec.get("tables", []) if t not in measures_by_table]
+    if bare:
+        lines.append("T " + ", ".join(bare))
+    measure_block = [(table_header(t), mlines) for t, mlines in measures_by_table.items()]
+    tail = [relation_line(r) for r in spec.get("relations", [])]
+    pages = [page_line(p) for p in spec.get("pages", [])]
+
+    if budget_tokens is None:
+        for header, mlines in measure_block:
+            lines += [header] + mlines
+        return "\n".join(lines + tail + pages)
+
+    used = count_tokens("\n".join(lines + tail))
+    skipped = 0
+    for header, mlines in measure_block:
+        cost = count_tokens(header) + 1
+        kept = []
+        for ml in mlines:
+            c = count_tokens(ml) + 1
+            if used + cost + c > budget_tokens:
+                skipped += 1
+                continue
+            kept.append(ml)
+            cost += c
+        if kept:
+            lines += [header] + kept
+            used += cost
+    if skipped:
+        lines.append(f"  … {skipped} mesures de plus non détaillées")
+    lines += tail
+
+    kept_pages = []
+    for pl in pages:
+        c = count_tokens(pl) + 1
+        if used + c > budget_tokens:
+            break
+        kept_pages.append(pl)
+        used += c
+    lines += kept_pages
+    if len(kept_pages) < len(pages):
+        lines.append(f"… {len(pages) - len(kept_pages)} pages de plus")
+    return "\n".join(lines)
+
+
+def encode_entries(entries: List[Dict]) -> str:
+    """Sélection d’entrées d’index (cf. spec_index) : mesures regroupées sous leur table."""
+    headers = {e["table"]: e["text"] for e in entries if e["kind"] == "table"}
+    by_table = defaultdict(list)
+    for e in entries:
+        if e["kind"] == "measure":
+            by_table[e["table"]].append(e["text"])
+    lines = []
+    for table, mlines in by_table.items():
+        lines += [headers.pop(table, table_header(table))] + mlines
+    lines += [e["text"] for e in entries if e["kind"] != "measure" and (e["kind"] != "table" or e["table"] in headers)]
+    return "\n".join(lines)
+
+
+def token_report(spec: Dict) -> Dict:
+    """Tokens json.dumps vs encodage compact pour une même spec."""
+    raw = count_tokens(json.dumps(spec, ensure_ascii=False))
+    compact = count_tokens(encode_spec(spec))
+    return {"json_tokens": raw, "compact_tokens": compact, "ratio": round(compact / raw, 3) if raw else 1.0}
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1], encoding="utf-8") as f:
+        print(json.dumps(token_report(json.load(f)), indent=2))
@@ -0,0 +1,229 @@
+# backend/app/spec_store.py
+"""
+Store des specs (et de l’état des jobs) partagé entre workers uvicorn.
+
+• Tier 1 : LRU en mémoire du process, borné en octets (SPEC_STORE_MEMORY_MB).
+• Tier 2 : backend partagé choisi par SPEC_STORE_URL
+    - sqlite:///chemin/store.sqlite3 (défaut, mode WAL : N workers sur une même machine)
+    - redis://hôte:6379/0 (Redis ou tout serveur compatible RESP ; paquet `redis` requis)
+• Les specs y expirent après SPEC_STORE_TTL_S (défaut 24 h) : le cache disque
+  (SpecCache) reste la copie durable, relue et republiée à la demande.
+"""
+import json, os, sqlite3, threading, time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict
+from dotenv import load_dotenv
+load_dotenv()
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_URL = f"sqlite:///{ROOT / '.cache' / 'spec_store.sqlite3'}"
+SPEC_TTL_S = float(os.getenv("SPEC_STORE_TTL_S", "86400"))
+
+
+class SQLiteBackend:
+    def __init__(self, path: str | Path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl_s: float | None = None) -> None:
+        expires_at = time.time() + ttl_s if ttl_s else None
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (key, value, expires_at))
+            if ttl_s:
+                self._db.execute("DELETE FROM kv WHERE expires_at <= ?", (time.time(),))
+
+    def claim(self, key: str, value: str, ttl_s: float) -> str | None:
+        """Pose key = value si la clé est libre (absente ou expirée), sinon renvoie sa valeur ; atomique entre process."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)
+                ).fetchone()
+                if row is None:
+                    self._db.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (key, value, now + ttl_s))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return row[0] if row else None
+
+    def refresh(self, key: str, value: str, ttl_s: float) -> bool:
+        """Repousse l’expiration de key si elle vaut toujours value."""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE kv SET expires_at = ? WHERE key = ? AND value = ?", (time.time() + ttl_s, key, value)
+            )
+            return cur.rowcount > 0
+
+    def release(self, key: str, value: str) -> None:
+        """Supprime key si elle vaut toujours value."""
+        with self._lock:
+            self._db.execute("DELETE FROM kv WHERE key = ? AND value = ?", (key, value))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def ping(self) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1").fetchone() == (1,)
+
+
+# compare-and-set côté serveur : une seule opération atomique par appel
+_REDIS_CLAIM = """
+local v = redis.call('GET', KEYS[1])
+if v then return v end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return false
+"""
+_REDIS_REFRESH = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('PEXPIRE', KEYS[1], ARGV[2]) end
+return 0
+"""
+_REDIS_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+
+class RedisBackend:
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:   # dépendance optionnelle
+            raise RuntimeError("SPEC_STORE_URL=redis://… nécessite le paquet `redis` (pip install redis)")
+        self._r = redis.Redis.from_url(url, decode_responses=True)
+        self._claim = self._r.register_script(_REDIS_CLAIM)
+        self._refresh = self._r.register_script(_REDIS_REFRESH)
+        self._release = self._r.register_script(_REDIS_RELEASE)
+
+    def get(self, key: str) -> str | None:
+        return self._r.get(key)
+
+    def set(self, key: str, value: str, ttl_s: float | None = None) -> None:
+        self._r.set(key, value, ex=int(ttl_s) if ttl_s else None)
+
+    def claim(self, key: str, value: str, ttl_s: float) -> str | None:
+        return self._claim(keys=[key], args=[value, int(ttl_s * 1000)])
+
+    def refresh(self, key: str, value: str, ttl_s: float) -> bool:
+        return bool(self._refresh(keys=[key], args=[value, int(ttl_s * 1000)]))
+
+    def release(self, key: str, value: str) -> None:
+        self._release(keys=[key], args=[value])
+
+    def delete(self, key: str) -> None:
+        self._r.delete(key)
+
+    def ping(self) -> bool:
+        return bool(self._r.ping())
+
+
+def make_backend(url: str):
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"SPEC_STORE_URL non supportée : {url}")
+
+
+# ------------------------------------------------------------------
+class SpecStore:
+    """Specs techniques (clé = id de spec) et états de jobs, LRU mémoire devant le backend partagé."""
+
+    def __init__(self, backend=None, memory_bytes: int | None = None):
+        self.backend = backend or make_backend(os.getenv("SPEC_STORE_URL", DEFAULT_URL))
+        self.memory_bytes = memory_bytes if memory_bytes is not None else int(
+            float(os.getenv("SPEC_STORE_MEMORY_MB", "64")) * 1024 * 1024
+        )
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()   # id -> (spec, taille JSON)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    # --- specs ----------------------------------------------------------
+    def get_spec(self, spec_id: str) -> Dict | None:
+        with self._lock:
+            hit = self._mem.get(spec_id)
+            if hit is not None:
+                self._mem.move_to_end(spec_id)
+                return hit[0]
+        raw = self.backend.get(f"spec:{spec_id}")
+        if raw is None:
+            return None
+        spec = json.loads(raw)
+        self._remember(spec_id, spec, len(raw))
+        return spec
+
+    def put_spec(self, spec: Dict, current: bool = True) -> None:
+        """Publie la spec pour SPEC_TTL_S ; current → elle devient la « dernière spec » (routeur historique)."""
+        raw = json.dumps(spec, ensure_ascii=False)
+        self.backend.set(f"spec:{spec['id']}", raw, SPEC_TTL_S)
+        if current:
+            self.backend.set("current", spec["id"], SPEC_TTL_S)
+        self._remember(spec["id"], spec, len(raw))
+
+    def current_spec(self) -> Dict | None:
+        """Dernière spec enregistrée (tous workers confondus)."""
+        spec_id = self.backend.get("current")
+        return self.get_spec(spec_id) if spec_id else None
+
+    # --- jobs -----------------------------------------------------------
+    def get_job(self, job_id: str) -> Dict | None:
+        raw = self.backend.get(f"job:{job_id}")
+        return json.loads(raw) if raw else None
+
+    def put_job(self, job: Dict, ttl_s: float) -> None:
+        self.backend.set(f"job:{job['job_id']}", json.dumps(job, ensure_ascii=False), ttl_s)
+
+    def request_cancel(self, job_id: str, ttl_s: float) -> None:
+        """Demande d’annulation visible du worker qui exécute le job."""
+        self.backend.set(f"cancel:{job_id}", "1", ttl_s)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        return self.backend.get(f"cancel:{job_id}") is not None
+
+    def claim_inflight(self, key: str, job_id: str, ttl_s: float) -> str | None:
+        """
+        Réserve `key` pour job_id, en une opération atomique entre workers ; renvoie le job
+        titulaire s’il y en a un. La réservation expire si elle n’est pas entretenue.
+        """
+        return self.backend.claim(f"inflight:{key}", job_id, ttl_s)
+
+    def refresh_inflight(self, key: str, job_id: str, ttl_s: float) -> bool:
+        return self.backend.refresh(f"inflight:{key}", job_id, ttl_s)
+
+    def release_inflight(self, key: str, job_id: str) -> None:
+        self.backend.release(f"inflight:{key}", job_id)
+
+    # ------------------------------------------------------------------
+    def memory_usage(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._mem), "bytes": self._bytes, "max_bytes": self.memory_bytes}
+
+    def _remember(self, spec_id: str, spec: Dict, size: int) -> None:
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            if spec_id in self._mem:
+                self._bytes -= self._mem.pop(spec_id)[1]
+            self._mem[spec_id] = (spec, size)
+            self._bytes += size
+            while self._bytes > self.memory_bytes:
+                _, (_, old) = self._mem.popitem(last=False)
+                self._bytes -= old
@@ -1,4 +1,13 @@
+from .spec_store import SpecStore
+
+STORE = SpecStore()   # specs + jobs, partagé entre workers (cf. SPEC_STORE_URL)
+
+
 class _State:
-    data = None
+    """Dernière spec analysée, lue dans le store partagé (quel que soit le worker)."""
+
+    @property
+    def data(self):
+        return STORE.current_spec()
 
 CURRENT_SPEC = _State()
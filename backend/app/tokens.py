@@ -0,0 +1,24 @@
+# backend/app/tokens.py
+"""
+Estimation du nombre de tokens d’un texte envoyé au LLM.
+
+• tiktoken s’il est installé (encodage o200k_base de gpt-4o) ;
+• sinon approximation ~4 caractères / token, suffisante pour budgéter un prompt.
+"""
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:   # dépendance optionnelle
+    tiktoken = None
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str) -> int:
+    if tiktoken is not None:
+        return len(_encoding().encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
@@ -0,0 +1,122 @@
+# backend/app/upload.py
+"""
+Réception streamée d’un .pbix (multipart/form-data) à mémoire constante.
+
+• Le corps HTTP est lu morceau par morceau (request.stream()) et écrit
+  directement sur disque : pas de SpooledTemporaryFile ni de pbix.read().
+• Le SHA-256 est calculé au fil de l’eau.
+• PBIX_MAX_UPLOAD_MB est vérifié sur le Content-Length avant lecture,
+  puis à chaque morceau (corps chunked).
+• En cas d’erreur, le fichier temporaire est supprimé.
+"""
+import hashlib, os, tempfile
+from dataclasses import dataclass
+from fastapi import HTTPException, Request
+import multipart
+from multipart.multipart import parse_options_header
+from dotenv import load_dotenv
+load_dotenv()
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("PBIX_MAX_UPLOAD_MB", "1024")) * 1024 * 1024)
+
+
+@dataclass
+class SavedUpload:
+    path: str
+    sha256: str
+    size: int
+    filename: str | None = None
+
+    def cleanup(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _PartWriter:
+    """Callbacks python-multipart : n’écrit que le champ `field` dans un fichier temporaire."""
+
+    def __init__(self, field: str, max_bytes: int):
+        self.field, self.max_bytes = field, max_bytes
+        self.fd, self.path = tempfile.mkstemp(prefix="pbix_upload_", suffix=".pbix")
+        self.out = os.fdopen(self.fd, "wb")
+        self.sha = hashlib.sha256()
+        self.size = 0
+        self.filename: str | None = None
+        self.found = False
+        self._active = False
+        self._headers: dict = {}
+        self._hname = b""
+        self._hvalue = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self) -> None:
+        self._headers, self._active = {}, False
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._hname += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._hvalue += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._hname.lower()] = self._hvalue
+        self._hname, self._hvalue = b"", b""
+
+    def on_headers_finished(self) -> None:
+        _, opts = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if opts.get(b"name", b"").decode() == self.field and not self.found:
+            self.found = self._active = True
+            if b"filename" in opts:
+                self.filename = opts[b"filename"].decode("utf-8", errors="replace")
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self._active:
+            return
+        chunk = data[start:end]
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise HTTPException(413, f"PBIX trop volumineux (max {self.max_bytes // (1024 * 1024)} Mo).")
+        self.sha.update(chunk)
+        self.out.write(chunk)
+
+    def on_part_end(self) -> None:
+        self._active = False
+
+
+async def save_upload(request: Request, field: str = "pbix", max_bytes: int = MAX_UPLOAD_BYTES) -> SavedUpload:
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(400, "Envoie le fichier en multipart/form-data.")
+
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes + 64 * 1024:  # marge pour l’enveloppe multipart
+        raise HTTPException(413, f"PBIX trop volumineux (max {max_bytes // (1024 * 1024)} Mo).")
+
+    writer = _PartWriter(field, max_bytes)
+    parser = multipart.MultipartParser(params[b"boundary"], writer.callbacks())
+    try:
+        with writer.out:
+            async for chunk in request.stream():
+                parser.write(chunk)
+            parser.finalize()
+        if not writer.found:
+            raise HTTPException(422, f"Champ « {field} » manquant.")
+    except multipart.exceptions.MultipartParseError as exc:
+        SavedUpload(writer.path, "", 0).cleanup()
+        raise HTTPException(400, f"Corps multipart invalide : {exc}")
+    except BaseException:
+        SavedUpload(writer.path, "", 0).cleanup()
+        raise
+    return SavedUpload(writer.path, writer.sha.hexdigest(), writer.size, writer.filename)
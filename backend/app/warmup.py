@@ -0,0 +1,120 @@
+# backend/app/warmup.py
+"""
+Démarrage du backend : sondes /healthz (process vivant) et /readyz (prêt à servir).
+
+• Le warm-up tourne en tâche de fond dès le lancement (lifespan) : /healthz répond
+  tout de suite, /readyz renvoie 503 tant que les vérifications ne sont pas finies.
+• Vérifications bloquantes : store partagé joignable, configuration LLM présente
+  (le pool httpx est créé à ce moment-là), pbi-tools présent et dossier de travail
+  accessible (dossiers orphelins supprimés) si le fast path zip est désactivé.
+• Vérifications informatives : première connexion à l’endpoint LLM (TLS +
+  keep-alive) et pbi-tools quand le fast path est actif.
+• Durées (imports du module principal, warm-up, chaque vérification) journalisées
+  et exposées dans pbix_startup_seconds.
+"""
+import asyncio, logging, sys, time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict
+
+from common.metrics import STARTUP_SECONDS
+from .extract_executor import EXECUTOR
+from .extract_pbix import FAST_PATH, _pbi_tools_path
+from .state import STORE
+
+log = logging.getLogger("uvicorn.error")
+LLM_CONNECT_TIMEOUT_S = 5.0
+
+
+async def _check_store() -> str:
+    if not await asyncio.to_thread(STORE.backend.ping):
+        raise RuntimeError("le store ne répond pas")
+    return type(STORE.backend).__name__
+
+
+async def _check_pbi_tools() -> str:
+    return _pbi_tools_path()
+
+
+def _llm_client():
+    from common.azure_llm import get_client   # import différé : httpx pèse ~0,1 s
+    return get_client()
+
+
+async def _check_scratch() -> str:
+    removed = await asyncio.to_thread(EXECUTOR.sweep)
+    with EXECUTOR.scratch():
+        pass
+    return EXECUTOR.stats()["scratch_dir"] + (f" ({removed} dossier(s) orphelin(s) supprimé(s))" if removed else "")
+
+
+async def _check_llm() -> str:
+    client = await asyncio.to_thread(_llm_client)   # import + contexte TLS hors de la boucle
+    return client.config.url()[1]
+
+
+async def _check_llm_connect() -> str:
+    return f"HTTP {await _llm_client().warm_up(LLM_CONNECT_TIMEOUT_S)}"
+
+
+class Readiness:
+    def __init__(self):
+        self.ready = False
+        self.warming = False
+        self.checks: Dict[str, Dict] = {}
+        self.timings: Dict[str, float] = {}   # ms
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Lance le warm-up une seule fois (lifespan, ou 1er appel à /readyz à défaut)."""
+        if self._task is None:
+            self.warming = True
+            self._task = asyncio.get_running_loop().create_task(self.warm_up())
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.timings[phase] = round(seconds * 1000, 1)
+        STARTUP_SECONDS.set(seconds, phase=phase)
+
+    def as_dict(self) -> Dict:
+        return {"ready": self.ready, "warming": self.warming, "checks": self.checks, "timings": self.timings}
+
+    async def _check(self, name: str, fn: Callable[[], Awaitable[str]], required: bool) -> bool:
+        t0 = time.perf_counter()
+        try:
+            self.checks[name] = {"status": "ok", "detail": await fn()}
+        except Exception as exc:
+            self.checks[name] = {"status": "failed" if required else "degraded", "detail": str(exc)}
+        self.record(name, time.perf_counter() - t0)
+        return self.checks[name]["status"] == "ok" or not required
+
+    async def warm_up(self) -> None:
+        t0 = time.perf_counter()
+        results = await asyncio.gather(
+            self._check("store", _check_store, required=True),
+            self._check("pbi_tools", _check_pbi_tools, required=not FAST_PATH),
+            self._check("scratch", _check_scratch, required=not FAST_PATH),
+            self._check("llm", _check_llm, required=True),
+        )
+        if self.checks["llm"]["status"] == "ok":
+            await self._check("llm_connect", _check_llm_connect, required=False)
+        self.record("warmup", time.perf_counter() - t0)
+        self.ready, self.warming = all(results), False
+        log.info(
+            "Démarrage : imports %.0f ms, warm-up %.0f ms — %s",
+            self.timings.get("imports", 0), self.timings["warmup"],
+            ", ".join(f"{k} {v['status']}" for k, v in self.checks.items()),
+        )
+        for name, check in self.checks.items():
+            if check["status"] != "ok":
+                log.warning("Warm-up %s : %s", name, check["detail"])
+
+
+READINESS = Readiness()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    READINESS.start()
+    yield
+    azure_llm = sys.modules.get("common.azure_llm")
+    if azure_llm is not None and azure_llm.get_client.cache_info().currsize:   # pool ouvert par le warm-up
+        await azure_llm.get_client().aclose()
@@ -0,0 +1,66 @@
+"""
+Compare deux fichiers de résultats de bench.run.
+
+    python -m bench.compare bench/results/<avant>.json bench/results/<après>.json [--threshold 10] [--fail]
+
+Durées, mémoire et tokens : plus bas = mieux ; débits (per_s, per_min) et hit_ratio : plus haut = mieux.
+Les écarts au-delà de --threshold % sont marqués ; --fail → code retour 1 s’il y a une régression.
+"""
+import argparse, json, sys
+from pathlib import Path
+from typing import Dict, List
+
+HIGHER_IS_BETTER = ("per_s", "per_min", "hit_ratio")
+IGNORED = ("n", "failures", "tasks", "file_kb", "calls", "rate_limited", "streamed", "tables", "measures", "relations", "pages")
+
+
+def flatten(data: Dict, prefix: str = "") -> Dict[str, float]:
+    out = {}
+    for k, v in data.items():
+        key = f"{prefix}.{k}" if prefix else k
+        if isinstance(v, dict):
+            out.update(flatten(v, key))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = float(v)
+    return out
+
+
+def compare(before: Dict, after: Dict, threshold: float) -> List[tuple]:
+    """[(clé, avant, après, écart %, verdict)] ; verdict ∈ {"", "mieux", "RÉGRESSION"}."""
+    a = flatten({k: v for k, v in before.items() if k != "meta"})
+    b = flatten({k: v for k, v in after.items() if k != "meta"})
+    rows = []
+    for key in sorted(a.keys() & b.keys()):
+        if key.rsplit(".", 1)[-1] in IGNORED:
+            continue
+        old, new = a[key], b[key]
+        delta = (new - old) / old * 100 if old else 0.0
+        better = delta > 0 if key.endswith(HIGHER_IS_BETTER) else delta < 0
+        verdict = "" if abs(delta) < threshold else ("mieux" if better else "RÉGRESSION")
+        rows.append((key, old, new, delta, verdict))
+    return rows
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Compare deux résultats de benchmark.")
+    ap.add_argument("before", type=Path)
+    ap.add_argument("after", type=Path)
+    ap.add_argument("--threshold", type=float, default=10.0, help="écart (%%) signalé")
+    ap.add_argument("--fail", action="store_true", help="code retour 1 en cas de régression")
+    args = ap.parse_args(argv)
+
+    before = json.loads(args.before.read_text(encoding="utf-8"))
+    after = json.loads(args.after.read_text(encoding="utf-8"))
+    print(f"{before['meta']['commit']} → {after['meta']['commit']} "
+          f"({before['meta']['size']} / {after['meta']['size']})\n")
+    rows = compare(before, after, args.threshold)
+    width = max([len(r[0]) for r in rows] + [10])
+    for key, old, new, delta, verdict in rows:
+        print(f"{key:<{width}}  {old:>12.4f}  {new:>12.4f}  {delta:>+8.1f}%  {verdict}")
+    regressions = sum(r[4] == "RÉGRESSION" for r in rows)
+    print(f"\n{regressions} régression(s) au-delà de {args.threshold:.0f} %")
+    return 1 if regressions and args.fail else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
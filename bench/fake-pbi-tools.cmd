@@ -0,0 +1,3 @@
+@echo off
+rem Faux pbi-tools (Windows) : PBITOOLS_PATH=bench\fake-pbi-tools.cmd
+python "%~dp0fake_pbi_tools.py" %*
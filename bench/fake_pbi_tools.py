@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Faux pbi-tools pour les benchmarks (PBITOOLS_PATH=bench/fake_pbi_tools.py, ou .cmd sous Windows).
+
+    fake_pbi_tools.py extract <fichier.pbix> -extractFolder <dossier> [-mode Auto] [-modelSerialization Raw]
+
+Écrit le même dossier qu’un vrai pbi-tools (Report/Layout/*.json, Model/database.json)
+à partir d’un .pbix généré par bench.fixtures.
+FAKE_PBITOOLS_DELAY_S simule le coût de démarrage / décompression du vrai outil
+(une valeur élevée simule un pbi-tools bloqué : timeout, annulation).
+FAKE_PBITOOLS_CHILD_S lance en plus un sous-processus qui dort ce nombre de
+secondes (pid écrit dans FAKE_PBITOOLS_CHILD_PID) : l’arbre entier doit être tué.
+"""
+import json, os, subprocess, sys, time, zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from bench.fixtures import BENCH_MODEL, layout_files  # noqa: E402
+
+
+def main(argv) -> int:
+    if len(argv) < 2 or argv[0] != "extract" or "-extractFolder" not in argv:
+        print("usage : fake_pbi_tools.py extract <pbix> -extractFolder <dossier>", file=sys.stderr)
+        return 2
+    src, out = Path(argv[1]), Path(argv[argv.index("-extractFolder") + 1])
+    child_s = os.getenv("FAKE_PBITOOLS_CHILD_S")
+    if child_s:
+        child = subprocess.Popen([sys.executable, "-c", f"import time; time.sleep({float(child_s)})"])
+        if os.getenv("FAKE_PBITOOLS_CHILD_PID"):
+            Path(os.environ["FAKE_PBITOOLS_CHILD_PID"]).write_text(str(child.pid))
+    time.sleep(float(os.getenv("FAKE_PBITOOLS_DELAY_S", "0")))
+    try:
+        with zipfile.ZipFile(src) as zf:
+            layout = json.loads(zf.read("Report/Layout").decode("utf-16-le"))
+            model = zf.read(BENCH_MODEL) if BENCH_MODEL in zf.namelist() else None
+    except (OSError, KeyError, zipfile.BadZipFile) as exc:
+        print(f"Impossible de lire {src} : {exc}", file=sys.stderr)
+        return 1
+
+    (out / "Report" / "Layout").mkdir(parents=True, exist_ok=True)
+    for name, page in layout_files(layout).items():
+        (out / "Report" / "Layout" / name).write_text(json.dumps(page, ensure_ascii=False), encoding="utf-8")
+    if model is not None:
+        (out / "Model").mkdir(parents=True, exist_ok=True)
+        (out / "Model" / "database.json").write_bytes(model)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,223 @@
+"""
+Générateur de rapports Power BI synthétiques (taille paramétrable) pour les benchmarks.
+
+    python -m bench.fixtures out/ --size medium
+    python -m bench.fixtures out/ --tables 40 --measures 400 --pages 20 --visuals 12 --count 5
+
+• .pbit : Report/Layout + DataModelSchema (UTF-16 LE) → fast-path d’extract_pbix.
+• .pbix : Report/Layout + DataModel binaire → chemin pbi-tools (cf. bench/fake_pbi_tools.py) ;
+  le modèle JSON voyage dans le membre Bench/database.json, que seul le faux pbi-tools lit.
+• Dossier d’extraction façon pbi-tools : Report/Layout/*.json + Model/database.json.
+
+Le contenu est déterministe (graine) ; `salt` change le hash du fichier sans changer sa taille utile.
+"""
+import argparse, json, os, random, zipfile
+from pathlib import Path
+from typing import Dict, List
+
+SIZES = {
+    "small": dict(tables=8, measures=40, pages=4, visuals=6),
+    "medium": dict(tables=40, measures=400, pages=20, visuals=12),
+    "large": dict(tables=150, measures=3000, pages=60, visuals=20),
+}
+VISUAL_TYPES = ["card", "tableEx", "clusteredColumnChart", "lineChart", "pieChart", "slicer", "matrix"]
+COLUMNS_PER_TABLE = 12
+BENCH_MODEL = "Bench/database.json"
+
+
+# ------------------------------------------------------------------
+# Modèle
+# ------------------------------------------------------------------
+def _table_name(i: int, facts: int) -> str:
+    return f"Fait Ventes {i}" if i < facts else f"Dim {i}"
+
+
+def _measure_expr(rng: random.Random, i: int, fact_tables: List[str], columns: Dict[str, List[str]]):
+    table = rng.choice(fact_tables)
+    column = rng.choice(columns[table])
+    if i < 5 or rng.random() < 0.3:
+        return f"SUM('{table}'[{column}])"
+    a, b = rng.randrange(i), rng.randrange(i)
+    kind = rng.randrange(4)
+    if kind == 0:
+        return f"DIVIDE([Mesure {a}], [Mesure {b}])"
+    if kind == 1:
+        return f"CALCULATE([Mesure {a}], '{table}'[{column}] > 0)"
+    if kind == 2:   # expression multi-lignes, stockée en liste comme dans les .bim
+        return [f"VAR base = [Mesure {a}]", f"VAR ref = [Mesure {b}] // référence", "RETURN", "    base - ref"]
+    return f"SUMX('{table}', '{table}'[{column}] * 1.2) + [Mesure {a}]"
+
+
+def synthetic_model(tables: int, measures: int, seed: int = 0) -> Dict:
+    rng = random.Random(seed)
+    facts = max(1, tables // 5)
+    names = [_table_name(i, facts) for i in range(tables)]
+    columns = {t: [f"Colonne {c}" for c in range(COLUMNS_PER_TABLE)] for t in names}
+    fact_tables = names[:facts]
+
+    model_tables = [
+        {
+            "name": t,
+            "columns": [
+                {"name": c, "dataType": "double", "sourceColumn": c, "annotations": [{"name": "SummarizationSetBy", "value": "Automatic"}]}
+                for c in columns[t]
+            ],
+            "partitions": [{
+                "name": f"{t}-partition",
+                "mode": "import",
+                "source": {"type": "m", "expression": [
+                    "let",
+                    f'    Source = Sql.Database("srv-bi", "dwh"),',
+                    f'    Tbl = Source{{[Schema="dbo",Item="{t}"]}}[Data],',
+                    *[f'    Step{k} = Table.TransformColumnTypes(Tbl, {{{{"Colonne {k}", type number}}}}),' for k in range(COLUMNS_PER_TABLE)],
+                    "in",
+                    f"    Step{COLUMNS_PER_TABLE - 1}",
+                ]},
+            }],
+            "measures": [],
+        }
+        for t in names
+    ]
+    by_name = {t["name"]: t for t in model_tables}
+    for i in range(measures):
+        home = by_name[fact_tables[i % facts]]
+        home["measures"].append({
+            "name": f"Mesure {i}",
+            "expression": _measure_expr(rng, i, fact_tables, columns),
+            "formatString": "#,0.00",
+            "annotations": [{"name": "PBI_FormatHint", "value": '{"isGeneralNumber":true}'}],
+        })
+
+    relationships = [
+        {
+            "name": f"rel-{i}",
+            "fromTable": rng.choice(fact_tables),
+            "fromColumn": "Colonne 0",
+            "toTable": dim,
+            "toColumn": "Colonne 0",
+            **({"crossFilteringBehavior": "bothDirections"} if i % 7 == 0 else {}),
+        }
+        for i, dim in enumerate(names[facts:])
+    ]
+    return {"name": "bench", "compatibilityLevel": 1550, "model": {"culture": "fr-FR", "tables": model_tables, "relationships": relationships}}
+
+
+# ------------------------------------------------------------------
+# Layout
+# ------------------------------------------------------------------
+def synthetic_layout(model: Dict, pages: int, visuals: int, seed: int = 0) -> Dict:
+    rng = random.Random(seed + 1)
+    tables = model["model"]["tables"]
+    measures = [(t["name"], m["name"]) for t in tables for m in t["measures"]] or [(tables[0]["name"], "Colonne 0")]
+    sections = []
+    for p in range(pages):
+        containers = []
+        for v in range(visuals):
+            vt = rng.choice(VISUAL_TYPES)
+            table, measure = rng.choice(measures)
+            dim = rng.choice(tables)["name"]
+            config = {
+                "name": f"v{p}_{v}",
+                "layouts": [{"id": 0, "position": {"x": 10 * v, "y": 20, "z": v, "width": 300, "height": 200}}],
+                "singleVisual": {
+                    "visualType": vt,
+                    "projections": {
+                        "Values": [{"queryRef": f"{table}.{measure}"}],
+                        "Category": [{"queryRef": f"{dim}.Colonne 1", "active": True}],
+                    },
+                    "prototypeQuery": {
+                        "Version": 2,
+                        "From": [{"Name": "t", "Entity": table, "Type": 0}],
+                        "Select": [{"Measure": {"Expression": {"SourceRef": {"Source": "t"}}, "Property": measure},
+                                    "Name": f"{table}.{measure}"}],
+                    },
+                    "objects": {"labels": [{"properties": {"show": {"expr": {"Literal": {"Value": "true"}}}}}]},
+                },
+            }
+            containers.append({
+                "x": 10.0 * v, "y": 20.0, "z": v, "width": 300.0, "height": 200.0,
+                "config": json.dumps(config, ensure_ascii=False),
+                "filters": "[]",
+            })
+        sections.append({
+            "name": f"ReportSection{p}",
+            "displayName": f"Page {p}",
+            "ordinal": p,
+            "visualContainers": containers,
+            "config": "{}",
+            "filters": "[]",
+        })
+    return {"id": 0, "resourcePackages": [], "sections": sections, "config": "{}"}
+
+
+def layout_files(layout: Dict) -> Dict[str, Dict]:
+    """Report/Layout/*.json tels que pbi-tools les écrit (une section par fichier, `config` des visuels décodée)."""
+    out = {}
+    for sec in layout["sections"]:
+        visuals = [{**c, "config": json.loads(c["config"])} for c in sec["visualContainers"]]
+        out[f"{sec['ordinal']:03d}_{sec['name']}.json"] = {**sec, "visualContainers": visuals}
+    return out
+
+
+# ------------------------------------------------------------------
+# Écriture
+# ------------------------------------------------------------------
+def _salted(model: Dict, salt: str) -> Dict:
+    return {**model, "model": {**model["model"], "annotations": [{"name": "bench_salt", "value": salt}]}} if salt else model
+
+
+def write_pbit(path: Path, model: Dict, layout: Dict, salt: str = "") -> Path:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("Version", "1.28".encode("utf-16-le"))
+        zf.writestr("Report/Layout", json.dumps(layout, ensure_ascii=False).encode("utf-16-le"))
+        zf.writestr("DataModelSchema", json.dumps(_salted(model, salt), ensure_ascii=False).encode("utf-16-le"))
+    return path
+
+
+def write_pbix(path: Path, model: Dict, layout: Dict, salt: str = "") -> Path:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("Version", "1.28".encode("utf-16-le"))
+        zf.writestr("Report/Layout", json.dumps(layout, ensure_ascii=False).encode("utf-16-le"))
+        zf.writestr("DataModel", os.urandom(4096))   # VertiPaq compressé : illisible sans pbi-tools
+        zf.writestr(BENCH_MODEL, json.dumps(_salted(model, salt), ensure_ascii=False))
+    return path
+
+
+def write_extract_folder(root: Path, model: Dict, layout: Dict) -> Path:
+    (root / "Report" / "Layout").mkdir(parents=True, exist_ok=True)
+    (root / "Model").mkdir(parents=True, exist_ok=True)
+    for name, page in layout_files(layout).items():
+        (root / "Report" / "Layout" / name).write_text(json.dumps(page, ensure_ascii=False), encoding="utf-8")
+    (root / "Model" / "database.json").write_text(json.dumps(model, ensure_ascii=False), encoding="utf-8")
+    return root
+
+
+def generate(out: Path, tables: int, measures: int, pages: int, visuals: int, count: int = 1, seed: int = 0) -> List[Path]:
+    """count .pbit + count .pbix (contenu identique, hash distinct) et un dossier d’extraction."""
+    out.mkdir(parents=True, exist_ok=True)
+    model = synthetic_model(tables, measures, seed)
+    layout = synthetic_layout(model, pages, visuals, seed)
+    files = []
+    for i in range(count):
+        files.append(write_pbit(out / f"bench_{i}.pbit", model, layout, salt=f"{seed}-{i}"))
+        files.append(write_pbix(out / f"bench_{i}.pbix", model, layout, salt=f"{seed}-{i}"))
+    write_extract_folder(out / "extract", model, layout)
+    return files
+
+
+def main(argv: List[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Génère des .pbit/.pbix synthétiques et un dossier d’extraction.")
+    ap.add_argument("out", type=Path)
+    ap.add_argument("--size", choices=SIZES, default="medium")
+    for k in ("tables", "measures", "pages", "visuals"):
+        ap.add_argument(f"--{k}", type=int, help=f"remplace la valeur de --size ({k})")
+    ap.add_argument("--count", type=int, default=1, help="fichiers de chaque type (hash distincts)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+    params = {k: getattr(args, k) or v for k, v in SIZES[args.size].items()}
+    for f in generate(args.out, count=args.count, seed=args.seed, **params):
+        print(f"{f}  ({f.stat().st_size / 1024:.0f} Ko)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""
+Benchmarks : extraction, construction du contexte / des prompts, débit de l’API.
+
+    python -m bench.run --size medium                  # tout (fixtures, stub LLM, uvicorn)
+    python -m bench.run --size large --skip-api        # extraction + contexte seulement
+    python -m bench.compare bench/results/<avant>.json bench/results/<après>.json
+
+• Extraction : fast-path (.pbit), chemin pbi-tools (.pbix + bench/fake_pbi_tools.py),
+  lecture d’un dossier d’extraction ; temps (médiane, p95) et pic mémoire (tracemalloc).
+• Contexte : taille de la spec compacte vs JSON, index BM25, graphe de lignage,
+  prompts du chat (main._chat_messages, chat.build_context) et de la rédaction.
+• API : uvicorn lancé en sous-processus contre le stub LLM ; /api/spec (upload → job terminé),
+  /api/chat (miss puis hit du cache), /api/chat/stream (temps jusqu’au premier token)
+  sous --concurrency requêtes simultanées.
+
+Résultats : bench/results/<commit>-<taille>.json (cf. --out), un objet par section.
+"""
+import argparse, asyncio, json, os, platform, socket, statistics, subprocess, sys, tempfile, time, tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from .fixtures import SIZES, generate
+from .stub_llm import StubLLM
+
+ROOT = Path(__file__).resolve().parents[1]
+RESULTS = ROOT / "bench" / "results"
+FAKE_PBITOOLS = ROOT / "bench" / ("fake-pbi-tools.cmd" if os.name == "nt" else "fake_pbi_tools.py")
+QUESTIONS = [
+    "Comment est calculée la {m} ?",
+    "Quelles tables alimentent la {m} ?",
+    "Sur quelles pages la {m} est-elle affichée ?",
+    "Que se passe-t-il si je supprime la colonne utilisée par la {m} ?",
+]
+
+
+def _stats(samples: List[float]) -> Dict:
+    """Résumé d’une série de durées (secondes)."""
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_s": round(statistics.fmean(samples), 6),
+        "p50_s": round(ordered[len(ordered) // 2], 6),
+        "p95_s": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 6),
+        "min_s": round(ordered[0], 6),
+        "max_s": round(ordered[-1], 6),
+    }
+
+
+def _timed(fn: Callable, repeat: int) -> tuple:
+    samples, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    return result, _stats(samples)
+
+
+def _peak_mb(fn: Callable) -> float:
+    """Pic d’allocations Python pendant fn() (hors sous-processus)."""
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+    finally:
+        tracemalloc.stop()
+
+
+def _questions(spec: Dict, n: int) -> List[str]:
+    names = [m["name"] for m in spec["measures"]] or spec["tables"] or ["modèle"]
+    return [QUESTIONS[i % len(QUESTIONS)].format(m=names[(i * 7) % len(names)]) for i in range(n)]
+
+
+# ------------------------------------------------------------------
+# Extraction
+# ------------------------------------------------------------------
+def bench_extraction(ws: Path, repeat: int) -> tuple:
+    from backend.app.extract_pbix import extract_spec, _extract_pages, _find_model_file
+    from backend.app.json_stream import read_model
+
+    pbit, pbix, folder = ws / "bench_0.pbit", ws / "bench_0.pbix", ws / "extract"
+
+    def parse_folder():
+        with open(_find_model_file(folder), "rb") as f:
+            return _extract_pages(folder), read_model(f)
+
+    spec, fast = _timed(lambda: extract_spec(str(pbit), spec_id="bench"), repeat)
+    _, slow = _timed(lambda: extract_spec(str(pbix), spec_id="bench"), repeat)
+    _, parse = _timed(parse_folder, repeat)
+    return spec, {
+        "fast_path": {**fast, "peak_mb": _peak_mb(lambda: extract_spec(str(pbit))), "file_kb": pbit.stat().st_size // 1024},
+        "pbi_tools": {**slow, "peak_mb": _peak_mb(lambda: extract_spec(str(pbix))), "file_kb": pbix.stat().st_size // 1024},
+        "extract_folder": {**parse, "peak_mb": _peak_mb(parse_folder)},
+        "counts": {k: len(spec[k]) for k in ("tables", "measures", "relations", "pages")},
+    }
+
+
+# ------------------------------------------------------------------
+# Contexte & prompts
+# ------------------------------------------------------------------
+def bench_context(spec: Dict, repeat: int, questions: int) -> Dict:
+    from backend.app import main as api
+    from backend.app.chat import build_context
+    from backend.app.generate_narrative import section_tasks
+    from backend.app.lineage import build_lineage
+    from backend.app.spec_index import SpecIndex, index_for
+    from backend.app.spec_prompt import token_report
+    from backend.app.tokens import count_tokens
+
+    qs = _questions(spec, questions)
+    _, index_build = _timed(lambda: SpecIndex.build(spec), repeat)
+    _, lineage_build = _timed(lambda: build_lineage(spec), repeat)
+    index_for(spec)   # régime établi : index déjà en cache
+
+    chat_samples, chat_tokens = [], []
+    for q in qs:
+        t0 = time.perf_counter()
+        messages = api._chat_messages(spec, q)
+        chat_samples.append(time.perf_counter() - t0)
+        chat_tokens.append(sum(count_tokens(m["content"]) for m in messages))
+    ctx_samples = []
+    for q in qs:
+        t0 = time.perf_counter()
+        build_context(q, spec)
+        ctx_samples.append(time.perf_counter() - t0)
+
+    tasks, narrative = _timed(lambda: section_tasks(spec), repeat)
+    narrative_tokens = [count_tokens(p) for _, p in tasks]
+    return {
+        "spec_tokens": token_report(spec),
+        "index_build": index_build,
+        "lineage_build": lineage_build,
+        "chat_messages": {**_stats(chat_samples), "prompt_tokens_mean": round(statistics.fmean(chat_tokens)),
+                          "prompt_tokens_max": max(chat_tokens)},
+        "build_context": _stats(ctx_samples),
+        "narrative_prompts": {**narrative, "tasks": len(tasks), "prompt_tokens_total": sum(narrative_tokens),
+                              "prompt_tokens_max": max(narrative_tokens, default=0)},
+    }
+
+
+# ------------------------------------------------------------------
+# API (uvicorn + stub LLM)
+# ------------------------------------------------------------------
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Server:
+    """uvicorn backend.app.main:app dans un sous-processus, le temps du benchmark."""
+
+    def __init__(self, env: Dict[str, str]):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = env
+
+    def __enter__(self) -> "Server":
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.app.main:app", "--port", str(self.port), "--log-level", "warning"],
+            cwd=ROOT, env=self.env,
+        )
+        import httpx
+        t0 = time.monotonic()
+        deadline = t0 + 60
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError("uvicorn s’est arrêté au démarrage")
+            try:
+                if httpx.get(f"{self.url}/readyz", timeout=1).status_code == 200:   # warm-up terminé
+                    self.ready_s = time.monotonic() - t0
+                    return self
+            except httpx.TransportError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("uvicorn ne répond pas")
+
+    def __exit__(self, *exc) -> None:
+        self.proc.terminate()
+        try:
+            self.proc.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+async def _gather(concurrency: int, jobs: List[Callable]) -> tuple:
+    """Exécute les coroutines avec au plus `concurrency` en vol : (durées, échecs, durée totale)."""
+    sem = asyncio.Semaphore(concurrency)
+    samples, failures = [], 0
+
+    async def one(job):
+        nonlocal failures
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await job()
+                samples.append(time.perf_counter() - t0)
+            except Exception:
+                failures += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(j) for j in jobs))
+    return samples, failures, time.perf_counter() - t0
+
+
+def _throughput(samples: List[float], failures: int, wall: float) -> Dict:
+    return {**_stats(samples), "failures": failures, "wall_s": round(wall, 3),
+            "per_s": round(len(samples) / wall, 3) if wall else 0.0}
+
+
+async def _api_run(url: str, files: List[Path], questions: List[str], concurrency: int) -> Dict:
+    import httpx
+
+    async with httpx.AsyncClient(base_url=url, timeout=600) as client:
+        spec_ids: List[str] = []
+
+        def spec_job(path: Path):
+            async def run():
+                r = await client.post("/api/spec", files={"pbix": (path.name, path.read_bytes())})
+                r.raise_for_status()
+                job = r.json()
+                while job["stage"] not in ("done", "failed"):
+                    await asyncio.sleep(0.05)
+                    job = (await client.get(f"/api/spec/jobs/{job['job_id']}")).json()
+                if job["stage"] == "failed":
+                    raise RuntimeError(job["error"])
+                spec_ids.append(job["result"]["id"])
+            return run
+
+        spec = await _gather(concurrency, [spec_job(f) for f in files])
+        if not spec_ids:
+            return {"spec": _throughput(*spec)}
+        spec_id = spec_ids[0]
+
+        def chat(q: str):
+            async def run():
+                r = await client.post("/api/chat", json={"id": spec_id, "question": q})
+                r.raise_for_status()
+            return run
+
+        ttfb: List[float] = []
+
+        def stream(q: str):
+            async def run():
+                t0 = time.perf_counter()
+                async with client.stream("POST", "/api/chat/stream", json={"id": spec_id, "question": q}) as r:
+                    r.raise_for_status()
+                    first = True
+                    async for line in r.aiter_lines():
+                        if first and line.startswith("data:"):
+                            ttfb.append(time.perf_counter() - t0)
+                            first = False
+            return run
+
+        miss = await _gather(concurrency, [chat(q) for q in questions])
+        hit = await _gather(concurrency, [chat(q) for q in questions])
+        streamed = await _gather(concurrency, [stream(f"{q} (flux)") for q in questions])
+    return {
+        "spec": {**_throughput(*spec), "per_min": round(len(spec[0]) / spec[2] * 60, 2) if spec[2] else 0.0},
+        "chat_miss": _throughput(*miss),
+        "chat_hit": _throughput(*hit),
+        "chat_stream": {**_throughput(*streamed), "ttfb": _stats(ttfb)},
+    }
+
+
+def bench_api(ws: Path, spec: Dict, args) -> Dict:
+    stub = StubLLM(latency_ms=args.llm_latency_ms, tokens=args.llm_tokens, fail_every=args.llm_fail_every).start()
+    env = {
+        **os.environ,
+        "AZURE_OPENAI_ENDPOINT": stub.url, "AZURE_OPENAI_KEY": "bench", "AZURE_OPENAI_DEPLOYMENT": "bench",
+        "SPEC_CACHE_PATH": str(ws / "api_cache.sqlite3"),
+        "SPEC_STORE_URL": f"sqlite:///{ws / 'api_store.sqlite3'}",
+        "SEARCH_INDEX_PATH": str(ws / "api_search.sqlite3"),
+        "PBITOOLS_PATH": str(FAKE_PBITOOLS),
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.getenv("PYTHONPATH")])),
+    }
+    files = sorted(ws.glob(f"bench_*.{args.spec_format}"))[:args.spec_requests]
+    try:
+        with Server(env) as server:
+            out = asyncio.run(_api_run(server.url, files, _questions(spec, args.chat_requests), args.concurrency))
+        out["startup"] = {"ready_s": round(server.ready_s, 3)}
+    finally:
+        stub.stop()
+    out["llm"] = stub.snapshot()
+    return out
+
+
+# ------------------------------------------------------------------
+def _git(*cmd: str) -> str:
+    try:
+        return subprocess.run(["git", *cmd], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+
+
+def _meta(args, params: Dict) -> Dict:
+    def has(mod: str) -> bool:
+        try:
+            __import__(mod)
+            return True
+        except ImportError:
+            return False
+
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD") or "unknown",
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "optional": {m: has(m) for m in ("ijson", "orjson", "tiktoken")},
+        "size": args.size,
+        "params": params,
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "size")},
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmarks extraction / contexte / API sur fixtures synthétiques.")
+    ap.add_argument("--size", choices=SIZES, default="medium")
+    for k in ("tables", "measures", "pages", "visuals"):
+        ap.add_argument(f"--{k}", type=int, help=f"remplace la valeur de --size ({k})")
+    ap.add_argument("--repeat", type=int, default=5, help="répétitions des mesures en process")
+    ap.add_argument("--questions", type=int, default=50, help="questions pour le contexte du chat")
+    ap.add_argument("--skip-api", action="store_true", help="sans uvicorn ni stub LLM")
+    ap.add_argument("--concurrency", type=int, default=8, help="requêtes HTTP simultanées")
+    ap.add_argument("--spec-requests", type=int, default=8, help="uploads /api/spec (fichiers distincts)")
+    ap.add_argument("--spec-format", choices=("pbit", "pbix"), default="pbit", help="pbix = chemin pbi-tools")
+    ap.add_argument("--chat-requests", type=int, default=100)
+    ap.add_argument("--llm-latency-ms", type=float, default=200)
+    ap.add_argument("--llm-tokens", type=int, default=120)
+    ap.add_argument("--llm-fail-every", type=int, default=0, help="un appel LLM sur N répond 429")
+    ap.add_argument("--out", type=Path, help="fichier JSON de résultats")
+    args = ap.parse_args(argv)
+    params = {k: getattr(args, k) or v for k, v in SIZES[args.size].items()}
+
+    with tempfile.TemporaryDirectory(prefix="pbix_bench_") as tmp:
+        ws = Path(tmp)
+        # les modules du backend lisent leur configuration à l’import : caches isolés dans le dossier temporaire
+        os.environ.update({
+            "SPEC_CACHE_PATH": str(ws / "cache.sqlite3"),
+            "SPEC_STORE_URL": f"sqlite:///{ws / 'store.sqlite3'}",
+            "SEARCH_INDEX_PATH": str(ws / "search.sqlite3"),
+            "PBITOOLS_PATH": str(FAKE_PBITOOLS),
+        })
+        t0 = time.perf_counter()
+        generate(ws, count=1 if args.skip_api else max(1, args.spec_requests), **params)
+        results: Dict = {"meta": _meta(args, params), "fixtures_s": round(time.perf_counter() - t0, 3)}
+
+        print("▶ extraction…", file=sys.stderr)
+        spec, results["extraction"] = bench_extraction(ws, args.repeat)
+        print("▶ contexte & prompts…", file=sys.stderr)
+        results["context"] = bench_context(spec, args.repeat, args.questions)
+        if not args.skip_api:
+            print("▶ API…", file=sys.stderr)
+            results["api"] = bench_api(ws, spec, args)
+
+    meta = results["meta"]
+    out = args.out or RESULTS / f"{meta['commit']}{'-dirty' if meta['dirty'] else ''}-{args.size}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(json.dumps({k: v for k, v in results.items() if k != "meta"}, indent=2, ensure_ascii=False))
+    print(f"\n→ {out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
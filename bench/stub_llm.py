@@ -0,0 +1,121 @@
+"""
+Serveur LLM local compatible Azure OpenAI (…/openai/deployments/<d>/chat/completions).
+
+    python -m bench.stub_llm --port 8099 --latency-ms 300 --tokens 200
+
+puis AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8099 AZURE_OPENAI_KEY=x AZURE_OPENAI_DEPLOYMENT=bench.
+
+• Réponse JSON avec bloc `usage`, ou Server-Sent Events si "stream": true
+  (latence répartie entre les tokens ; chunk `usage` final si stream_options.include_usage).
+• --fail-every N : un appel sur N répond 429 (Retry-After: 0) pour exercer les retries.
+"""
+import argparse, json, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+
+class StubLLM:
+    def __init__(self, port: int = 0, latency_ms: float = 200, tokens: int = 120, fail_every: int = 0):
+        self.latency_s, self.tokens, self.fail_every = latency_ms / 1000, tokens, fail_every
+        self.stats = {"calls": 0, "rate_limited": 0, "streamed": 0, "prompt_chars": 0}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubLLM":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return dict(self.stats)
+
+    # ------------------------------------------------------------------
+    def _count(self, body: Dict) -> bool:
+        """Comptabilise l’appel ; True si celui-ci doit être refusé en 429."""
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["prompt_chars"] += sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+            limited = bool(self.fail_every) and self.stats["calls"] % self.fail_every == 0
+            self.stats["rate_limited"] += limited
+            self.stats["streamed"] += bool(body.get("stream")) and not limited
+            return limited
+
+    def _usage(self, body: Dict) -> Dict:
+        prompt = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        return {"prompt_tokens": prompt, "completion_tokens": self.tokens, "total_tokens": prompt + self.tokens}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload: bytes, headers: Dict[str, str]) -> None:
+                self.send_response(status)
+                for k, v in {**headers, "Content-Length": str(len(payload))}.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if stub._count(body):
+                    self._send(429, b'{"error":{"code":"429"}}', {"Retry-After": "0", "Content-Type": "application/json"})
+                    return
+                words = ["mot"] * stub.tokens
+                if body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    for w in words:
+                        time.sleep(stub.latency_s / max(1, stub.tokens))
+                        chunk = {"choices": [{"delta": {"content": w + " "}}]}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        self.wfile.flush()
+                    if body.get("stream_options", {}).get("include_usage"):
+                        usage = stub._usage(body)
+                        self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode())
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.close_connection = True
+                    return
+                time.sleep(stub.latency_s)
+                payload = {
+                    "choices": [{"message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                    "usage": stub._usage(body),
+                }
+                self._send(200, json.dumps(payload).encode(), {"Content-Type": "application/json"})
+
+        return Handler
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Stub LLM compatible Azure OpenAI.")
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--latency-ms", type=float, default=200)
+    ap.add_argument("--tokens", type=int, default=120, help="tokens par réponse")
+    ap.add_argument("--fail-every", type=int, default=0, help="un appel sur N répond 429")
+    args = ap.parse_args()
+    stub = StubLLM(args.port, args.latency_ms, args.tokens, args.fail_every)
+    print(f"Stub LLM sur {stub.url} (Ctrl-C pour arrêter)")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
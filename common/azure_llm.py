@@ -1,5 +1,5 @@
 """
-Wrapper MINIMAL pour appeler Azure OpenAI ChatCompletion.
+Client Azure OpenAI ChatCompletion (async + shim synchrone).
 
 Variables d’environnement attendues :
 - AZURE_OPENAI_KEY
@@ -7,39 +7,357 @@ Variables d’environnement attendues :
                            soit l’URL déjà complète …/deployments/<id>/chat/completions)
 - AZURE_OPENAI_DEPLOYMENT (si l’endpoint n’inclut pas déjà /deployments/…)
 - AZURE_OPENAI_API_VERSION (défaut : 2025-01-01-preview)
+
+Réglages optionnels :
+- LLM_MAX_CONCURRENCY (défaut 8)   : appels simultanés max vers Azure
+- LLM_MAX_RETRIES     (défaut 4)   : nouvelles tentatives sur 408/429/5xx/erreur réseau
+- LLM_TIMEOUT_S       (défaut 60)  : délai max d’une tentative
+- LLM_DEADLINE_S      (défaut 180) : délai max d’un appel, tentatives comprises
+- LLM_STREAM_USAGE    (défaut 1)   : demande le bloc `usage` en fin de flux (stream_options)
+
+Chaque appel est chronométré (étape `llm`, cf. common.metrics) ; le bloc `usage`
+est renvoyé dans les métadonnées et compté dans pbix_llm_tokens_total.
+
+La configuration est lue une seule fois ; les connexions HTTP (keep-alive)
+sont partagées par tous les appels du process et ouvertes dès le démarrage
+du backend (warm_up(), cf. backend.app.warmup).
 """
-from typing import List, Dict, Tuple
-import os, requests
+from typing import AsyncIterator, List, Dict, Tuple
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+import asyncio, json, os, random, threading, time
+import httpx
+from .metrics import LLM_ATTEMPTS, record_usage, stage
 from dotenv import load_dotenv   # ← NEW
-load_dotenv()   
+load_dotenv()
 
-def azure_llm_chat(
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+BACKOFF_BASE_S = 0.5
+BACKOFF_CAP_S = 20.0
+
+
+@dataclass(frozen=True)
+class LLMConfig:
+    api_key: str
+    endpoint: str
+    deployment: str | None
+    api_version: str
+    max_concurrency: int = 8
+    max_retries: int = 4
+    timeout_s: float = 60.0
+    deadline_s: float = 180.0
+    max_tokens: int = 1200
+    stream_usage: bool = True
+
+    @classmethod
+    def from_env(cls) -> "LLMConfig":
+        api_key = os.getenv("AZURE_OPENAI_KEY")
+        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "").rstrip("/")
+        if not api_key or not endpoint:
+            raise RuntimeError("AZURE_OPENAI_KEY ou AZURE_OPENAI_ENDPOINT manquant dans .env")
+        return cls(
+            api_key=api_key,
+            endpoint=endpoint,
+            deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview"),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+            timeout_s=float(os.getenv("LLM_TIMEOUT_S", "60")),
+            deadline_s=float(os.getenv("LLM_DEADLINE_S", "180")),
+            stream_usage=os.getenv("LLM_STREAM_USAGE", "1") != "0",
+        )
+
+    def url(self, model: str | None = None) -> Tuple[str, str]:
+        """(url, deployment) — l’AZURE_OPENAI_DEPLOYMENT du .env reste prioritaire."""
+        deployment = self.deployment or model or "gpt-4o"
+        if "/deployments/" in self.endpoint:
+            return self.endpoint, deployment
+        return (
+            f"{self.endpoint}/openai/deployments/{deployment}/chat/completions"
+            f"?api-version={self.api_version}",
+            deployment,
+        )
+
+
+# ------------------------------------------------------------------
+# Backoff
+# ------------------------------------------------------------------
+def _retry_after(resp: httpx.Response | None) -> float | None:
+    """Délai imposé par le serveur (retry-after-ms d’Azure, ou Retry-After en secondes / date HTTP)."""
+    if resp is None:
+        return None
+    ms = resp.headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    ra = resp.headers.get("retry-after")
+    if not ra:
+        return None
+    try:
+        return max(0.0, float(ra))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(ra).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def _backoff(attempt: int, resp: httpx.Response | None) -> float:
+    """Full jitter exponentiel, jamais inférieur au Retry-After du serveur."""
+    delay = random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+    server = _retry_after(resp)
+    return max(delay, server) if server is not None else delay
+
+
+async def _sse_deltas(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Lignes `data: {...}` d’un flux chat/completions → morceaux de contenu."""
+    async for line in lines:
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        chunk = json.loads(data)
+        if chunk.get("usage"):  # dernier chunk (stream_options.include_usage) : choices vide
+            record_usage(chunk["usage"])
+        for choice in chunk.get("choices", []):  # 1er chunk Azure : choices vide (filtres)
+            delta = choice.get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    ...
+
+
+async def _until(deadline: float, items: AsyncIterator[str], deadline_s: float) -> AsyncIterator[str]:
+    """items tant que l’échéance (time.monotonic) n’est pas atteinte : chaque attente est bornée par le temps restant."""
+    it = items.__aiter__()
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            if remaining <= 0:
+                raise TimeoutError
+            item = await asyncio.wait_for(it.__anext__(), remaining)
+        except StopAsyncIteration:
+            return
+        except TimeoutError:
+            raise LLMDeadlineExceeded(f"LLM : délai de {deadline_s:.0f}s dépassé (flux interrompu)") from None
+        yield item
+
+
+def _should_retry(resp: httpx.Response | None, exc: Exception | None) -> bool:
+    LLM_ATTEMPTS.inc(status="error" if exc is not None else resp.status_code)
+    if exc is not None:
+        return isinstance(exc, httpx.TransportError)
+    return resp.status_code in RETRY_STATUS
+
+
+# ------------------------------------------------------------------
+# Client
+# ------------------------------------------------------------------
+class AzureLLMClient:
+    """
+    Un pool httpx partagé par mode (sync / async) + un sémaphore de concurrence.
+    Un client async par boucle asyncio (uvicorn, thread du backend embarqué, tests,
+    asyncio.run…) ; celui d’une boucle fermée est abandonné, ses connexions libérées.
+    """
+
+    def __init__(self, config: LLMConfig):
+        self.config = config
+        self._headers = {"api-key": config.api_key, "Content-Type": "application/json"}
+        limits = httpx.Limits(
+            max_connections=config.max_concurrency,
+            max_keepalive_connections=config.max_concurrency,
+        )
+        self._limits = limits
+        self._sync = httpx.Client(headers=self._headers, limits=limits, timeout=config.timeout_s)
+        self._sync_sem = threading.BoundedSemaphore(config.max_concurrency)
+        self._async: Dict[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, asyncio.Semaphore]] = {}
+        self._async_lock = threading.Lock()
+
+    def _async_client(self) -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            pair = self._async.get(loop)
+            if pair is None:
+                # boucles fermées : plus rien ne peut y attendre aclose() ; sans référence, les
+                # transports ferment leurs sockets (et la boucle peut être libérée)
+                for closed in [l for l in self._async if l.is_closed()]:
+                    del self._async[closed]
+                pair = self._async[loop] = (
+                    httpx.AsyncClient(headers=self._headers, limits=self._limits, timeout=self.config.timeout_s),
+                    asyncio.Semaphore(self.config.max_concurrency),
+                )
+        return pair
+
+    def _payload(self, messages: List[Dict]) -> Dict:
+        return {"messages": messages, "max_tokens": self.config.max_tokens}
+
+    @staticmethod
+    def _parse(resp: httpx.Response, url: str, deployment: str) -> Tuple[str, Dict]:
+        resp.raise_for_status()
+        data = resp.json()
+        usage = data.get("usage") or {}
+        record_usage(usage)
+        return (
+            data["choices"][0]["message"]["content"],
+            {"x-llm-endpoint": url, "x-llm-deployment": deployment, "usage": usage},
+        )
+
+    # ------------------------------------------------------------------
+    def _remaining(self, deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMDeadlineExceeded(f"LLM : délai de {self.config.deadline_s:.0f}s dépassé")
+        return min(self.config.timeout_s, remaining)
+
+    def _retry_delay(self, attempt: int, resp, exc, deadline: float) -> float | None:
+        """Délai avant la prochaine tentative, ou None s’il faut s’arrêter là."""
+        if not _should_retry(resp, exc) or attempt >= self.config.max_retries:
+            return None
+        delay = _backoff(attempt, resp)
+        return None if time.monotonic() + delay >= deadline else delay
+
+    def _finish(self, resp, exc, url: str, deployment: str) -> Tuple[str, Dict]:
+        if exc is not None:
+            raise exc
+        return self._parse(resp, url, deployment)
+
+    async def achat(self, messages: List[Dict], model: str | None = None) -> Tuple[str, Dict]:
+        with stage("llm"):
+            return await self._achat(messages, model)
+
+    async def _achat(self, messages: List[Dict], model: str | None = None) -> Tuple[str, Dict]:
+        url, deployment = self.config.url(model)
+        client, sem = self._async_client()
+        deadline = time.monotonic() + self.config.deadline_s
+        attempt = 0
+        while True:
+            resp, exc = None, None
+            try:
+                async with sem:
+                    resp = await client.post(
+                        url, json=self._payload(messages), timeout=self._remaining(deadline)
+                    )
+            except httpx.HTTPError as e:
+                exc = e
+            delay = self._retry_delay(attempt, resp, exc, deadline)
+            if delay is None:
+                return self._finish(resp, exc, url, deployment)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def chat(self, messages: List[Dict], model: str | None = None) -> Tuple[str, Dict]:
+        with stage("llm"):
+            return self._chat(messages, model)
+
+    def _chat(self, messages: List[Dict], model: str | None = None) -> Tuple[str, Dict]:
+        url, deployment = self.config.url(model)
+        deadline = time.monotonic() + self.config.deadline_s
+        attempt = 0
+        while True:
+            resp, exc = None, None
+            try:
+                with self._sync_sem:
+                    resp = self._sync.post(
+                        url, json=self._payload(messages), timeout=self._remaining(deadline)
+                    )
+            except httpx.HTTPError as e:
+                exc = e
+            delay = self._retry_delay(attempt, resp, exc, deadline)
+            if delay is None:
+                return self._finish(resp, exc, url, deployment)
+            time.sleep(delay)
+            attempt += 1
+
+    async def astream(self, messages: List[Dict], model: str | None = None) -> AsyncIterator[str]:
+        """
+        Complétion en streaming (SSE Azure) : renvoie les morceaux de texte au fil de l’eau.
+        Les nouvelles tentatives ne sont possibles qu’avant le premier token reçu.
+        """
+        with stage("llm_stream"):
+            async for delta in self._astream(messages, model):
+                yield delta
+
+    async def _astream(self, messages: List[Dict], model: str | None = None) -> AsyncIterator[str]:
+        url, deployment = self.config.url(model)
+        client, sem = self._async_client()
+        deadline = time.monotonic() + self.config.deadline_s
+        payload = {**self._payload(messages), "stream": True}
+        if self.config.stream_usage:
+            payload["stream_options"] = {"include_usage": True}
+        attempt = 0
+        while True:
+            resp, exc = None, None
+            async with sem:
+                try:
+                    async with client.stream("POST", url, json=payload, timeout=self._remaining(deadline)) as resp:
+                        if resp.status_code < 400:   # échéance vérifiée à chaque morceau, pas seulement au 1er
+                            lines = _until(deadline, resp.aiter_lines(), self.config.deadline_s)
+                            async for delta in _sse_deltas(lines):
+                                yield delta
+                            return
+                        await resp.aread()
+                except httpx.HTTPError as e:
+                    if resp is not None and resp.status_code < 400:
+                        raise  # coupure en plein flux : on ne rejoue pas une réponse partielle
+                    exc = e
+            delay = self._retry_delay(attempt, resp, exc, deadline)
+            if delay is None:
+                self._finish(resp, exc, url, deployment)  # lève toujours ici (erreur HTTP ou réseau)
+                return
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def warm_up(self, timeout_s: float = 5.0) -> int:
+        """Ouvre une connexion keep-alive vers l’endpoint (TLS compris) ; renvoie le statut HTTP obtenu."""
+        client, _ = self._async_client()
+        resp = await client.head(self.config.url()[0], timeout=min(timeout_s, self.config.timeout_s))
+        return resp.status_code
+
+    async def aclose(self) -> None:
+        """Ferme le client de la boucle courante, et ceux des autres boucles encore actives (dans leur boucle)."""
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            clients, self._async = self._async, {}
+        for other, (client, _) in clients.items():
+            if other is loop:
+                await client.aclose()
+            elif other.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), other)
+        self._sync.close()
+
+
+@lru_cache(maxsize=1)
+def get_client() -> AzureLLMClient:
+    """Client partagé du process (config lue une seule fois)."""
+    return AzureLLMClient(LLMConfig.from_env())
+
+
+# ------------------------------------------------------------------
+# API fonctionnelle (compatibilité avec les appelants existants)
+# ------------------------------------------------------------------
+async def azure_llm_chat_async(
     messages: List[Dict],
     model: str | None = None,
 ) -> Tuple[str, Dict]:
-    api_key = os.getenv("AZURE_OPENAI_KEY")
-    endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "").rstrip("/")
-    deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT", model or "gpt-4o")
-    api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview")
-
-    if not api_key or not endpoint:
-        raise RuntimeError("AZURE_OPENAI_KEY ou AZURE_OPENAI_ENDPOINT manquant dans .env")
-
-    # Construit l’URL si nécessaire
-    if "/deployments/" not in endpoint:
-        endpoint = (
-            f"{endpoint}/openai/deployments/{deployment}/chat/completions"
-            f"?api-version={api_version}"
-        )
+    return await get_client().achat(messages, model)
 
-    payload = {"messages": messages, "max_tokens": 1200}
-    headers = {"api-key": api_key, "Content-Type": "application/json"}
 
-    resp = requests.post(endpoint, headers=headers, json=payload, timeout=60)
-    resp.raise_for_status()
-    data = resp.json()
+def azure_llm_chat_stream_async(
+    messages: List[Dict],
+    model: str | None = None,
+) -> AsyncIterator[str]:
+    return get_client().astream(messages, model)
+
 
-    return (
-        data["choices"][0]["message"]["content"],
-        {"x-llm-endpoint": endpoint, "x-llm-deployment": deployment},
-    )
+def azure_llm_chat(
+    messages: List[Dict],
+    model: str | None = None,
+) -> Tuple[str, Dict]:
+    """Shim synchrone : à n’utiliser que hors de la boucle asyncio (threads de jobs, scripts)."""
+    return get_client().chat(messages, model)
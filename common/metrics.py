@@ -0,0 +1,208 @@
+"""
+Métriques du process (format texte Prometheus, sans dépendance) + Server-Timing.
+
+• Counter / Gauge / Histogram à labels, rendus par render() pour GET /metrics.
+• stage("parse") chronomètre une étape : histogramme pbix_stage_seconds{stage}
+  et, si une portée timing_scope() est active (requête HTTP, job), ajout de la
+  durée à son en-tête Server-Timing.
+• Chaque worker uvicorn a ses propres compteurs (un scrape = un worker).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Tuple
+import threading, time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(pairs: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in pairs] + ([extra] if extra else [])
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _quote(v: str) -> str:
+    return f'"{v}"'
+
+
+_INF = 'le="+Inf"'
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    @staticmethod
+    def _key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_labels(k)} {_num(v)}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @contextmanager
+    def track(self, **labels) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}   # labels -> [comptes par bucket…, somme, total]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, n in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_labels(key, 'le=' + _quote(_num(bound)))} {n}")
+                lines.append(f"{self.name}_bucket{_labels(key, _INF)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(key)} {_num(series[-2])}")
+                lines.append(f"{self.name}_count{_labels(key)} {series[-1]}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# ------------------------------------------------------------------
+# Catalogue
+# ------------------------------------------------------------------
+STAGE_SECONDS = Histogram("pbix_stage_seconds", "Durée des étapes (upload, extract, pbitools, parse, narrative, context, llm…).")
+UPLOAD_BYTES = Counter("pbix_upload_bytes_total", "Octets de .pbix reçus.")
+LLM_ATTEMPTS = Counter("pbix_llm_attempts_total", "Tentatives d’appel LLM par statut HTTP (error = erreur réseau).")
+LLM_TOKENS = Counter("pbix_llm_tokens_total", "Tokens facturés par le LLM (kind = prompt | completion).")
+CACHE_REQUESTS = Counter("pbix_cache_requests_total", "Consultations des caches (cache = spec | answer, result = hit | miss).")
+JOBS_IN_FLIGHT = Gauge("pbix_jobs_in_flight", "Jobs de spec en file ou en cours.")
+JOBS_TOTAL = Counter("pbix_jobs_total", "Jobs de spec terminés (outcome = done | failed).")
+PBITOOLS_PROCESSES = Gauge("pbix_pbitools_processes", "Processus pbi-tools par worker (state = queued | running).")
+PBITOOLS_RUNS = Counter("pbix_pbitools_runs_total", "Exécutions pbi-tools (outcome = ok | error | timeout | aborted).")
+COALESCED_REQUESTS = Counter("pbix_coalesced_requests_total", "Requêtes identiques en vol (flight = spec | chat, role = leader | follower).")
+STARTUP_SECONDS = Gauge("pbix_startup_seconds", "Démarrage du worker (phase = imports | warmup | vérification du warm-up).")
+
+
+def record_usage(usage: Dict | None) -> None:
+    """Bloc `usage` d’une réponse chat/completions → compteurs de tokens."""
+    for kind in ("prompt", "completion"):
+        n = (usage or {}).get(f"{kind}_tokens")
+        if n:
+            LLM_TOKENS.inc(n, kind=kind)
+
+
+# ------------------------------------------------------------------
+# Server-Timing
+# ------------------------------------------------------------------
+class ServerTiming:
+    """Durées cumulées par étape (plusieurs appels LLM → une seule entrée `llm`)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ms: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._ms[name] = self._ms.get(name, 0.0) + seconds * 1000
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            return {k: round(v, 1) for k, v in self._ms.items()}
+
+    def header(self) -> str:
+        return server_timing_header(self.as_dict())
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={ms}" for name, ms in timings.items())
+
+
+_TIMING: ContextVar[ServerTiming | None] = ContextVar("server_timing", default=None)
+
+
+@contextmanager
+def timing_scope(timing: ServerTiming | None = None) -> Iterator[ServerTiming]:
+    """Les stage() exécutés dans cette portée (même tâche / même thread) alimentent `timing`."""
+    timing = timing or ServerTiming()
+    token = _TIMING.set(timing)
+    try:
+        yield timing
+    finally:
+        _TIMING.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timing = _TIMING.get()
+        if timing is not None:
+            timing.add(name, elapsed)
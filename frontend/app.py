@@ -1,14 +1,14 @@
-# frontend/app.py – v8 (autonome)
+# frontend/app.py – v9
 # -----------------------------------------------------------------------------
-# Ce fichier **se suffit à lui‑même** : on lance la commande
-#     streamlit run frontend/app.py
-# et il démarre automatiquement le backend FastAPI (uvicorn) dans un thread,
-# puis continue l’exécution du front. Les ports/URLs sont internes.
+# Deux modes de lancement :
+#   • BACKEND_URL défini (run_all.py, déploiement) : le front parle à ce backend,
+#     déjà prêt (/readyz), et n’importe rien du backend.
+#   • sinon, `streamlit run frontend/app.py` **se suffit à lui‑même** : il démarre
+#     le backend FastAPI (uvicorn) dans un thread et attend son /readyz.
 # -----------------------------------------------------------------------------
 
 import os, sys, threading, time, socket, contextlib
 import streamlit as st
-import uvicorn
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 0) Prépare le PYTHONPATH pour trouver le backend et les modules communs
@@ -18,38 +18,53 @@ sys.path.append(os.path.join(ROOT, "backend"))   # backend.app.main
 sys.path.append(ROOT)                             # common, etc.
 
 # ──────────────────────────────────────────────────────────────────────────────
-# 1) Utilitaire : vérifie si un port est libre
+# 1) Utilitaires : port libre ? backend prêt ?
 # ──────────────────────────────────────────────────────────────────────────────
 
 def port_is_free(port: int) -> bool:
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         return s.connect_ex(("127.0.0.1", port)) != 0
 
+
+def wait_ready(url: str, timeout_s: float = 30.0) -> bool:
+    """Attend le 200 de /readyz (warm-up du backend terminé) ; False si le warm-up échoue ou tarde."""
+    import json, urllib.error, urllib.request
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/readyz", timeout=2):
+                return True
+        except urllib.error.HTTPError as exc:   # 503 : warm-up en cours… ou en échec
+            if not json.load(exc).get("warming", True):
+                return False
+        except OSError:   # pas encore en écoute
+            pass
+        time.sleep(0.2)
+    return False
+
 # ──────────────────────────────────────────────────────────────────────────────
-# 2) Lance le backend FastAPI **une seule fois**
+# 2) Backend externe (BACKEND_URL) ou lancé ici **une seule fois**
 # ──────────────────────────────────────────────────────────────────────────────
 BACKEND_PORT = 8000
-BACKEND_URL = f"http://127.0.0.1:{BACKEND_PORT}"
+BACKEND_URL = os.getenv("BACKEND_URL", "").rstrip("/") or f"http://127.0.0.1:{BACKEND_PORT}"
 
-if "_backend_started" not in st.session_state:
-    from backend.app.main import app as fastapi_app  # import tardif
+if "_backend_started" not in st.session_state and not os.getenv("BACKEND_URL"):
+    if port_is_free(BACKEND_PORT):
+        import uvicorn                                    # imports tardifs : inutiles
+        from backend.app.main import app as fastapi_app   # avec un backend externe
 
-    def _run_backend():
-        uvicorn.run(
-            fastapi_app,
-            host="0.0.0.0",
-            port=BACKEND_PORT,
-            log_level="warning",
-        )
+        def _run_backend():
+            uvicorn.run(
+                fastapi_app,
+                host="0.0.0.0",
+                port=BACKEND_PORT,
+                log_level="warning",
+            )
 
-    if port_is_free(BACKEND_PORT):
         thread = threading.Thread(target=_run_backend, daemon=True)
         thread.start()
-        # attend que le serveur réponde pour éviter les appels 404
-        for _ in range(30):
-            if not port_is_free(BACKEND_PORT):
-                break
-            time.sleep(0.1)
+        # attend la fin du warm-up pour éviter les premiers appels en erreur
+        wait_ready(BACKEND_URL)
         st.session_state["_backend_thread"] = thread
     else:
         st.session_state["_backend_thread"] = None  # déjà lancé
@@ -57,13 +72,51 @@ if "_backend_started" not in st.session_state:
     st.session_state["_backend_started"] = True
 
 # ──────────────────────────────────────────────────────────────────────────────
-# 3) Reste du FRONTEND (v7) — inchangé, sauf BACKEND URL
+# 3) Reste du FRONTEND
 # ──────────────────────────────────────────────────────────────────────────────
 
 st.set_page_config(page_title="Klint – PBIX Spec & Chat", layout="wide")
 
 st.title("🚀 Klint – PBIX Spec & Chat")
-BACKEND = BACKEND_URL  # ← utilise le backend interne
+BACKEND = BACKEND_URL  # ← backend externe ou interne
+POLL_INTERVAL_S = 1.0
+CHAT_WINDOW = 10          # échanges affichés (les plus anciens à la demande)
+EXPLORER_PAGE_SIZE = 25   # lignes par page dans l’explorateur technique
+EXPLORER_KINDS = {"measures": "Mesures", "tables": "Tables", "relations": "Relations", "pages": "Pages"}
+STAGE_LABELS = {
+    "queued": "En file d’attente…",
+    "extracting": "Extraction du modèle…",
+    "narrating": "Rédaction de la spécification…",
+    "done": "Terminé",
+    "cancelled": "Annulé",
+}
+
+
+@st.cache_resource
+def http():
+    """Session HTTP persistante (keep-alive), partagée par tous les reruns."""
+    import requests
+    return requests.Session()
+
+
+def sse_deltas(resp):
+    """Itère sur les morceaux de texte d’une réponse text/event-stream de /api/chat/stream."""
+    import json
+    resp.encoding = "utf-8"
+    event = None
+    for line in resp.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data = json.loads(line[5:])
+            if event == "error":
+                raise RuntimeError(data.get("detail"))
+            if event == "done":
+                return
+            if "delta" in data:
+                yield data["delta"]
+        elif not line:
+            event = None
 
 # -----------------------------------------------------------------------------
 # 1) SESSION STATE INIT
@@ -72,7 +125,8 @@ for k, v in {
     "chat": [],   # stocke toujours par paires (user, assistant)
     "spec_id": None,
     "spec_func": None,
-    "spec_tech": None,
+    "spec_summary": None,
+    "chat_window": CHAT_WINDOW,
     "pbix_uid": None,
 }.items():
     st.session_state.setdefault(k, v)
@@ -88,32 +142,112 @@ with st.sidebar:
         uid = f"{pbix.name}_{pbix.size}"
         if uid != st.session_state.pbix_uid:
             st.session_state.pbix_uid = uid
-            with st.spinner("Extraction & rédaction en cours…"):
-                try:
-                    import requests
-                    resp = requests.post(
-                        f"{BACKEND}/api/spec",
-                        files={"pbix": (pbix.name, pbix.getvalue(), "application/octet-stream")},
-                        timeout=600,
-                    )
-                    resp.raise_for_status()
-                except Exception as exc:
-                    st.error(f"Erreur backend : {exc}")
-                    st.stop()
-
-                data = resp.json()
-                st.session_state.update(
-                    {
-                        "spec_id": data["id"],
-                        "spec_func": data["functional"],
-                        "spec_tech": data["technical"],
-                        "chat": [],
-                    }
+            try:
+                resp = http().post(
+                    f"{BACKEND}/api/spec",
+                    files={"pbix": (pbix.name, pbix.getvalue(), "application/octet-stream")},
+                    timeout=120,
                 )
+                resp.raise_for_status()
+                job = resp.json()
+
+                # le backend rend la main tout de suite : on suit le job par polling
+                progress = st.progress(0.0, text="Fichier reçu, en file d’attente…")
+                while job["stage"] not in ("done", "failed", "cancelled"):
+                    time.sleep(POLL_INTERVAL_S)
+                    r = http().get(f"{BACKEND}/api/spec/jobs/{job['job_id']}", timeout=10)
+                    r.raise_for_status()
+                    job = r.json()
+                    progress.progress(job["progress"], text=STAGE_LABELS.get(job["stage"], job["stage"]))
+                progress.empty()
+                if job["stage"] != "done":
+                    raise RuntimeError(job["error"])
+            except Exception as exc:
+                st.session_state.pbix_uid = None
+                st.error(f"Erreur backend : {exc}")
+                st.stop()
+
+            data = job["result"]
+            st.session_state.update(
+                {
+                    "spec_id": data["id"],
+                    "spec_func": data["functional"],
+                    "spec_summary": data["summary"],
+                    "chat": [],
+                    "chat_window": CHAT_WINDOW,
+                }
+            )
             st.success("Spécification générée ✅")
 
 # -----------------------------------------------------------------------------
-# 3) LAYOUT PRINCIPAL
+# 3) EXPLORATEUR TECHNIQUE – tranches paginées chargées à la demande
+# -----------------------------------------------------------------------------
+@st.cache_data(ttl=600, show_spinner=False)
+def fetch_slice(spec_id: str, kind: str, q: str, offset: int, limit: int) -> dict:
+    r = http().get(
+        f"{BACKEND}/api/spec/{spec_id}/{kind}",
+        params={"q": q, "offset": offset, "limit": limit},
+        timeout=10,
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+def explorer_rows(kind: str, items: list) -> list:
+    if kind == "relations":
+        return [
+            {
+                "de": f"{r.get('fromTable')}[{r.get('fromColumn')}]",
+                "vers": f"{r.get('toTable')}[{r.get('toColumn')}]",
+                "filtrage": "↔" if r.get("crossFilteringBehavior") == "bothDirections" else "→",
+                "active": r.get("isActive", True),
+            }
+            for r in items
+        ]
+    if kind == "pages":
+        return [
+            {
+                "page": p["name"],
+                "visuels": len(p.get("visuals", [])),
+                "champs": ", ".join(dict.fromkeys(str(f) for v in p.get("visuals", []) for f in v.get("fields", []))),
+            }
+            for p in items
+        ]
+    return items
+
+
+# rerun partiel (st.fragment) quand la version de Streamlit le permet
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda f: f)
+
+
+@_fragment
+def spec_explorer(spec_id: str, summary: dict):
+    kind = st.radio(
+        "Objets", list(EXPLORER_KINDS), horizontal=True, key="explorer_kind",
+        format_func=lambda k: f"{EXPLORER_KINDS[k]} ({summary.get(k, 0)})",
+    )
+    q = st.text_input("Filtrer", key="explorer_q", placeholder="nom, table, DAX…")
+    if st.session_state.get("explorer_filter") != (spec_id, kind, q):
+        st.session_state["explorer_filter"] = (spec_id, kind, q)
+        st.session_state["explorer_page"] = 1
+    page = st.session_state.get("explorer_page", 1)
+    try:
+        data = fetch_slice(spec_id, kind, q, (page - 1) * EXPLORER_PAGE_SIZE, EXPLORER_PAGE_SIZE)
+    except Exception as exc:
+        st.error(f"Erreur backend : {exc}")
+        return
+    n_pages = max(1, -(-data["total"] // EXPLORER_PAGE_SIZE))
+    if data["items"]:
+        st.dataframe(explorer_rows(kind, data["items"]), use_container_width=True, hide_index=True)
+    else:
+        st.caption("Aucun résultat.")
+    if n_pages > 1:
+        st.number_input(f"Page (sur {n_pages})", min_value=1, max_value=n_pages, key="explorer_page")
+    st.caption(f"{data['total']} résultat(s)")
+
+
+# -----------------------------------------------------------------------------
+# 4) LAYOUT PRINCIPAL
 # -----------------------------------------------------------------------------
 col_chat, col_spec = st.columns([1.1, 1.5], gap="large")
 
@@ -121,8 +255,9 @@ with col_spec:
     st.subheader("📄 Spécification fonctionnelle")
     if st.session_state.spec_func:
         st.markdown(st.session_state.spec_func, unsafe_allow_html=True)
-        with st.expander("🔧 Détails techniques (JSON)"):
-            st.json(st.session_state.spec_tech, expanded=False)
+        # rien n’est chargé tant que l’explorateur reste fermé
+        if getattr(st, "toggle", st.checkbox)("🔧 Explorer le modèle technique", key="explorer_open"):
+            spec_explorer(st.session_state.spec_id, st.session_state.spec_summary or {})
     else:
         st.info("Aucune spécification chargée pour l’instant.")
 
@@ -134,28 +269,41 @@ with col_chat:
     else:
         # ------------------ Input (en haut)
         prompt = st.chat_input("Pose ta question…")
+        idx = len(st.session_state.chat) - 2
         if prompt:
-            st.session_state.chat.append(("user", prompt))
-            with st.spinner("L’IA réfléchit…"):
-                try:
-                    import requests
-                    r = requests.post(
-                        f"{BACKEND}/api/chat",
-                        json={"id": st.session_state.spec_id, "question": prompt},
-                        timeout=120,
-                    )
+            # la nouvelle paire est affichée en direct, token par token, au-dessus de l’historique
+            st.chat_message("user").markdown(prompt)
+            placeholder = st.chat_message("assistant").empty()
+            placeholder.markdown("▌")
+            answer = ""
+            try:
+                with http().post(
+                    f"{BACKEND}/api/chat/stream",
+                    json={"id": st.session_state.spec_id, "question": prompt},
+                    stream=True,
+                    timeout=(10, 120),
+                ) as r:
                     r.raise_for_status()
-                    answer = r.json().get("answer", "Réponse vide.")
-                except Exception as exc:
-                    answer = f"Erreur backend : {exc}"
-            st.session_state.chat.append(("assistant", answer))
+                    for delta in sse_deltas(r):
+                        answer += delta
+                        placeholder.markdown(answer + "▌")
+                answer = answer or "Réponse vide."
+            except Exception as exc:
+                answer = f"{answer}\n\nErreur backend : {exc}".strip()
+            placeholder.markdown(answer)
+            st.session_state.chat.extend([("user", prompt), ("assistant", answer)])
 
-        # ------------------ Affichage : pairs récentes en haut
+        # ------------------ Affichage : paires récentes en haut, fenêtre de CHAT_WINDOW échanges
         chat = st.session_state.chat
-        idx = len(chat) - 2
-        while idx >= 0:
+        stop = max(-1, idx - 2 * st.session_state.chat_window)
+        while idx > stop:
             user_role, user_msg = chat[idx]
             assistant_role, assistant_msg = chat[idx + 1]
             st.chat_message(user_role).markdown(user_msg)
             st.chat_message(assistant_role).markdown(assistant_msg)
             idx -= 2
+        if stop >= 0:
+            older = stop // 2 + 1
+            if st.button(f"Afficher les échanges plus anciens ({older})"):
+                st.session_state.chat_window += CHAT_WINDOW
+                st.rerun()
@@ -1,39 +1,99 @@
 """
 Lance backend (uvicorn) et frontend (streamlit) dans le même terminal.
 Utilise `python -m` pour être indépendant du PATH Windows.
+
+    python run_all.py                      # dev : rechargement auto, 1 worker
+    python run_all.py --prod --workers 4   # prod : sans reloader, N workers uvicorn
+
+Le frontend n’est lancé qu’une fois /readyz du backend au vert (warm-up fini) ;
+il reçoit BACKEND_URL et n’embarque donc pas son propre backend.
 """
-import subprocess, sys, pathlib, os, time, signal
+import argparse, json, subprocess, sys, pathlib, os, time, signal
+import urllib.error, urllib.request
 
 ROOT = pathlib.Path(__file__).parent.resolve()
 ENV = os.environ.copy()
 
 
-def spawn(module: str, args: list, cwd: pathlib.Path):
+def spawn(module: str, args: list, cwd: pathlib.Path, env: dict | None = None):
     cmd = [sys.executable, "-m", module] + args
-    return subprocess.Popen(cmd, cwd=cwd, env=ENV)
+    return subprocess.Popen(cmd, cwd=cwd, env=env or ENV)
+
+
+def wait_ready(url: str, proc: subprocess.Popen, timeout_s: float) -> dict:
+    """Interroge /readyz jusqu’au 200 ; échoue si le backend meurt, si le warm-up échoue ou au délai."""
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"le backend s’est arrêté (code {proc.returncode})")
+        try:
+            with urllib.request.urlopen(f"{url}/readyz", timeout=2) as resp:
+                return json.load(resp)
+        except urllib.error.HTTPError as exc:   # 503 : warm-up en cours… ou en échec
+            state = json.load(exc)
+            if not state.get("warming", True):
+                failed = {k: c["detail"] for k, c in state["checks"].items() if c["status"] == "failed"}
+                raise RuntimeError(f"warm-up en échec : {failed}")
+        except (urllib.error.URLError, OSError):   # pas encore en écoute
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"backend toujours pas prêt après {timeout_s:.0f}s")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Lance le backend FastAPI et le frontend Streamlit.")
+    ap.add_argument("--prod", action="store_true", help="sans reloader, plusieurs workers, pas d’access log")
+    ap.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")),
+                    help="workers uvicorn en mode --prod (défaut WEB_CONCURRENCY ou 2)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--front-port", type=int, default=8501)
+    ap.add_argument("--ready-timeout", type=float, default=60, help="attente max de /readyz (s)")
+    return ap.parse_args()
 
 
 def main():
+    args = parse_args()
+    backend_url = f"http://127.0.0.1:{args.port}"
+    uvicorn_args = ["backend.app.main:app", "--host", args.host, "--port", str(args.port)]
+    if args.prod:
+        uvicorn_args += ["--workers", str(max(1, args.workers)), "--no-access-log"]
+    else:
+        uvicorn_args += ["--reload"]
+    streamlit_args = ["run", "frontend/app.py", "--server.port", str(args.front_port)]
+    if args.prod:
+        streamlit_args += ["--server.headless", "true"]
+
+    back = front = None
     try:
-        print("⏳ Backend (uvicorn)…")
-        back = spawn("uvicorn", ["backend.app.main:app", "--reload", "--port", "8000"], ROOT)
-        time.sleep(2)
+        mode = f"prod, {max(1, args.workers)} worker(s)" if args.prod else "dev, --reload"
+        print(f"⏳ Backend (uvicorn, {mode})…")
+        t0 = time.monotonic()
+        back = spawn("uvicorn", uvicorn_args, ROOT)
+        state = wait_ready(backend_url, back, args.ready_timeout)
+        degraded = [k for k, c in state["checks"].items() if c["status"] != "ok"]
+        print(f"   prêt en {time.monotonic() - t0:.1f}s" + (f" (dégradé : {', '.join(degraded)})" if degraded else ""))
 
         print("⏳ Frontend (streamlit)…")
-        front = spawn("streamlit", ["run", "frontend/app.py", "--server.port", "8501"], ROOT)
+        front = spawn("streamlit", streamlit_args, ROOT, {**ENV, "BACKEND_URL": backend_url})
 
         print(
             "\n✅ Prêt !\n"
-            "  • Backend : http://127.0.0.1:8000/docs\n"
-            "  • Frontend : http://127.0.0.1:8501\n"
+            f"  • Backend : {backend_url}/docs\n"
+            f"  • Frontend : http://127.0.0.1:{args.front_port}\n"
             "Ctrl-C pour arrêter."
         )
 
-        while True:
+        while back.poll() is None:
             time.sleep(3)
+        print(f"\n✖ Le backend s’est arrêté (code {back.returncode}).")
 
+    except (RuntimeError, TimeoutError) as exc:
+        print(f"\n✖ Backend : {exc}")
+        sys.exit(1)
     except KeyboardInterrupt:
         print("\n🛑 Arrêt…")
+    finally:
         for p in (front, back):
             if p and p.poll() is None:
                 p.send_signal(signal.SIGINT)
@@ -0,0 +1,39 @@
+"""
+Environnement isolé pour les tests : caches, store et index dans un dossier
+temporaire, pbi-tools remplacé par bench/fake_pbi_tools.py, LLM par bench.stub_llm.
+Les variables sont posées avant tout import de backend (lues à l’import).
+"""
+import os, tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+TMP = Path(tempfile.mkdtemp(prefix="pbix_tests_"))
+
+os.environ.update(
+    SPEC_CACHE_PATH=str(TMP / "spec_cache.db"),
+    SPEC_STORE_URL=f"sqlite:///{TMP / 'spec_store.db'}",
+    SEARCH_INDEX_PATH=str(TMP / "search.sqlite3"),
+    PBITOOLS_PATH=str(ROOT / "bench" / "fake_pbi_tools.py"),
+    PBIX_FAST_PATH="0",
+    AZURE_OPENAI_KEY="test",
+    AZURE_OPENAI_DEPLOYMENT="test",
+)
+
+from bench.stub_llm import StubLLM  # noqa: E402
+
+STUB = StubLLM(latency_ms=50, tokens=10).start()
+os.environ["AZURE_OPENAI_ENDPOINT"] = STUB.url
+
+
+@pytest.fixture(scope="session")
+def stub_llm() -> StubLLM:
+    return STUB
+
+
+@pytest.fixture(scope="session")
+def pbix_path() -> Path:
+    from bench.fixtures import synthetic_layout, synthetic_model, write_pbix
+    model = synthetic_model(3, 10)
+    return write_pbix(TMP / "tests.pbix", model, synthetic_layout(model, 2, 3))
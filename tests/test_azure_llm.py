@@ -0,0 +1,72 @@
+import asyncio
+
+import httpx
+import pytest
+
+from bench.stub_llm import StubLLM
+from common.azure_llm import AzureLLMClient, LLMConfig, _backoff, _retry_after
+
+
+@pytest.fixture
+def limited_stub():
+    """Un appel sur deux répond 429 (Retry-After: 0)."""
+    stub = StubLLM(latency_ms=10, tokens=5, fail_every=2).start()
+    yield stub
+    stub.stop()
+
+
+def _client(stub: StubLLM, **overrides) -> AzureLLMClient:
+    return AzureLLMClient(LLMConfig(api_key="test", endpoint=stub.url, deployment="test",
+                                    api_version="2025-01-01-preview", **overrides))
+
+
+MESSAGES = [{"role": "user", "content": "Combien de mesures ?"}]
+
+
+def test_retry_after_headers():
+    assert _retry_after(httpx.Response(429, headers={"retry-after": "3"})) == 3
+    assert _retry_after(httpx.Response(429, headers={"retry-after-ms": "250"})) == 0.25
+    assert _retry_after(httpx.Response(429)) is None
+    assert _backoff(0, httpx.Response(429, headers={"retry-after": "2"})) >= 2   # jamais avant le serveur
+
+
+def test_async_chat_retries_429(limited_stub):
+    client = _client(limited_stub)
+
+    async def scenario():
+        try:
+            return [await client.achat(MESSAGES) for _ in range(2)]
+        finally:
+            await client.aclose()
+
+    answers = asyncio.run(scenario())
+    assert all(text for text, _ in answers)
+    assert limited_stub.snapshot()["calls"] == 3 and limited_stub.snapshot()["rate_limited"] == 1
+
+
+def test_stream_and_sync_chat_retry_429(limited_stub):
+    client = _client(limited_stub)
+
+    async def streamed():
+        try:
+            return "".join([delta async for delta in client.astream(MESSAGES)])
+        finally:
+            await client.aclose()
+
+    first = client.chat(MESSAGES)[0]
+    second = asyncio.run(streamed())   # 2e appel du stub : 429 puis nouvelle tentative
+    assert first and second
+    assert limited_stub.snapshot()["calls"] == 3 and limited_stub.snapshot()["rate_limited"] == 1
+
+
+def test_gives_up_after_max_retries():
+    stub = StubLLM(latency_ms=0, tokens=5, fail_every=1).start()
+    client = _client(stub, max_retries=2)
+    try:
+        with pytest.raises(httpx.HTTPStatusError) as err:
+            client.chat(MESSAGES)
+        assert err.value.response.status_code == 429
+        assert stub.snapshot()["calls"] == 3
+    finally:
+        asyncio.run(client.aclose())
+        stub.stop()
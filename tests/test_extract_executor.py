@@ -0,0 +1,89 @@
+import os, sys, threading, time
+from pathlib import Path
+
+import pytest
+
+from backend.app.extract_executor import ExtractionExecutor, ExtractionTimeout
+
+FAKE = str(Path(__file__).resolve().parents[1] / "bench" / "fake_pbi_tools.py")
+
+
+def _alive(pid: int) -> bool:
+    """Vrai si le processus existe encore (un zombie en attente de reaping compte comme mort)."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    stat = Path(f"/proc/{pid}/stat")
+    return not (stat.exists() and stat.read_text().rsplit(")", 1)[1].split()[0] == "Z")
+
+
+def _wait_dead(pid: int, timeout_s: float = 5) -> bool:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if not _alive(pid):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def hung_tool(tmp_path, monkeypatch):
+    """pbi-tools bloqué qui a lancé un sous-processus : renvoie (commande, fichier du pid enfant)."""
+    pid_file = tmp_path / "child.pid"
+    monkeypatch.setenv("FAKE_PBITOOLS_DELAY_S", "60")
+    monkeypatch.setenv("FAKE_PBITOOLS_CHILD_S", "60")
+    monkeypatch.setenv("FAKE_PBITOOLS_CHILD_PID", str(pid_file))
+    cmd = [sys.executable, FAKE, "extract", str(tmp_path / "x.pbix"), "-extractFolder", str(tmp_path / "out")]
+    return cmd, pid_file
+
+
+def _child_pid(pid_file: Path) -> int:
+    deadline = time.monotonic() + 5
+    while not pid_file.exists() or not pid_file.read_text():
+        assert time.monotonic() < deadline, "le faux pbi-tools n’a pas lancé son sous-processus"
+        time.sleep(0.05)
+    return int(pid_file.read_text())
+
+
+@pytest.mark.skipif(os.name == "nt", reason="arbre de processus vérifié via os.kill / /proc")
+def test_timeout_kills_process_tree(hung_tool, tmp_path):
+    cmd, pid_file = hung_tool
+    executor = ExtractionExecutor(max_concurrency=1, timeout_s=1, scratch_dir=str(tmp_path))
+    started = time.monotonic()
+    with pytest.raises(ExtractionTimeout):
+        executor.run(cmd)
+    assert time.monotonic() - started < 5
+    assert _wait_dead(_child_pid(pid_file))
+    assert executor.stats()["running"] == 0
+
+
+@pytest.mark.skipif(os.name == "nt", reason="arbre de processus vérifié via os.kill / /proc")
+def test_cancel_kills_process_tree(hung_tool, tmp_path):
+    class Cancelled(Exception):
+        pass
+
+    cmd, pid_file = hung_tool
+    executor = ExtractionExecutor(max_concurrency=1, timeout_s=600, scratch_dir=str(tmp_path))
+    cancel = threading.Event()
+
+    def check():
+        if cancel.is_set():
+            raise Cancelled()
+
+    errors = []
+
+    def worker():
+        try:
+            executor.run(cmd, check=check)
+        except Cancelled as exc:
+            errors.append(exc)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    child = _child_pid(pid_file)
+    cancel.set()
+    thread.join(timeout=5)
+    assert not thread.is_alive() and len(errors) == 1
+    assert _wait_dead(child)
+    assert executor.stats()["running"] == 0
@@ -0,0 +1,17 @@
+from backend.app import extract_pbix
+from bench.fixtures import synthetic_layout, synthetic_model, write_pbit, write_pbix
+
+
+def test_fast_path_and_pbi_tools_give_the_same_spec(tmp_path, monkeypatch):
+    model = synthetic_model(4, 12)
+    layout = synthetic_layout(model, 12, 3)   # > 10 pages : l’ordre des fichiers ne suffit pas
+    pbit = write_pbit(tmp_path / "Ventes.pbit", model, layout)
+    pbix = write_pbix(tmp_path / "Ventes.pbix", model, layout)
+
+    monkeypatch.setattr(extract_pbix, "FAST_PATH", True)
+    fast = extract_pbix.extract_spec(str(pbit), spec_id="s")
+    tools = extract_pbix._extract_with_pbi_tools(str(pbix), "s")
+
+    assert [p["name"] for p in fast["pages"]] == [s["displayName"] for s in layout["sections"]]
+    assert any(v["fields"] for p in fast["pages"] for v in p["visuals"])
+    assert tools == fast
@@ -0,0 +1,40 @@
+import io, json
+
+import pytest
+
+from backend.app import json_stream
+from backend.app.json_stream import read_model, visual_from_config
+from bench.fixtures import synthetic_model
+
+CONFIG = {
+    "name": "v1",
+    "singleVisual": {
+        "visualType": "clusteredColumnChart",
+        "projections": {"Y": [{"queryRef": "Sales.Amount", "active": True}], "Category": [{"queryRef": "Date.\"Mois\""}]},
+        "activeProjections": {"Y": [{"queryRef": "Sales.Amount"}]},
+        "prototypeQuery": {"Select": [{"Name": "Sales.Amount"}, {"queryRef": "Hidden.Col"}]},
+    },
+}
+
+
+def test_visual_fields_come_from_projections_only():
+    assert visual_from_config(json.dumps(CONFIG)) == {
+        "type": "clusteredColumnChart",
+        "fields": ["Sales.Amount", 'Date."Mois"'],
+    }
+
+
+def test_visual_from_string_or_decoded_config():
+    assert visual_from_config(json.dumps(CONFIG)) == visual_from_config(CONFIG)
+    assert visual_from_config("") == visual_from_config({}) == {"type": None, "fields": []}
+
+
+@pytest.mark.skipif(json_stream.ijson is None, reason="ijson non installé")
+def test_streamed_model_matches_full_decode(monkeypatch):
+    model = synthetic_model(4, 12)
+    model["model"]["tables"][0]["measures"][0]["expression"] = ["CALCULATE (", "    [Total]", ")"]
+    raw = json.dumps(model, ensure_ascii=False).encode("utf-16-le")
+
+    full = read_model(io.BytesIO(raw))
+    monkeypatch.setattr(json_stream, "STREAM_MIN_BYTES", 1)
+    assert read_model(io.BytesIO(raw)) == full
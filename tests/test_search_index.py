@@ -0,0 +1,33 @@
+from backend.app.search_index import SearchIndex
+
+
+def _spec(spec_id: str, measures) -> dict:
+    return {"id": spec_id, "tables": ["Ventes"], "relations": [], "pages": [],
+            "measures": [{"table": "Ventes", "name": name, "expr": expr} for name, expr in measures]}
+
+
+def test_exact_name_ranks_first_beyond_the_first_page(tmp_path):
+    index = SearchIndex(tmp_path / "search.sqlite3")
+    index.index_spec(_spec("old", [("CA HT", "SUM(Ventes[Montant])")]), "Ancien")
+    # indexées plus tard, de même longueur : sans palier SQL, elles passaient devant
+    index.index_spec(_spec("new", [("HT CA", f"[CA HT] * {i}") for i in range(30)]), "Récent")
+
+    first = index.search("ca ht", limit=5)
+    assert first["items"][0]["name"] == "CA HT" and first["items"][0]["match"] == "exact"
+    assert [i["match"] for i in first["items"][1:]] == ["name"] * 4
+
+    seen = [(i["report"], i["name"], i["match"]) for offset in range(0, 40, 7)
+            for i in index.search("ca ht", offset=offset, limit=7)["items"]]
+    assert len(seen) == first["total"] == 31
+    assert [m for *_, m in seen].count("exact") == 1
+
+
+def test_exact_tier_respects_kind_and_report(tmp_path):
+    index = SearchIndex(tmp_path / "search.sqlite3")
+    index.index_spec(_spec("a", [("Ventes", "1")]), "A")
+    index.index_spec(_spec("b", [("Marge", "[Ventes]")]), "B")
+
+    assert {(i["kind"], i["match"]) for i in index.search("ventes", kind="tables")["items"]} == {("tables", "exact")}
+    scoped = index.search("ventes", report="B")["items"]
+    assert {i["report"] for i in scoped} == {"B"}
+    assert [(i["kind"], i["match"]) for i in scoped] == [("tables", "exact"), ("measures", "table")]
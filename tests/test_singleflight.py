@@ -0,0 +1,121 @@
+import asyncio
+
+import httpx
+import pytest
+
+from backend.app.singleflight import SingleFlight
+
+
+async def _tokens(parts, gate: asyncio.Event, calls: list, error: Exception | None = None):
+    calls.append(1)
+    await gate.wait()
+    for part in parts:
+        yield part
+    if error is not None:
+        raise error
+
+
+def test_followers_get_leader_answer():
+    async def scenario():
+        flights, gate, calls = SingleFlight("test"), asyncio.Event(), []
+        source = lambda: _tokens(["Bon", "jour"], gate, calls)
+        leader = flights.join("q", source)
+        follower = flights.join("q", source)
+        assert follower is leader and flights.in_flight() == 1
+
+        async def streamed():
+            return "".join([part async for part in flights.join("q", source).stream()])
+
+        pending = asyncio.gather(leader.result(), follower.result(), streamed())
+        await asyncio.sleep(0)
+        gate.set()
+        answers = await pending
+        assert answers == ["Bonjour"] * 3 and len(calls) == 1
+        await asyncio.sleep(0)
+        assert flights.in_flight() == 0
+
+    asyncio.run(scenario())
+
+
+def test_followers_get_leader_error():
+    async def scenario():
+        flights, gate, calls = SingleFlight("test"), asyncio.Event(), []
+        source = lambda: _tokens(["par"], gate, calls, error=RuntimeError("LLM indisponible"))
+        leader, follower = flights.join("q", source), flights.join("q", source)
+
+        async def streamed():
+            return [part async for part in follower.stream()]
+
+        pending = asyncio.gather(leader.result(), streamed(), return_exceptions=True)
+        gate.set()
+        results = await pending
+        assert all(isinstance(r, RuntimeError) and str(r) == "LLM indisponible" for r in results)
+        assert len(calls) == 1
+        await asyncio.sleep(0)
+        assert flights.join("q", lambda: _tokens(["ok"], gate, calls)) is not leader   # pas de résultat périmé
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_upload_joins_running_job(pbix_path, monkeypatch):
+    monkeypatch.setenv("FAKE_PBITOOLS_DELAY_S", "1")
+    from backend.app.main import app
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            data = pbix_path.read_bytes()
+            post = lambda: client.post("/api/spec", files={"pbix": ("Ventes.pbix", data)})
+            concurrent = await asyncio.gather(*[post() for _ in range(4)])
+            later = await post()
+            assert {r.status_code for r in concurrent + [later]} == {202}
+            job_ids = {r.json()["job_id"] for r in concurrent + [later]}
+            assert len(job_ids) == 1
+
+            job_id = job_ids.pop()
+            for _ in range(300):
+                job = (await client.get(f"/api/spec/jobs/{job_id}")).json()
+                if job["stage"] in ("done", "failed"):
+                    break
+                await asyncio.sleep(0.05)
+            assert job["stage"] == "done", job["error"]
+
+    asyncio.run(scenario())
+
+
+def test_same_content_under_two_names_shares_one_job(tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_PBITOOLS_DELAY_S", "1")
+    from backend.app.extract_pbix import EXTRACTOR_VERSION
+    from backend.app.generate_narrative import PROMPT_VERSION
+    from backend.app.main import SEARCH, SPEC_CACHE, app
+    from backend.app.spec_cache import cache_key
+    from bench.fixtures import synthetic_layout, synthetic_model, write_pbix
+    from common.metrics import PBITOOLS_RUNS
+
+    model = synthetic_model(3, 10)   # contenu propre à ce test : ni cache ni job antérieur
+    data = write_pbix(tmp_path / "t.pbix", model, synthetic_layout(model, 2, 3), salt="two-names").read_bytes()
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            runs = PBITOOLS_RUNS.value(outcome="ok")
+            responses = await asyncio.gather(*[
+                client.post("/api/spec", files={"pbix": (name, data)})
+                for name in ("Ventes Nord.pbix", "Ventes Sud.pbix", "Ventes Nord.pbix")
+            ])
+            job_ids = {r.json()["job_id"] for r in responses}
+            assert len(job_ids) == 1
+            job_id = job_ids.pop()
+            for _ in range(300):
+                job = (await client.get(f"/api/spec/jobs/{job_id}")).json()
+                if job["stage"] in ("done", "failed"):
+                    break
+                await asyncio.sleep(0.05)
+            assert job["stage"] == "done", job["error"]
+            assert PBITOOLS_RUNS.value(outcome="ok") - runs == 1
+            return job["result"]["id"]
+
+    spec_id = asyncio.run(scenario())
+    assert SPEC_CACHE.get(cache_key(spec_id, EXTRACTOR_VERSION, PROMPT_VERSION)) is not None
+    assert SPEC_CACHE.latest_version("Ventes Nord") == SPEC_CACHE.latest_version("Ventes Sud") == spec_id
+    assert {"Ventes Nord", "Ventes Sud"} <= {i["report"] for i in SEARCH.search("Page")["items"]}
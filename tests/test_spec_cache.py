@@ -0,0 +1,30 @@
+from backend.app.spec_cache import SpecCache
+
+
+def test_reuploaded_version_points_to_the_one_before(tmp_path):
+    cache = SpecCache(tmp_path / "cache.sqlite3")
+    cache.record_version("Ventes", "A", None)
+    cache.record_version("Ventes", "B", "A")
+    cache.record_version("Ventes", "A", "B")   # A → B → A
+
+    assert cache.latest_version("Ventes") == "A"
+    assert cache.previous_version("Ventes", "A") == "B"
+
+
+def test_previous_version_is_scoped_to_the_report(tmp_path):
+    cache = SpecCache(tmp_path / "cache.sqlite3")
+    cache.record_version("Nord", "N1", None)
+    cache.record_version("Sud", "S1", None)
+    cache.record_version("Nord", "X", "N1")
+    cache.record_version("Sud", "X", "S1")   # même contenu envoyé sous deux noms
+
+    assert cache.previous_version("Nord", "X") == "N1"
+    assert cache.previous_version("Sud", "X") == "S1"
+    assert sorted(cache.reports_of("X")) == ["Nord", "Sud"]
+
+
+def test_deferred_versions_are_taken_once(tmp_path):
+    cache = SpecCache(tmp_path / "cache.sqlite3")
+    cache.defer_version("Sud", "X", "S1")
+    assert cache.take_deferred("X") == [("Sud", "S1")]
+    assert cache.take_deferred("X") == []
@@ -0,0 +1,20 @@
+import time
+
+from backend.app import spec_store
+from backend.app.spec_store import SpecStore, SQLiteBackend
+
+
+def test_specs_expire_from_the_shared_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(spec_store, "SPEC_TTL_S", 0.2)
+    backend = SQLiteBackend(tmp_path / "store.sqlite3")
+    store = SpecStore(backend, memory_bytes=0)   # pas de LRU mémoire : lecture directe du backend
+
+    store.put_spec({"id": "a", "measures": []})
+    assert store.get_spec("a") == {"id": "a", "measures": []}
+    assert store.current_spec()["id"] == "a"
+
+    time.sleep(0.3)
+    assert store.get_spec("a") is None and store.current_spec() is None
+    store.put_spec({"id": "b", "measures": []}, current=False)   # toute écriture purge les expirés
+    rows = [key for key, in backend._db.execute("SELECT key FROM kv")]
+    assert rows == ["spec:b"]
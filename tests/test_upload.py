@@ -0,0 +1,68 @@
+import asyncio, tempfile
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from backend.app.upload import save_upload
+
+LIMIT = 64 * 1024
+BOUNDARY = "pbixtestboundary"
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        saved = await save_upload(request, max_bytes=LIMIT)
+        saved.cleanup()
+        return {"size": saved.size, "sha256": saved.sha256}
+
+    return app
+
+
+def _multipart(payload: bytes) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"pbix\"; filename=\"Ventes.pbix\"\r\n"
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + payload + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _post(body, headers=None) -> httpx.Response:
+    async def scenario():
+        transport = httpx.ASGITransport(app=_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/upload", content=body, headers={
+                "content-type": f"multipart/form-data; boundary={BOUNDARY}", **(headers or {})})
+    return asyncio.run(scenario())
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    return tmp_path
+
+
+def test_upload_within_limit(upload_dir):
+    resp = _post(_multipart(b"x" * 1000))
+    assert resp.status_code == 200 and resp.json()["size"] == 1000
+    assert not list(upload_dir.glob("pbix_upload_*"))
+
+
+def test_oversized_content_length_rejected(upload_dir):
+    resp = _post(_multipart(b"x" * (LIMIT * 3)))
+    assert resp.status_code == 413
+    assert not list(upload_dir.glob("pbix_upload_*"))
+
+
+def test_oversized_chunked_body_rejected_and_cleaned_up(upload_dir):
+    body = _multipart(b"x" * (LIMIT * 3))
+
+    async def chunks():   # pas de Content-Length : la limite est vérifiée au fil de l’eau
+        for i in range(0, len(body), 8192):
+            yield body[i:i + 8192]
+
+    resp = _post(chunks())
+    assert resp.status_code == 413
+    assert not list(upload_dir.glob("pbix_upload_*"))